@@ -0,0 +1,39 @@
+"""Conteggio delle assenze e confronto con il limite annuale"""
+
+
+# Percentuale massima di giorni di assenza ammessa
+PERCENTUALE_LIMITE = 0.25
+
+
+def conta_eventi(assenze_data):
+    """Conta assenze, ritardi e uscite anticipate dagli eventi dell'API"""
+    assenze = ritardi = uscite = 0
+    for assenza in assenze_data or []:
+        evento_codice = assenza.get('evtCode', '')
+        if evento_codice == 'ABA0':
+            assenze += 1
+        elif evento_codice == 'ABR0':
+            ritardi += 1
+        elif evento_codice == 'ABU0':
+            uscite += 1
+    return assenze, ritardi, uscite
+
+
+def riepilogo_assenze(assenze_data, calendario, oggi):
+    """Numeri del report assenze, calcolati sul calendario scolastico"""
+    assenze, ritardi, uscite = conta_eventi(assenze_data)
+    giorni_totali = calendario.giorni_totali
+    giorni_trascorsi = calendario.giorni_trascorsi(oggi)
+    limite = calendario.limite_assenze(PERCENTUALE_LIMITE)
+    return {
+        'assenze': assenze,
+        'ritardi': ritardi,
+        'uscite_anticipate': uscite,
+        'giorni_totali': giorni_totali,
+        'giorni_trascorsi': giorni_trascorsi,
+        'giorni_rimanenti': giorni_totali - giorni_trascorsi,
+        'limite_assenze': limite,
+        'assenze_disponibili': limite - assenze,
+        'percentuale_assenze': (assenze / giorni_trascorsi * 100) if giorni_trascorsi > 0 else 0,
+        'percentuale_limite': (assenze / limite * 100) if limite > 0 else 0,
+    }
@@ -0,0 +1,134 @@
+"""Aggregati incrementali dei voti: ogni voto aggiunto o rimosso costa O(1)"""
+
+from grades import Voto
+from stats import GradeStats, Gruppo
+
+
+class RunningAggregate:
+    """Somma, conteggio e somma dei quadrati di un gruppo di voti"""
+
+    __slots__ = ('count', 'somma', 'somma_quadrati')
+
+    def __init__(self, count=0, somma=0.0, somma_quadrati=0.0):
+        self.count = count
+        self.somma = somma
+        self.somma_quadrati = somma_quadrati
+
+    def add(self, valore):
+        self.count += 1
+        self.somma += valore
+        self.somma_quadrati += valore * valore
+
+    def remove(self, valore):
+        self.count -= 1
+        self.somma -= valore
+        self.somma_quadrati -= valore * valore
+
+    def merge(self, altro):
+        self.count += altro.count
+        self.somma += altro.somma
+        self.somma_quadrati += altro.somma_quadrati
+
+    @property
+    def mean(self):
+        return self.somma / self.count if self.count else None
+
+    @property
+    def variance(self):
+        if not self.count:
+            return None
+        media = self.somma / self.count
+        return max(0.0, self.somma_quadrati / self.count - media * media)
+
+
+class AggregateStore:
+    """Aggregati per (materia, quadrimestre) e istogramma, aggiornati voto per voto"""
+
+    def __init__(self):
+        # (materia, quadrimestre) -> RunningAggregate; quadrimestre 0 = fuori periodo
+        self.gruppi = {}
+        # voto arrotondato -> conteggio
+        self.istogramma = {}
+
+    @classmethod
+    def from_records(cls, records):
+        store = cls()
+        for voto in records:
+            store.insert(voto)
+        return store
+
+    def insert(self, voto):
+        if not voto.in_media:
+            return
+        chiave = (voto.materia, voto.quadrimestre or 0)
+        gruppo = self.gruppi.get(chiave)
+        if gruppo is None:
+            gruppo = self.gruppi[chiave] = RunningAggregate()
+        gruppo.add(voto.valore)
+        arrotondato = round(voto.valore)
+        self.istogramma[arrotondato] = self.istogramma.get(arrotondato, 0) + 1
+
+    def delete(self, voto):
+        if not voto.in_media:
+            return
+        chiave = (voto.materia, voto.quadrimestre or 0)
+        gruppo = self.gruppi.get(chiave)
+        if gruppo is None:
+            return
+        gruppo.remove(voto.valore)
+        if gruppo.count <= 0:
+            del self.gruppi[chiave]
+        arrotondato = round(voto.valore)
+        rimasti = self.istogramma.get(arrotondato, 0) - 1
+        if rimasti > 0:
+            self.istogramma[arrotondato] = rimasti
+        else:
+            self.istogramma.pop(arrotondato, None)
+
+    def apply(self, aggiunti, rimossi):
+        """Applica le differenze di una sincronizzazione (eventi grezzi dell'API)"""
+        for voto in rimossi:
+            self.delete(Voto(voto))
+        for voto in aggiunti:
+            self.insert(Voto(voto))
+
+    def to_stats(self):
+        """
+        Converte gli aggregati nello stesso formato di stats.compute_stats.
+
+        Minimo e massimo non sono mantenibili in O(1) con le cancellazioni:
+        nei Gruppo risultanti valgono None.
+        """
+        per_materia, per_mq, per_q = {}, {}, {}
+        totale = RunningAggregate()
+        for (materia, quadrimestre), gruppo in self.gruppi.items():
+            per_materia.setdefault(materia, RunningAggregate()).merge(gruppo)
+            totale.merge(gruppo)
+            if quadrimestre:
+                per_mq[(materia, quadrimestre)] = gruppo
+                per_q.setdefault(quadrimestre, RunningAggregate()).merge(gruppo)
+
+        def gruppi(aggregati):
+            return {k: Gruppo(a.count, a.mean, None, None) for k, a in aggregati.items()}
+
+        return GradeStats(
+            gruppi(per_materia),
+            gruppi(per_mq),
+            gruppi(per_q),
+            dict(self.istogramma),
+            Gruppo(totale.count, totale.mean, None, None) if totale.count else None
+        )
+
+    def to_dict(self):
+        return {
+            'gruppi': [[m, q, a.count, a.somma, a.somma_quadrati] for (m, q), a in self.gruppi.items()],
+            'istogramma': [[k, v] for k, v in self.istogramma.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, dati):
+        store = cls()
+        for materia, quadrimestre, count, somma, somma_quadrati in dati.get('gruppi', []):
+            store.gruppi[(materia, quadrimestre)] = RunningAggregate(count, somma, somma_quadrati)
+        store.istogramma = {k: v for k, v in dati.get('istogramma', [])}
+        return store
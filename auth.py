@@ -0,0 +1,208 @@
+"""Persistenza e riuso del token di sessione di Classeviva"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from metrics import span
+
+
+# Durata presunta della sessione quando l'API non comunica una scadenza
+DURATA_SESSIONE = timedelta(minutes=60)
+# Margine prima della scadenza oltre il quale il token non viene più usato
+MARGINE_SCADENZA = timedelta(minutes=2)
+
+ERRORI_TOKEN = {'TokenErrore', 'TokenNonValido', 'TokenScaduto', 'TokenNonPresente'}
+
+
+def _ora():
+    return datetime.now(timezone.utc)
+
+
+def _aware(data):
+    if data is not None and data.tzinfo is None:
+        return data.replace(tzinfo=timezone.utc)
+    return data
+
+
+def is_auth_error(errore):
+    """Riconosce gli errori dovuti a token scaduto o non valido (401)"""
+    if type(errore).__name__ in ERRORI_TOKEN:
+        return True
+    if getattr(errore, 'status', None) == 401 or getattr(errore, 'status_code', None) == 401:
+        return True
+    return 'Codice: 401' in str(errore)
+
+
+def scadenza_sessione(utente):
+    """Istante in cui la sessione dell'utente smette di essere valida"""
+    fine = _aware(getattr(utente, 'fine', None))
+    if fine is not None:
+        return fine
+    inizio = _aware(getattr(utente, 'inizio', None))
+    if inizio is not None:
+        return inizio + DURATA_SESSIONE
+    return None
+
+
+def salva_sessione(utente):
+    """Fotografa lo stato di autenticazione di un classeviva.Utente"""
+    scadenza = scadenza_sessione(utente)
+    if scadenza is None:
+        return None
+    sessione = getattr(utente, '_sessione', None)
+    # Le date si salvano così come sono: a seconda della versione il client
+    # le confronta con o senza fuso orario
+    inizio = getattr(utente, 'inizio', None)
+    fine = getattr(utente, 'fine', None)
+    return {
+        'dati': dict(getattr(utente, '_dati', {}) or {}),
+        'token': getattr(utente, '_token', None),
+        'id_interno': getattr(utente, '_id', None),
+        'inizio': inizio.isoformat() if inizio else None,
+        'fine': fine.isoformat() if fine else None,
+        'scadenza': scadenza.isoformat(),
+        'auth_header': sessione.headers.get('Z-Auth-Token') if sessione is not None else None,
+        'cookies': sessione.cookies.get_dict() if sessione is not None else {},
+    }
+
+
+def ripristina_sessione(utente, stato):
+    """Reinstalla una sessione salvata; ritorna False se scaduta o non valida"""
+    if not stato or not stato.get('scadenza'):
+        return False
+    try:
+        scadenza = datetime.fromisoformat(stato['scadenza'])
+    except ValueError:
+        return False
+    if _aware(scadenza) - MARGINE_SCADENZA <= _ora():
+        return False
+
+    utente._dati = dict(stato.get('dati') or {})
+    if stato.get('token') is not None:
+        utente._token = stato['token']
+    if stato.get('id_interno'):
+        utente._id = stato['id_interno']
+    _cancella_date(utente)
+    if stato.get('inizio'):
+        utente.inizio = datetime.fromisoformat(stato['inizio'])
+    if stato.get('fine'):
+        utente.fine = datetime.fromisoformat(stato['fine'])
+
+    sessione = getattr(utente, '_sessione', None)
+    if sessione is not None:
+        if stato.get('auth_header'):
+            sessione.headers['Z-Auth-Token'] = stato['auth_header']
+        for nome, valore in (stato.get('cookies') or {}).items():
+            sessione.cookies.set(nome, valore)
+    return True
+
+
+def _definito_dalla_classe(utente, attributo):
+    """True se la classe o il suo __init__ definiscono già l'attributo"""
+    classe = type(utente)
+    if hasattr(classe, attributo):
+        return True
+    codice = getattr(classe.__init__, '__code__', None)
+    return codice is not None and attributo in codice.co_names
+
+
+def _cancella_date(utente):
+    """Azzera inizio/fine della sessione in modo valido per ogni classeviva
+
+    Fino alla 1.1 Utente.connesso controlla hasattr(self, 'inizio') e poi
+    sottrae la data, quindi l'attributo va rimosso (con None solleverebbe
+    TypeError); dalla 1.2 __init__ li imposta a None e connesso confronta
+    self.inizio con None, quindi vanno rimessi a None e non rimossi.
+    """
+    for attributo in ('inizio', 'fine'):
+        if _definito_dalla_classe(utente, attributo):
+            setattr(utente, attributo, None)
+        elif attributo in vars(utente):
+            delattr(utente, attributo)
+
+
+def _invalida(utente):
+    """Forza il client a rifare l'accesso alla prossima chiamata"""
+    utente._dati = {}
+    _cancella_date(utente)
+    if hasattr(utente, '_token'):
+        utente._token = None
+
+
+class SessionManager:
+    """Riusa il token salvato e riautentica solo quando serve"""
+
+    def __init__(self, utente, cache=None, username=None, annullato=None):
+        self.utente = utente
+        self.cache = cache
+        self.username = username
+        # threading.Event impostato al logout: il token non va più salvato
+        self.annullato = annullato
+        self._lock = threading.Lock()
+        self._generazione = 0
+
+    def _store(self):
+        if self.cache is None or not self.username:
+            return
+        try:
+            self.cache.put_meta(self.username, 'sessione', salva_sessione(self.utente),
+                                annullato=self.annullato)
+        except Exception as e:
+            print(f'Errore salvataggio sessione: {e}')
+
+    def restore(self):
+        """Prova a riprendere la sessione salvata senza rifare il login"""
+        if self.cache is None or not self.username:
+            return False
+        try:
+            stato = self.cache.get_meta(self.username, 'sessione')
+        except Exception as e:
+            print(f'Errore lettura sessione: {e}')
+            return False
+        return ripristina_sessione(self.utente, stato)
+
+    @property
+    def valid(self):
+        scadenza = scadenza_sessione(self.utente)
+        return scadenza is not None and scadenza - MARGINE_SCADENZA > _ora()
+
+    async def ensure(self):
+        """Garantisce una sessione valida: token salvato se possibile, altrimenti login"""
+        if self.valid:
+            return
+        if self.restore() and self.valid:
+            return
+        await self.reauth(self._generazione)
+
+    async def reauth(self, generazione):
+        """Rifà l'accesso, una sola volta anche se più richieste falliscono insieme"""
+        with self._lock:
+            if generazione != self._generazione:
+                # Un'altra richiesta ha già rinnovato il token
+                return
+            _invalida(self.utente)
+            with span('accedi'):
+                await self.utente.accedi()
+            self._generazione += 1
+            self._store()
+
+    async def call(self, factory):
+        """Esegue factory(); su token scaduto o 401 riautentica e riprova una volta"""
+        generazione = self._generazione
+        if not self.valid:
+            await self.reauth(generazione)
+            generazione = self._generazione
+        try:
+            return await factory()
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+        await self.reauth(generazione)
+        return await factory()
+
+    def forget(self):
+        if self.cache is not None and self.username:
+            try:
+                self.cache.put_meta(self.username, 'sessione', None)
+            except Exception as e:
+                print(f'Errore eliminazione sessione: {e}')
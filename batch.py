@@ -0,0 +1,257 @@
+"""Modalità batch senza interfaccia grafica
+
+Accede con una lista di account (es. un'intera classe), scarica carta, voti e
+assenze di tutti con un numero massimo di studenti in parallelo e scrive le
+statistiche per studente e aggregate, con gli stessi calcoli della app.
+
+Uso: python batch.py credenziali.json -o risultati -c 20 [--cache batch.sqlite3]
+
+Il file delle credenziali è una lista JSON di {"username": ..., "password": ...}
+oppure un CSV con intestazione username,password.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import classeviva
+from absences import riepilogo_assenze
+from auth import SessionManager
+from cache import DataCache
+from endpoint import reindirizza
+from grades import normalizza_voti
+import metrics
+from loader import fetch_concurrently, run_blocking
+from ratelimit import RateLimiter
+from retry import CircuitBreaker, RetryPolicy, install as install_errori_http
+from school_calendar import CalendarConfig, calendario_per
+from stats import stats_from_records
+from sync import SyncEngine
+
+
+log = logging.getLogger('batch')
+
+
+CONCORRENZA_PREDEFINITA = 16
+# Richieste al secondo verso Spaggiari (si riducono da sole in caso di 429)
+RATE_PREDEFINITO = 20
+# Timeout in secondi per singolo tentativo di ogni richiesta
+TIMEOUTS = {'carta': 10, 'voti': 20, 'assenze': 15}
+# Richieste HTTP contemporanee per studente (carta, voti, assenze)
+RICHIESTE_PER_STUDENTE = 3
+
+
+def carica_credenziali(path):
+    """Legge le credenziali da un file JSON o CSV"""
+    with open(path, 'r', newline='') as f:
+        if path.lower().endswith('.csv'):
+            righe = list(csv.DictReader(f))
+        else:
+            righe = json.load(f)
+    credenziali = []
+    for riga in righe:
+        username = (riga.get('username') or '').strip()
+        if username and riga.get('password'):
+            credenziali.append({'username': username, 'password': riga['password']})
+    return credenziali
+
+
+def _medie(stats, materia=None):
+    if materia is None:
+        return {
+            'q1': stats.media_generale(1),
+            'q2': stats.media_generale(2),
+            'totale': stats.media_generale(),
+        }
+    return {
+        'q1': stats.media_materia(materia, 1),
+        'q2': stats.media_materia(materia, 2),
+        'totale': stats.media_materia(materia),
+    }
+
+
+def statistiche_voti(records):
+    """Medie per materia e generali, come nelle schede Media e Statistiche"""
+    stats = stats_from_records(records)
+    return {
+        'numero_voti': stats.totale.count if stats.totale else 0,
+        'media_generale': _medie(stats),
+        'materie': {materia: _medie(stats, materia) for materia in sorted(stats.per_materia)},
+        'distribuzione': {str(k): v for k, v in sorted(stats.istogramma.items())},
+    }
+
+
+def _nome_file(username):
+    return re.sub(r'[^\w.@-]', '_', username) + '.json'
+
+
+def _scrivi_json(path, dati):
+    with open(path, 'w') as f:
+        json.dump(dati, f, ensure_ascii=False, indent=2)
+
+
+async def elabora_studente(credenziali, semaforo, cache, retry, limiter, calendario, oggi, server=None):
+    """Accesso, download e statistiche di un singolo studente"""
+    username = credenziali['username']
+    async with semaforo:
+        inizio = time.monotonic()
+        utente = classeviva.Utente(username, credenziali['password'])
+        if server:
+            reindirizza(utente, server)
+        limiter.install(utente, username)
+        metrics.instrument(utente)
+        install_errori_http(utente)
+        session = SessionManager(utente, cache, username)
+        try:
+            await retry.run(lambda: run_blocking(session.ensure), f'login {username}')
+        except Exception as e:
+            return {'username': username, 'errori': {'login': str(e)}}
+
+        sync = SyncEngine(cache, username)
+        esiti = await fetch_concurrently({
+            'carta': lambda: session.call(utente.carta),
+            'voti': lambda: session.call(lambda: sync.sync_voti(utente)),
+            'assenze': lambda: session.call(lambda: sync.sync_assenze(utente)),
+        }, timeout=TIMEOUTS, retry=retry)
+        durata = time.monotonic() - inizio
+
+    risultato = {'username': username, 'errori': {}, 'durata': round(durata, 3)}
+    for nome, (_, errore) in esiti.items():
+        if errore is not None:
+            risultato['errori'][nome] = str(errore)
+
+    carta = esiti['carta'][0] or {}
+    if carta:
+        risultato['nome'] = f"{carta.get('firstName', '')} {carta.get('lastName', '')}".strip()
+
+    voti = esiti['voti'][0]
+    if voti is not None:
+        records = normalizza_voti(voti.records)
+        risultato['_records'] = records
+        risultato['voti'] = statistiche_voti(records)
+
+    assenze = esiti['assenze'][0]
+    if assenze is not None:
+        risultato['assenze'] = riepilogo_assenze(assenze.records, calendario, oggi)
+    return risultato
+
+
+def riepilogo_classe(risultati):
+    """Statistiche aggregate su tutti gli studenti elaborati"""
+    tutti_i_voti = []
+    medie_studenti = []
+    assenze = []
+    for risultato in risultati:
+        tutti_i_voti.extend(risultato.get('_records', ()))
+        media = risultato.get('voti', {}).get('media_generale', {}).get('totale')
+        if media is not None:
+            medie_studenti.append(media)
+        if 'assenze' in risultato:
+            assenze.append(risultato['assenze'])
+
+    riepilogo = {
+        'studenti': len(risultati),
+        'con_errori': sum(1 for r in risultati if r.get('errori')),
+        # Voti di tutta la classe raggruppati insieme
+        'voti': statistiche_voti(tutti_i_voti),
+        'media_delle_medie': sum(medie_studenti) / len(medie_studenti) if medie_studenti else None,
+    }
+    if assenze:
+        riepilogo['assenze'] = {
+            'totale': sum(a['assenze'] for a in assenze),
+            'media_per_studente': sum(a['assenze'] for a in assenze) / len(assenze),
+            'oltre_il_limite': sum(1 for a in assenze if a['assenze_disponibili'] < 0),
+            'ritardi': sum(a['ritardi'] for a in assenze),
+            'uscite_anticipate': sum(a['uscite_anticipate'] for a in assenze),
+        }
+    return riepilogo
+
+
+async def esegui_batch(credenziali, output_dir, concorrenza=CONCORRENZA_PREDEFINITA,
+                       cache=None, calendar_config=None, rate=RATE_PREDEFINITO, server=None):
+    """Elabora tutti gli account con al più `concorrenza` studenti in parallelo"""
+    # Il client Classeviva è bloccante: ogni richiesta occupa un thread
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concorrenza * RICHIESTE_PER_STUDENTE)
+    loop.set_default_executor(executor)
+
+    oggi = date.today()
+    calendario = calendario_per(oggi, calendar_config, cache)
+    # Un solo circuit breaker per tutti: se il server è giù smettono tutti
+    retry = RetryPolicy(
+        max_attempts=3,
+        base_delay=0.5,
+        max_delay=10,
+        breaker=CircuitBreaker(failure_threshold=max(5, concorrenza), reset_timeout=30)
+    )
+    # Limite condiviso da tutti gli account; al più 2 richieste al secondo per account
+    limiter = RateLimiter(rate=rate, capacity=rate, per_account_rate=2, per_account_capacity=3)
+    semaforo = asyncio.Semaphore(concorrenza)
+
+    os.makedirs(output_dir, exist_ok=True)
+    risultati = []
+    try:
+        studenti = [
+            elabora_studente(c, semaforo, cache, retry, limiter, calendario, oggi, server)
+            for c in credenziali
+        ]
+        for completato in asyncio.as_completed(studenti):
+            risultato = await completato
+            risultati.append(risultato)
+            dati = {k: v for k, v in risultato.items() if not k.startswith('_')}
+            _scrivi_json(os.path.join(output_dir, _nome_file(risultato['username'])), dati)
+            avanzamento = f"[{len(risultati)}/{len(credenziali)}] {risultato['username']}"
+            if risultato['errori']:
+                log.warning('%s: errori: %s', avanzamento, ', '.join(risultato['errori']))
+            else:
+                log.info('%s: ok', avanzamento)
+    finally:
+        executor.shutdown(wait=False)
+
+    riepilogo = riepilogo_classe(risultati)
+    riepilogo['rate_limiter'] = limiter.metrics()
+    _scrivi_json(os.path.join(output_dir, 'riepilogo.json'), riepilogo)
+    metrics.registry.dump(os.path.join(output_dir, 'metrics.json'))
+    metrics.registry.dump(os.path.join(output_dir, 'metrics.prom'))
+    return riepilogo
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sincronizza e calcola le statistiche di più studenti')
+    parser.add_argument('credenziali', help='file JSON o CSV con username e password')
+    parser.add_argument('-o', '--output', default='risultati', help='cartella dei risultati')
+    parser.add_argument('-c', '--concorrenza', type=int, default=CONCORRENZA_PREDEFINITA,
+                        help='studenti elaborati in parallelo')
+    parser.add_argument('-r', '--rate', type=float, default=RATE_PREDEFINITO,
+                        help='richieste al secondo verso il server (adattive in caso di 429)')
+    parser.add_argument('--cache', help='database SQLite per sessioni e sincronizzazione incrementale')
+    parser.add_argument('--server', help='URL di un server alternativo (es. mock_server.py)')
+    parser.add_argument('--calendario', help='configurazione JSON di festività e pause')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    credenziali = carica_credenziali(args.credenziali)
+    cache = DataCache(args.cache) if args.cache else None
+    calendar_config = CalendarConfig.load(args.calendario) if args.calendario else None
+
+    inizio = time.monotonic()
+    try:
+        riepilogo = asyncio.run(esegui_batch(
+            credenziali, args.output, max(1, args.concorrenza), cache, calendar_config, args.rate, args.server
+        ))
+    finally:
+        if cache is not None:
+            cache.close()
+    log.info('Elaborati %d studenti in %.1fs (%d con errori)',
+             riepilogo['studenti'], time.monotonic() - inizio, riepilogo['con_errori'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Generatori di payload sintetici con la stessa forma delle risposte di Spaggiari
+
+genera_voti imita students/{id}/grades, genera_assenze imita
+students/{id}/absences/details e genera_carta imita students/{id}/card.
+Con lo stesso seed si ottengono sempre gli stessi dati.
+"""
+
+import random
+from datetime import date, timedelta
+
+
+MATERIE = [
+    (1, 'MATEMATICA'), (2, 'LINGUA E LETTERATURA ITALIANA'), (3, 'LINGUA INGLESE'),
+    (4, 'STORIA'), (5, 'FILOSOFIA'), (6, 'FISICA'), (7, 'SCIENZE NATURALI'),
+    (8, 'INFORMATICA'), (9, 'DISEGNO E STORIA DELL\'ARTE'), (10, 'SCIENZE MOTORIE E SPORTIVE'),
+    (11, 'RELIGIONE CATTOLICA'), (12, 'EDUCAZIONE CIVICA'),
+]
+COMPONENTI = ['Scritto', 'Orale', 'Pratico']
+CODICI_ASSENZA = ['ABA0', 'ABA0', 'ABR0', 'ABR1', 'ABU0']
+NOTE = ['', '', '', 'Verifica sulle equazioni', 'Interrogazione', 'Compito in classe']
+
+
+def _giorni_scuola(anno_inizio):
+    """Giorni feriali da settembre a giugno, su cui distribuire gli eventi"""
+    giorno = date(anno_inizio, 9, 10)
+    fine = date(anno_inizio + 1, 6, 10)
+    giorni = []
+    while giorno <= fine:
+        if giorno.weekday() < 5:
+            giorni.append(giorno.isoformat())
+        giorno += timedelta(days=1)
+    return giorni
+
+
+def _display(valore):
+    intero = int(valore)
+    resto = valore - intero
+    if resto == 0.5:
+        return f'{intero}½'
+    if resto == 0.25:
+        return f'{intero}+'
+    if resto == 0.75:
+        return f'{intero + 1}-'
+    return str(intero)
+
+
+def genera_voti(n, seed=0, anno_inizio=2025):
+    """n voti nel formato di /grades"""
+    rnd = random.Random(seed)
+    giorni = _giorni_scuola(anno_inizio)
+    voti = []
+    for i in range(n):
+        subject_id, materia = rnd.choice(MATERIE)
+        valore = max(1.0, min(10.0, round(rnd.gauss(6.8, 1.4) * 4) / 4))
+        blu = rnd.random() < 0.05
+        voti.append({
+            'subjectId': subject_id,
+            'subjectCode': '',
+            'subjectDesc': materia,
+            'evtId': 100000 + i,
+            'evtCode': 'GRV0',
+            'evtDate': rnd.choice(giorni),
+            'decimalValue': valore,
+            'displayValue': _display(valore),
+            'displaPos': 1,
+            'notesForFamily': rnd.choice(NOTE),
+            'color': 'blue' if blu else ('green' if valore >= 6 else 'red'),
+            'canceled': False,
+            'underlined': False,
+            'periodPos': 1,
+            'periodDesc': 'Primo Periodo',
+            'componentPos': 1,
+            'componentDesc': rnd.choice(COMPONENTI),
+            'weightFactor': 1,
+            'skillId': 0,
+            'gradeMasterId': 0,
+            'skillDesc': None,
+            'skillCode': None,
+            'skillMasterId': 0,
+            'skillValueDesc': ' ',
+            'skillValueShortDesc': None,
+            'oldskillId': 0,
+            'oldskillDesc': '',
+            'noAverage': blu,
+            'teacherName': 'ROSSI MARIO',
+        })
+    return voti
+
+
+def genera_assenze(n, seed=0, anno_inizio=2025):
+    """n eventi nel formato di /absences/details"""
+    rnd = random.Random(seed + 1)
+    giorni = _giorni_scuola(anno_inizio)
+    assenze = []
+    for i in range(n):
+        codice = rnd.choice(CODICI_ASSENZA)
+        giustificata = rnd.random() < 0.8
+        assenze.append({
+            'evtId': 200000 + i,
+            'evtCode': codice,
+            'evtDate': rnd.choice(giorni),
+            'evtHPos': None if codice == 'ABA0' else rnd.randint(1, 6),
+            'evtValue': None,
+            'isJustified': giustificata,
+            'justifReasonCode': 'A' if giustificata else None,
+            'justifReasonDesc': 'Motivi di salute' if giustificata else None,
+            'hoursAbsence': [],
+        })
+    return assenze
+
+
+def genera_carta(seed=0):
+    """Carta dello studente nel formato di /card"""
+    rnd = random.Random(seed)
+    return {
+        'ident': f'S{rnd.randint(1000000, 9999999)}X',
+        'usrType': 'S',
+        'usrId': rnd.randint(1000000, 9999999),
+        'miurSchoolCode': 'XXPS000000',
+        'miurDivisionCode': 'XXPS000000',
+        'firstName': 'MARIO',
+        'lastName': 'ROSSI',
+        'birthDate': '2008-01-01',
+        'fiscalCode': 'RSSMRA08A01H501X',
+        'schCode': 'XX00000',
+        'schName': 'LICEO SCIENTIFICO',
+        'schDedication': 'G. GALILEI',
+        'schCity': 'ROMA',
+        'schProv': 'RM',
+    }
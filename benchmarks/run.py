@@ -0,0 +1,212 @@
+"""Benchmark dell'elaborazione di voti e assenze e della costruzione dei widget
+
+Uso:
+    python benchmarks/run.py                          # dimensioni predefinite
+    python benchmarks/run.py --sizes 50,1000 --widgets -o risultati.json
+
+Il risultato è un JSON confrontabile tra commit diversi: per ogni caso il
+tempo migliore e medio su --repeat esecuzioni e il picco di memoria Python
+(tracemalloc) misurato in un'esecuzione separata.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+
+from payloads import genera_assenze, genera_voti  # noqa: E402
+
+from absences import conta_eventi, riepilogo_assenze  # noqa: E402
+from aggregates import AggregateStore  # noqa: E402
+from grades import normalizza_voti  # noqa: E402
+from school_calendar import CalendarConfig, SchoolCalendar, anno_scolastico  # noqa: E402
+from stats import GradeArrays, carica_numpy, compute_stats, stats_from_records  # noqa: E402
+from sync import hash_payload  # noqa: E402
+
+
+DIMENSIONI_PREDEFINITE = [50, 500, 5000, 50000, 1000000]
+# Oltre questa dimensione i widget non hanno senso (e richiedono minuti)
+WIDGET_MAX_PREDEFINITO = 5000
+
+
+def _ripetizioni(n, repeat):
+    # Sui payload enormi basta una misura
+    return 1 if n >= 200000 else repeat
+
+
+def misura(nome, n, funzione, repeat=5, memoria=True):
+    """Tempo migliore/medio di funzione() e picco di memoria allocata"""
+    tempi = []
+    for _ in range(repeat):
+        gc.collect()
+        inizio = time.perf_counter()
+        funzione()
+        tempi.append(time.perf_counter() - inizio)
+
+    picco = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funzione()
+            picco = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    risultato = {
+        'nome': nome,
+        'n': n,
+        'ripetizioni': repeat,
+        'secondi_min': min(tempi),
+        'secondi_medi': sum(tempi) / len(tempi),
+        'picco_memoria_byte': picco,
+    }
+    print(f"{nome:<32} n={n:<8} {risultato['secondi_min'] * 1000:10.2f} ms"
+          + (f'  {picco / 1024 / 1024:8.2f} MiB' if picco is not None else ''), file=sys.stderr)
+    return risultato
+
+
+def benchmark_calcoli(n, repeat):
+    """Percorsi di calcolo puro: decodifica, normalizzazione, statistiche, assenze"""
+    repeat = _ripetizioni(n, repeat)
+    voti = genera_voti(n)
+    assenze = genera_assenze(n)
+    testo_voti = json.dumps({'grades': voti})
+    records = normalizza_voti(voti)
+    oggi = date(2026, 3, 15)
+    calendario = SchoolCalendar(anno_scolastico(oggi), CalendarConfig())
+
+    valori = [v['decimalValue'] for v in voti]
+    materie = [v['subjectDesc'] for v in voti]
+    date_voti = [v['evtDate'] for v in voti]
+
+    return [
+        misura('json_decode_voti', n, lambda: json.loads(testo_voti), repeat),
+        misura('normalizza_voti', n, lambda: normalizza_voti(voti), repeat),
+        misura('stats_from_records', n, lambda: stats_from_records(records), repeat),
+        misura('stats_from_columns', n,
+               lambda: compute_stats(GradeArrays.from_columns(valori, materie, date_voti)), repeat),
+        misura('aggregati_from_records', n, lambda: AggregateStore.from_records(records), repeat),
+        misura('hash_payload_voti', n, lambda: hash_payload(voti), repeat),
+        misura('conta_eventi_assenze', n, lambda: conta_eventi(assenze), repeat),
+        misura('riepilogo_assenze', n, lambda: riepilogo_assenze(assenze, calendario, oggi), repeat),
+    ]
+
+
+def benchmark_calendario(repeat):
+    """Costruzione dell'indice del calendario e lookup O(1)"""
+    config = CalendarConfig()
+    calendario = SchoolCalendar(2025, config)
+    giorni = [date(2025, 9, 1).toordinal() + i for i in range(365)]
+
+    def lookup():
+        for ordinale in giorni:
+            calendario.giorni_trascorsi(date.fromordinal(ordinale))
+
+    return [
+        misura('calendario_costruzione', 1, lambda: SchoolCalendar(2025, config), repeat),
+        misura('calendario_lookup_anno', len(giorni), lookup, repeat),
+    ]
+
+
+class _AppFinta:
+    """Quanto basta di ClassevivaApp per costruire la MainScreen"""
+
+    def __init__(self):
+        self.config_calendario = CalendarConfig()
+
+    def school_calendar(self, oggi):
+        return SchoolCalendar(anno_scolastico(oggi), self.config_calendario)
+
+    def do_logout(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+
+def benchmark_widget(dimensioni, repeat):
+    """Costruzione dell'albero dei widget in una finestra Kivy senza display"""
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+    os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        from main import MainScreen
+    except Exception as e:
+        print(f'Errore avvio Kivy headless: {e}', file=sys.stderr)
+        return [{'nome': 'widget', 'errore': str(e)}]
+
+    risultati = []
+    for n in dimensioni:
+        voti = genera_voti(n)
+        assenze = genera_assenze(n)
+        schermata = MainScreen(_AppFinta())
+        # Ogni ripetizione usa un nuovo payload: niente memoizzazione tra le misure
+        risultati.extend([
+            misura('widget_costruzione_schermata', n, lambda: MainScreen(_AppFinta()), repeat),
+            misura('widget_display_voti', n, lambda: schermata.display_voti(list(voti)), repeat),
+            misura('widget_display_media', n, lambda: schermata.display_media(list(voti)), repeat),
+            misura('widget_display_statistics', n, lambda: schermata.display_statistics(list(voti)), repeat),
+            misura('widget_display_assenze', n, lambda: schermata.display_assenze(list(assenze)), repeat),
+        ])
+    return risultati
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RADICE, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark di Classeviva Client')
+    parser.add_argument('--sizes', default=','.join(map(str, DIMENSIONI_PREDEFINITE)),
+                        help='dimensioni dei payload, separate da virgola')
+    parser.add_argument('--repeat', type=int, default=5, help='ripetizioni per misura')
+    parser.add_argument('--widgets', action='store_true', help='misura anche la costruzione dei widget')
+    parser.add_argument('--widget-max', type=int, default=WIDGET_MAX_PREDEFINITO,
+                        help='dimensione massima per i benchmark dei widget')
+    parser.add_argument('-o', '--output', help='file JSON dei risultati (predefinito: stdout)')
+    args = parser.parse_args()
+
+    dimensioni = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    risultati = benchmark_calendario(args.repeat)
+    for n in dimensioni:
+        risultati.extend(benchmark_calcoli(n, args.repeat))
+    if args.widgets:
+        risultati.extend(benchmark_widget([n for n in dimensioni if n <= args.widget_max], args.repeat))
+
+    report = {
+        'meta': {
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': carica_numpy().__version__ if carica_numpy() is not None else None,
+            'piattaforma': platform.platform(),
+        },
+        'risultati': risultati,
+    }
+    testo = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(testo)
+    else:
+        print(testo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Cache locale su SQLite per carta, voti e assenze"""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+# Durata di validità (in secondi) di ogni risorsa salvata
+TTL_PREDEFINITI = {
+    'carta': 7 * 24 * 3600,
+    'voti': 15 * 60,
+    'assenze': 30 * 60,
+}
+
+
+class DataCache:
+    """Archivio su disco degli ultimi dati scaricati, con scadenza per risorsa"""
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = dict(TTL_PREDEFINITI)
+        if ttl:
+            self.ttl.update(ttl)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS risorse ('
+            ' utente TEXT NOT NULL,'
+            ' risorsa TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' aggiornato REAL NOT NULL,'
+            ' PRIMARY KEY (utente, risorsa))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta ('
+            ' utente TEXT NOT NULL,'
+            ' chiave TEXT NOT NULL,'
+            ' valore TEXT NOT NULL,'
+            ' PRIMARY KEY (utente, chiave))'
+        )
+        self._conn.commit()
+
+    def get(self, utente, risorsa):
+        """Ritorna (payload, timestamp) oppure (None, None) se assente"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload, aggiornato FROM risorse WHERE utente = ? AND risorsa = ?',
+                (utente, risorsa)
+            ).fetchone()
+        if row is None:
+            return None, None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None, None
+
+    def load(self, utente, risorsa):
+        """Ritorna l'ultimo payload salvato, anche se scaduto"""
+        return self.get(utente, risorsa)[0]
+
+    def is_fresh(self, utente, risorsa):
+        """Verifica se il dato salvato è ancora entro il suo TTL"""
+        payload, aggiornato = self.get(utente, risorsa)
+        if payload is None:
+            return False
+        return time.time() - aggiornato < self.ttl.get(risorsa, 0)
+
+    def put(self, utente, risorsa, payload, annullato=None):
+        """Salva il payload della risorsa sostituendo il precedente
+
+        annullato è un threading.Event della sessione che scrive: se è impostato
+        (es. logout) il salvataggio viene scartato. Il controllo avviene sotto lo
+        stesso lock di clear(), così nessuna scrittura può seguire la pulizia.
+        """
+        with self._lock:
+            if annullato is not None and annullato.is_set():
+                return False
+            self._conn.execute(
+                'INSERT OR REPLACE INTO risorse (utente, risorsa, payload, aggiornato) VALUES (?, ?, ?, ?)',
+                (utente, risorsa, json.dumps(payload), time.time())
+            )
+            self._conn.commit()
+        return True
+
+    def touch(self, utente, risorsa, annullato=None):
+        """Rinnova il timestamp di un payload confermato identico dal server"""
+        with self._lock:
+            if annullato is not None and annullato.is_set():
+                return False
+            self._conn.execute(
+                'UPDATE risorse SET aggiornato = ? WHERE utente = ? AND risorsa = ?',
+                (time.time(), utente, risorsa)
+            )
+            self._conn.commit()
+        return True
+
+    def get_meta(self, utente, chiave):
+        """Ritorna un valore ausiliario (es. cursori di sincronizzazione)"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT valore FROM meta WHERE utente = ? AND chiave = ?',
+                (utente, chiave)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def put_meta(self, utente, chiave, valore, annullato=None):
+        with self._lock:
+            if annullato is not None and annullato.is_set():
+                return False
+            self._conn.execute(
+                'INSERT OR REPLACE INTO meta (utente, chiave, valore) VALUES (?, ?, ?)',
+                (utente, chiave, json.dumps(valore))
+            )
+            self._conn.commit()
+        return True
+
+    def clear(self, utente=None):
+        """Elimina i dati di un utente (o di tutti)"""
+        with self._lock:
+            for tabella in ('risorse', 'meta'):
+                if utente is None:
+                    self._conn.execute(f'DELETE FROM {tabella}')
+                else:
+                    self._conn.execute(f'DELETE FROM {tabella} WHERE utente = ?', (utente,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,25 @@
+"""Server a cui si collega il client classeviva
+
+Le richieste di classeviva.Utente vanno sempre a web.spaggiari.eu;
+reindirizza le manda a un altro server compatibile (mock_server.py, un
+proxy) senza dipendere dal server mock né dai suoi payload sintetici.
+"""
+
+BASE_REALE = 'https://web.spaggiari.eu'
+
+
+def reindirizza(utente, base_url):
+    """Invia al server indicato le richieste di un classeviva.Utente destinate a Spaggiari"""
+    sessione = getattr(utente, '_sessione', None)
+    if sessione is None:
+        return False
+    originale = sessione.request
+    base_url = base_url.rstrip('/')
+
+    def request(method, url, *args, **kwargs):
+        if url.startswith(BASE_REALE):
+            url = base_url + url[len(BASE_REALE):]
+        return originale(method, url, *args, **kwargs)
+
+    sessione.request = request
+    return True
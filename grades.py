@@ -0,0 +1,71 @@
+"""Modello normalizzato dei voti, calcolato una sola volta per payload"""
+
+from datetime import datetime
+
+
+def determina_quadrimestre(data):
+    """Determina il quadrimestre basandosi sulla data del voto"""
+    try:
+        if isinstance(data, str):
+            data = datetime.strptime(data, '%Y-%m-%d')
+        mese = data.month
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    if mese >= 9 or mese == 1:
+        return 1
+    elif mese >= 2 and mese <= 6:
+        return 2
+    return None
+
+
+def valore_numerico(valore):
+    """Converte un voto (es. '7+', '6½', '8-') nel suo valore numerico approssimato"""
+    try:
+        return float(str(valore).replace(',', '.').replace('+', '').replace('-', '').replace('½', '.5'))
+    except (ValueError, TypeError):
+        return None
+
+
+class Voto:
+    """Voto già interpretato: materia, data, quadrimestre e valore pronti all'uso"""
+
+    __slots__ = (
+        'evt_id', 'materia', 'valore_str', 'valore_display', 'valore',
+        'data_str', 'data', 'quadrimestre', 'conta', 'tipo', 'nota',
+    )
+
+    def __init__(self, voto):
+        self.evt_id = voto.get('evtId')
+        self.materia = voto.get('subjectDesc', voto.get('materia', 'N/A'))
+        self.valore_str = str(voto.get('displayValue', voto.get('decimalValue', voto.get('voto', 'N/A'))))
+        # Valore mostrato, usato per il colore della card
+        self.valore_display = valore_numerico(self.valore_str)
+        self.data_str = voto.get('evtDate', voto.get('data', 'N/A'))
+        self.tipo = voto.get('componentDesc', voto.get('tipo', 'N/A'))
+        self.nota = voto.get('notesForFamily', voto.get('nota', '')) or ''
+        # I voti blu non fanno media
+        self.conta = voto.get('color', '') != 'blue'
+
+        try:
+            self.data = datetime.strptime(self.data_str, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            self.data = None
+        self.quadrimestre = determina_quadrimestre(self.data) if self.data else None
+
+        # Valore usato nelle medie: solo voti numerici positivi
+        try:
+            valore = float(voto.get('decimalValue', voto.get('voto', 0)))
+            self.valore = valore if valore > 0 else None
+        except (ValueError, TypeError):
+            self.valore = None
+
+    @property
+    def in_media(self):
+        """True se il voto entra nel calcolo delle medie"""
+        return self.conta and self.valore is not None
+
+
+def normalizza_voti(voti_data):
+    """Converte la lista grezza dell'API in una lista di Voto"""
+    return [Voto(voto) for voto in voti_data or []]
@@ -0,0 +1,80 @@
+"""Caricamento concorrente delle risorse di Classeviva"""
+
+import asyncio
+import threading
+
+from metrics import observe, span
+from retry import RetryPolicy
+
+
+# Un event loop per ogni thread dell'executor, creato alla prima chiamata e
+# riusato da tutte le successive (i thread del pool sono a loro volta riusati)
+_locale = threading.local()
+
+
+def _loop_del_thread():
+    loop = getattr(_locale, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _locale.loop = asyncio.new_event_loop()
+    return loop
+
+
+def _esegui_coroutine(factory):
+    """Esegue la coroutine nell'event loop del thread corrente
+
+    Non si può usare il loop del runtime: le coroutine di classeviva.Utente
+    chiamano requests in modo bloccante al loro interno, senza punti in cui
+    passare a run_in_executor, e fermerebbero tutto il runtime. Serve quindi
+    un loop nel thread di lavoro, ma uno solo per thread invece di uno nuovo
+    per ogni operazione.
+    """
+    return _loop_del_thread().run_until_complete(factory())
+
+
+async def run_blocking(factory):
+    """Esegue la coroutine di factory in un thread dell'executor del loop"""
+    # classeviva.Utente fa richieste HTTP bloccanti dentro le sue coroutine:
+    # eseguirle in un thread è l'unico modo per sovrapporle davvero
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _esegui_coroutine, factory)
+
+
+async def fetch_concurrently(richieste, timeout=None, on_result=None, retry=None, in_thread=True):
+    """
+    Esegue in parallelo le richieste indicate.
+
+    richieste: dict nome -> funzione che ritorna la coroutine da eseguire
+    timeout: secondi per tentativo, unico o dict per nome
+    on_result: callback(nome, risultato, errore) chiamata appena una richiesta termina
+    retry: RetryPolicy da applicare a ogni richiesta
+    Ritorna un dict nome -> (risultato, errore); un errore non blocca le altre richieste.
+    """
+    if retry is None:
+        retry = RetryPolicy()
+
+    async def esegui(nome, factory):
+        limite = timeout.get(nome) if isinstance(timeout, dict) else timeout
+
+        def tentativo():
+            chiamata = run_blocking(factory) if in_thread else factory()
+            return asyncio.wait_for(chiamata, limite)
+
+        risultato, errore = None, None
+        try:
+            with span('fetch', risorsa=nome):
+                risultato = await retry.run(tentativo, nome)
+        except Exception as e:
+            errore = e
+        else:
+            records = getattr(risultato, 'records', risultato)
+            if isinstance(records, list):
+                observe('record', len(records), risorsa=nome)
+        if on_result is not None:
+            try:
+                on_result(nome, risultato, errore)
+            except Exception as e:
+                print(f'Errore consegna risultato {nome}: {e}')
+        return nome, (risultato, errore)
+
+    esiti = await asyncio.gather(*(esegui(nome, factory) for nome, factory in richieste.items()))
+    return dict(esiti)
@@ -1,9 +1,11 @@
 # --------------------------------------------
 # Classeviva Client 
 # By James Capelli
-# Dependencies: python 3.8+, kivy, matplotlib
+# Dependencies: python 3.8+, kivy, matplotlib (optional: numpy)
 # --------------------------------------------
 
+# Primo import: da qui partono le misure di avvio (CLASSEVIVA_PROFILE_STARTUP)
+import startup
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -16,13 +18,36 @@ from kivy.clock import Clock
 from kivy.metrics import dp, sp
 from kivy.core.window import Window
 from kivy.graphics import Color, Rectangle, Line
+from kivy.core.text import Label as CoreLabel
+from kivy.core.text.markup import MarkupLabel
 from kivy.uix.widget import Widget
-import classeviva
-from datetime import datetime, timedelta
-import threading
-import asyncio
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.properties import ListProperty, StringProperty
+# classeviva (requests), asyncio e i moduli di rete si importano dopo il
+# primo frame: vedi ClassevivaApp.avvia_rete e _login
+from cache import DataCache
+from sync import SyncEngine, hash_payload
+from grades import normalizza_voti
+from stats import stats_from_records
+from school_calendar import CalendarConfig, calendario_per
+from absences import riepilogo_assenze
+import metrics
+import streaming
+from scheduler import BUDGET_FRAME, FrameScheduler
+from collections import deque
+from datetime import date
+import functools
 import json
 import os
+import threading
+import time
+
+startup.profiler.fase('import')
+
+# Voti normalizzati (o righe preparate) per ogni passo dei lavori sulla UI
+LOTTO_VOTI = 250
 
 
 class ResponsiveLayout:
@@ -58,6 +83,95 @@ class ResponsiveLayout:
         return dp(base_height)
 
 
+def registra_vista(schermata, vista, contenitore, dati):
+    """Numero di widget e record di una vista appena costruita"""
+    widget = getattr(schermata, contenitore)
+    metrics.observe('widget', sum(1 for _ in widget.walk(restrict=True)) - 1, vista=vista)
+    metrics.observe('record', len(dati or ()), vista=vista)
+
+
+def misura_vista(vista, contenitore):
+    """Registra durata e numero di widget creati da un metodo display_*"""
+    def decora(metodo):
+        @functools.wraps(metodo)
+        def wrapper(self, dati, *args, **kwargs):
+            with metrics.span('display', vista=vista):
+                risultato = metodo(self, dati, *args, **kwargs)
+            registra_vista(self, vista, contenitore, dati)
+            return risultato
+        return wrapper
+    return decora
+
+
+class VotoRow(RecycleDataViewBehavior, BoxLayout):
+    """Riga riutilizzabile della lista voti: i widget vengono creati una volta sola"""
+    
+    valore = StringProperty('')
+    data = StringProperty('')
+    materia = StringProperty('')
+    tipo = StringProperty('')
+    nota = StringProperty('')
+    colore = ListProperty([1, 1, 1, 1])
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.orientation = 'horizontal'
+        
+        # Box voto (sinistra)
+        voto_left = BoxLayout(orientation='vertical', size_hint_x=0.25, padding=dp(5))
+        self.valore_label = Label(markup=True, size_hint_y=0.6)
+        self.data_label = Label(size_hint_y=0.4)
+        voto_left.add_widget(self.valore_label)
+        voto_left.add_widget(self.data_label)
+        
+        # Box dettagli (destra)
+        voto_right = BoxLayout(orientation='vertical', size_hint_x=0.75, padding=dp(5), spacing=dp(2))
+        self.materia_label = Label(markup=True, size_hint_y=None, halign='left', valign='middle')
+        self.tipo_label = Label(size_hint_y=None, halign='left', valign='middle')
+        self.nota_label = Label(size_hint_y=None, color=(0.7, 0.7, 0.7, 1), halign='left', valign='top')
+        for label in (self.materia_label, self.tipo_label, self.nota_label):
+            label.bind(size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None)))
+            voto_right.add_widget(label)
+        
+        self.add_widget(voto_left)
+        self.add_widget(voto_right)
+        
+        # Separatore disegnato sotto la riga
+        with self.canvas.after:
+            Color(0.3, 0.3, 0.3, 0.5)
+            self.separator = Rectangle(pos=self.pos, size=(self.width, dp(1)))
+        self.bind(pos=self._update_separator, size=self._update_separator)
+    
+    def _update_separator(self, *args):
+        self.separator.pos = self.pos
+        self.separator.size = (self.width, dp(1))
+    
+    def refresh_view_attrs(self, rv, index, data):
+        """Aggiorna i contenuti quando la riga viene riciclata per un altro voto"""
+        super().refresh_view_attrs(rv, index, data)
+        self.padding = ResponsiveLayout.get_padding()
+        self.spacing = ResponsiveLayout.get_spacing()
+        
+        self.valore_label.text = f'[b]{self.valore}[/b]'
+        self.valore_label.color = self.colore
+        self.valore_label.font_size = ResponsiveLayout.get_font_size(28)
+        self.data_label.text = self.data
+        self.data_label.font_size = ResponsiveLayout.get_font_size(10)
+        
+        self.materia_label.text = f'[b]{self.materia}[/b]'
+        self.materia_label.font_size = ResponsiveLayout.get_font_size(14)
+        self.materia_label.height = ResponsiveLayout.get_height(25)
+        self.tipo_label.text = self.tipo
+        self.tipo_label.font_size = ResponsiveLayout.get_font_size(12)
+        self.tipo_label.height = ResponsiveLayout.get_height(20)
+        
+        # Note (se presenti)
+        self.nota_label.text = self.nota
+        self.nota_label.font_size = ResponsiveLayout.get_font_size(10)
+        self.nota_label.height = ResponsiveLayout.get_height(40) if self.nota else 0
+        self.nota_label.opacity = 1 if self.nota else 0
+
+
 class LoginScreen(BoxLayout):
     def __init__(self, app_instance, **kwargs):
         super().__init__(**kwargs)
@@ -162,11 +276,162 @@ class LoginScreen(BoxLayout):
         self.error_label.text = 'Accesso in corso...'
         self.error_label.color = (0, 1, 0, 1)
         
-        thread = threading.Thread(
-            target=self.app.login,
-            args=(username, password)
-        )
-        thread.start()
+        self.app.login(username, password)
+
+
+class _RigaGrafico:
+    """Istruzioni grafiche di una riga di GraficoBarre"""
+    
+    __slots__ = ('etichetta', 'frazione', 'testo_valore', 'sfondo', 'barra', 'rect_etichetta', 'rect_valore')
+
+
+class GraficoBarre(Widget):
+    """
+    Grafico a barre orizzontali disegnato su un unico canvas.
+    
+    Le istruzioni vengono create solo quando cambiano i dati; su pos e size
+    si aggiornano soltanto le coordinate (i testi si rigenerano solo se cambia la larghezza).
+    righe: lista di (etichetta, frazione 0-1, colore, testo del valore con markup)
+    """
+    
+    def __init__(self, righe, altezza_riga, colonne=(0.4, 0.4, 0.2), font_etichetta=12,
+                 font_valore=13, allinea_etichetta='left', etichetta_bold=False, soglia=None, **kwargs):
+        kwargs.setdefault('size_hint_y', None)
+        super().__init__(**kwargs)
+        self.altezza_riga = altezza_riga
+        self.colonne = colonne
+        self.font_etichetta = font_etichetta
+        self.font_valore = font_valore
+        self.allinea_etichetta = allinea_etichetta
+        self.etichetta_bold = etichetta_bold
+        # Frazione della barra su cui tracciare la linea di riferimento (es. il 6)
+        self.soglia = soglia
+        self._righe = []
+        self._linea_soglia = None
+        self._larghezza_testi = None
+        self.bind(pos=self._aggiorna, size=self._aggiorna)
+        self.set_data(righe)
+    
+    def set_data(self, righe):
+        """Ricrea le istruzioni per nuovi dati"""
+        self.canvas.clear()
+        self._righe = []
+        with self.canvas:
+            for etichetta, frazione, colore, testo_valore in righe:
+                riga = _RigaGrafico()
+                riga.etichetta = etichetta
+                riga.frazione = max(0.0, min(frazione, 1.0))
+                riga.testo_valore = testo_valore
+                Color(0.9, 0.9, 0.9, 1)
+                riga.sfondo = Rectangle()
+                Color(*colore)
+                riga.barra = Rectangle()
+                Color(1, 1, 1, 1)
+                riga.rect_etichetta = Rectangle(size=(0, 0))
+                riga.rect_valore = Rectangle(size=(0, 0))
+                self._righe.append(riga)
+            self._linea_soglia = None
+            if self.soglia is not None and righe:
+                Color(1, 0.6, 0, 0.5)
+                self._linea_soglia = Line(width=1.5)
+        self._larghezza_testi = None
+        self.height = self.altezza_riga * len(righe)
+        self._aggiorna()
+    
+    def _colonne(self):
+        padding = dp(5)
+        spacing = ResponsiveLayout.get_spacing()
+        utile = max(0, self.width - 2 * padding - spacing * (len(self.colonne) - 1))
+        larghezze = [utile * c for c in self.colonne]
+        x = self.x + padding
+        posizioni = []
+        for larghezza in larghezze:
+            posizioni.append(x)
+            x += larghezza + spacing
+        return posizioni, larghezze
+    
+    def _testi(self, larghezze):
+        """Rigenera le texture dei testi (solo quando cambia la larghezza)"""
+        for riga in self._righe:
+            etichetta = CoreLabel(
+                text=riga.etichetta,
+                font_size=ResponsiveLayout.get_font_size(self.font_etichetta),
+                bold=self.etichetta_bold,
+                text_size=(larghezze[0], None),
+                halign=self.allinea_etichetta
+            )
+            etichetta.refresh()
+            riga.rect_etichetta.texture = etichetta.texture
+            riga.rect_etichetta.size = etichetta.texture.size if etichetta.texture else (0, 0)
+            
+            valore = MarkupLabel(
+                text=riga.testo_valore,
+                font_size=ResponsiveLayout.get_font_size(self.font_valore),
+                halign='center'
+            )
+            valore.refresh()
+            riga.rect_valore.texture = valore.texture
+            riga.rect_valore.size = valore.texture.size if valore.texture else (0, 0)
+        self._larghezza_testi = self.width
+    
+    def _aggiorna(self, *args):
+        if not self._righe:
+            return
+        (x_etichetta, x_barra, x_valore), (l_etichetta, l_barra, l_valore) = self._colonne()
+        if self._larghezza_testi != self.width:
+            self._testi((l_etichetta, l_barra, l_valore))
+        
+        padding = dp(5)
+        altezza_barra = max(0, self.altezza_riga - 2 * padding)
+        for i, riga in enumerate(self._righe):
+            y = self.top - (i + 1) * self.altezza_riga
+            y_barra = y + padding
+            riga.sfondo.pos = (x_barra, y_barra)
+            riga.sfondo.size = (l_barra, altezza_barra)
+            riga.barra.pos = (x_barra, y_barra)
+            riga.barra.size = (l_barra * riga.frazione, altezza_barra)
+            
+            w, h = riga.rect_etichetta.size
+            if self.allinea_etichetta == 'left':
+                x_testo = x_etichetta
+            else:
+                x_testo = x_etichetta + (l_etichetta - w) / 2
+            riga.rect_etichetta.pos = (x_testo, y + (self.altezza_riga - h) / 2)
+            w, h = riga.rect_valore.size
+            riga.rect_valore.pos = (x_valore + (l_valore - w) / 2, y + (self.altezza_riga - h) / 2)
+        
+        if self._linea_soglia is not None:
+            x = x_barra + self.soglia * l_barra
+            self._linea_soglia.points = [x, self.y + padding, x, self.top - padding]
+
+
+class BarraProgresso(Widget):
+    """Barra di avanzamento con linee di riferimento; istruzioni create una volta sola"""
+    
+    def __init__(self, frazione, colore, marcatori=(), **kwargs):
+        super().__init__(**kwargs)
+        self.frazione = max(0.0, min(frazione, 1.0))
+        # marcatori: lista di (frazione, colore, spessore)
+        self._marcatori = []
+        with self.canvas:
+            Color(0.9, 0.9, 0.9, 1)
+            self._sfondo = Rectangle()
+            Color(*colore)
+            self._barra = Rectangle()
+            for posizione, colore_linea, spessore in marcatori:
+                Color(*colore_linea)
+                self._marcatori.append((posizione, Line(width=spessore)))
+        self.bind(pos=self._aggiorna, size=self._aggiorna)
+        self._aggiorna()
+    
+    def _aggiorna(self, *args):
+        self._sfondo.pos = self.pos
+        self._sfondo.size = self.size
+        self._barra.pos = self.pos
+        self._barra.size = (self.frazione * self.width, self.height)
+        for posizione, linea in self._marcatori:
+            x = self.x + posizione * self.width
+            linea.points = [x, self.y, x, self.top]
 
 
 class MainScreen(BoxLayout):
@@ -202,6 +467,8 @@ class MainScreen(BoxLayout):
         header.add_widget(self.user_label)
         header.add_widget(logout_btn)
         self.add_widget(header)
+        self.header = header
+        self.logout_btn = logout_btn
         
         # Tab panel con altezza tab responsiva
         self.tabs = TabbedPanel(
@@ -214,9 +481,12 @@ class MainScreen(BoxLayout):
         
         # Tab Voti
         self.voti_tab = TabbedPanelItem(text='Voti')
-        self.voti_content = ScrollView()
-        self.voti_layout = GridLayout(
-            cols=1,
+        # Lista virtualizzata: solo le righe visibili esistono come widget
+        self.voti_content = RecycleView()
+        self.voti_content.viewclass = VotoRow
+        self.voti_layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size_hint=(1, None),
             spacing=ResponsiveLayout.get_spacing(),
             size_hint_y=None,
             padding=ResponsiveLayout.get_padding()
@@ -271,466 +541,309 @@ class MainScreen(BoxLayout):
         self.add_widget(self.tabs)
         
         self.data_loaded = False
+        self.nome_utente = ''
         self.voti_data = []
         self.assenze_data = []
+        self._records_src = None
+        self._records_cache = []
+        self._stats_src = None
+        # Voti in arrivo durante il download (vedi queue_voti)
+        self._coda_voti = deque()
+        self._voti_streaming = []
+        # Tentativo di download a cui appartengono i voti parziali mostrati e
+        # ultimo tentativo annullato: i lotti dei tentativi superati si scartano
+        self._generazione_streaming = 0
+        self._generazione_annullata = 0
+        self._trigger_coda_voti = Clock.create_trigger(self._svuota_coda_voti)
+        self._stats_cache = None
+        
+        # Ricostruzione dei tab a passi entro il budget del frame: prima il
+        # tab visibile, poi gli altri in background (vedi refresh_tabs)
+        self.scheduler = FrameScheduler(lambda fn: Clock.schedule_once(lambda dt: fn(), 0))
+        self._tab_builders = {
+            self.voti_tab: ('voti', 'voti_content', 'voti', self._costruisci_voti),
+            self.media_tab: ('media', 'media_layout', 'voti', self._costruisci_media),
+            self.stats_tab: ('statistics', 'stats_layout', 'voti', self._costruisci_statistiche),
+            self.assenze_tab: ('assenze', 'assenze_layout', 'assenze', self._costruisci_assenze),
+        }
+        # Impronta (hash_payload) dei dati di ogni risorsa e di quelli mostrati
+        # da ogni vista: se coincidono la vista non viene ricostruita
+        self._impronte_dati = {}
+        self._impronte_viste = {}
+        self._impronte_in_corso = {}
+        self._layout_tablet = ResponsiveLayout.is_tablet()
+        self._resize_trigger = Clock.create_trigger(self._apply_resize, 0.2)
+        self.tabs.bind(current_tab=self.on_tab_changed)
     
     def on_window_resize(self, instance, width, height):
-        """Aggiorna layout quando cambia orientamento"""
+        """Raggruppa gli eventi di resize: il layout si aggiorna quando si fermano"""
+        self._resize_trigger.cancel()
+        self._resize_trigger()
+    
+    def _apply_resize(self, dt):
+        tablet = ResponsiveLayout.is_tablet()
+        if tablet == self._layout_tablet:
+            # Stesso breakpoint: dimensioni responsive invariate, basta il layout di Kivy
+            return
+        self._layout_tablet = tablet
+        self._update_chrome()
         if self.data_loaded:
-            Clock.schedule_once(lambda dt: self.refresh_all_data(), 0.1)
+            self.refresh_all_data(forza=True)
+    
+    def _update_chrome(self):
+        """Adatta in place font e padding delle parti fisse della schermata"""
+        self.header.height = ResponsiveLayout.get_height(60)
+        self.header.padding = ResponsiveLayout.get_padding()
+        self.user_label.font_size = ResponsiveLayout.get_font_size(16)
+        self.logout_btn.font_size = ResponsiveLayout.get_font_size(14)
+        self.tabs.tab_height = ResponsiveLayout.get_height(50)
+        for layout in (self.voti_layout, self.media_layout, self.stats_layout, self.assenze_layout):
+            layout.spacing = ResponsiveLayout.get_spacing()
+            layout.padding = ResponsiveLayout.get_padding()
+    
+    def refresh_all_data(self, forza=False):
+        self.refresh_tabs(self._tab_builders, forza)
+    
+    def _dati(self, risorsa):
+        return self.voti_data if risorsa == 'voti' else self.assenze_data
+    
+    def refresh_tabs(self, tabs, forza=False):
+        """Ricostruisce a passi i tab i cui dati sono cambiati (tutti con forza=True)
+        
+        Il lavoro ancora in corso sugli stessi tab viene annullato.
+        """
+        for tab in tabs:
+            vista, contenitore, risorsa, costruisci = self._tab_builders[tab]
+            impronta = self._impronte_dati.get(risorsa)
+            if not forza and impronta is not None and impronta in (
+                    self._impronte_viste.get(vista),
+                    self._impronte_in_corso.get(vista) if self.scheduler.pending(vista) else None):
+                # Stessi dati già mostrati (o in costruzione)
+                metrics.observe('display_saltato', 1, vista=vista)
+                continue
+            self._impronte_viste.pop(vista, None)
+            self._impronte_in_corso[vista] = impronta
+            dati = self._dati(risorsa)
+            priorita = 0 if tab is self.tabs.current_tab else 1
+            self.scheduler.submit(
+                vista, costruisci(dati), priorita,
+                on_done=lambda lavoro, contenitore=contenitore, dati=dati, impronta=impronta:
+                    self._vista_completata(lavoro, contenitore, dati, impronta)
+            )
+    
+    def _vista_completata(self, lavoro, contenitore, dati, impronta):
+        if impronta is not None:
+            self._impronte_viste[lavoro.chiave] = impronta
+        metrics.registry.record_duration('display', lavoro.tempo, vista=lavoro.chiave, esito='ok')
+        metrics.observe('display_frame', lavoro.frame, vista=lavoro.chiave)
+        registra_vista(self, lavoro.chiave, contenitore, dati)
     
-    def refresh_all_data(self):
-        """Ricarica tutti i dati con nuove dimensioni"""
-        if self.voti_data:
-            self.display_voti(self.voti_data)
-            self.display_media(self.voti_data)
-            self.display_statistics(self.voti_data)
-        if self.assenze_data:
-            self.display_assenze(self.assenze_data)
+    def on_tab_changed(self, instance, tab):
+        # Il tab appena aperto passa davanti agli altri lavori in corso
+        for altro, (vista, _, _, _) in self._tab_builders.items():
+            self.scheduler.set_priority(vista, 0 if altro is tab else 1)
+    
+    def update_voti(self, voti_data, impronta=None):
+        """Nuovi voti; impronta è il loro hash_payload, se già calcolato (es. da SyncEngine)"""
+        self._aggiorna_dati('voti', voti_data, impronta)
+        self.refresh_tabs((self.voti_tab, self.media_tab, self.stats_tab))
+    
+    def update_assenze(self, assenze_data, impronta=None):
+        self._aggiorna_dati('assenze', assenze_data, impronta)
+        self.refresh_tabs((self.assenze_tab,))
+    
+    def _aggiorna_dati(self, risorsa, dati, impronta):
+        if impronta is None:
+            impronta = hash_payload(dati)
+        # A parità di contenuto resta il payload già mostrato, con i suoi record normalizzati
+        if impronta != self._impronte_dati.get(risorsa):
+            self._impronte_dati[risorsa] = impronta
+            setattr(self, f'{risorsa}_data', dati)
+        self.data_loaded = True
+    
+    def _esegui_subito(self, vista, passi):
+        """Costruisce una vista in un colpo solo, annullando l'eventuale lavoro a passi"""
+        self.scheduler.cancel(vista)
+        self._impronte_viste.pop(vista, None)
+        for _ in passi:
+            pass
     
     def logout(self, instance):
         self.app.do_logout()
     
     def update_user_info(self, name):
+        self.nome_utente = name
         self.user_label.text = f'Benvenuto, {name}'
     
-    def _calcola_giorni_scuola(self):
-        """Calcola i giorni di scuola dell'anno scolastico"""
-        oggi = datetime.now()
-        
-        if oggi.month >= 9:
-            inizio_anno = datetime(oggi.year, 9, 1)
-            fine_anno = datetime(oggi.year + 1, 6, 30)
-        else:
-            inizio_anno = datetime(oggi.year - 1, 9, 1)
-            fine_anno = datetime(oggi.year, 6, 30)
-        
-        giorni_totali = 0
-        giorni_trascorsi = 0
-        
-        festivita = [
-            (11, 1), (12, 8), (12, 25), (12, 26),
-            (1, 1), (1, 6), (4, 25), (5, 1), (6, 2),
-        ]
-        
-        data_corrente = inizio_anno
-        while data_corrente <= fine_anno:
-            if data_corrente.weekday() < 5:
-                if (data_corrente.month, data_corrente.day) not in festivita:
-                    if not (data_corrente.month == 12 and data_corrente.day >= 23) and \
-                       not (data_corrente.month == 1 and data_corrente.day <= 6):
-                        if not (data_corrente.month == 4 and 10 <= data_corrente.day <= 17):
-                            giorni_totali += 1
-                            if data_corrente <= oggi:
-                                giorni_trascorsi += 1
-            
-            data_corrente += timedelta(days=1)
-        
-        giorni_rimanenti = giorni_totali - giorni_trascorsi
-        return giorni_totali, giorni_trascorsi, giorni_rimanenti
+    def snapshot(self):
+        """Stato della schermata da ripristinare al prossimo avvio"""
+        return {'nome': self.nome_utente, 'tab': self.tabs.current_tab.text}
     
-    def _determina_quadrimestre(self, data_str):
-        """Determina il quadrimestre basandosi sulla data del voto"""
-        try:
-            if isinstance(data_str, str):
-                data = datetime.strptime(data_str, '%Y-%m-%d')
-            else:
-                data = data_str
-            
-            mese = data.month
-            
-            if mese >= 9 or mese == 1:
-                return 1
-            elif mese >= 2 and mese <= 6:
-                return 2
-            else:
-                return None
-        except:
-            return None
+    def restore_snapshot(self, snapshot):
+        if snapshot.get('nome'):
+            self.update_user_info(snapshot['nome'])
+        for tab in self.tabs.tab_list:
+            if tab.text == snapshot.get('tab'):
+                self.tabs.switch_to(tab)
+                break
     
-    def _create_expandable_voto_card(self, voto):
-        """Crea una card voto espandibile"""
-        materia = voto.get('subjectDesc', voto.get('materia', 'N/A'))
-        valore_str = voto.get('displayValue', voto.get('decimalValue', voto.get('voto', 'N/A')))
-        data = voto.get('evtDate', voto.get('data', 'N/A'))
-        tipo = voto.get('componentDesc', voto.get('tipo', 'N/A'))
-        nota = voto.get('notesForFamily', voto.get('nota', ''))
-        
-        colore_codice = voto.get('color', '')
-        voto_non_conta = (colore_codice == 'blue')
-        
-        quadrimestre = self._determina_quadrimestre(data)
-        quadrimestre_str = f' [Q{quadrimestre}]' if quadrimestre else ''
-        
-        if voto_non_conta:
-            colore = (0.3, 0.5, 1, 1)
+    def show_cached(self, voti_data, assenze_data, impronte=None):
+        """Dati in cache: il tab visibile prima, gli altri nei frame successivi"""
+        impronte = impronte or {}
+        if voti_data is not None:
+            self.update_voti(voti_data, impronte.get('voti'))
+        if assenze_data is not None:
+            self.update_assenze(assenze_data, impronte.get('assenze'))
+    
+    def _records(self, voti_data):
+        """Voti normalizzati, calcolati una sola volta per ogni payload"""
+        if voti_data is not self._records_src:
+            self._records_src = voti_data
+            self._records_cache = normalizza_voti(voti_data)
+        return self._records_cache
+    
+    def _normalizza_a_lotti(self, voti_data):
+        """Come _records, ma cede il frame tra un lotto e l'altro"""
+        if voti_data is self._records_src:
+            return
+        records = []
+        for i in range(0, len(voti_data), LOTTO_VOTI):
+            records.extend(normalizza_voti(voti_data[i:i + LOTTO_VOTI]))
+            yield
+        self._records_src = voti_data
+        self._records_cache = records
+    
+    def set_grade_stats(self, voti_data, stats):
+        """Usa statistiche già pronte (es. aggregati incrementali) per questo payload"""
+        self._stats_src = voti_data
+        self._stats_cache = stats
+    
+    def _stats(self, voti_data):
+        """Statistiche raggruppate dei voti, calcolate una sola volta per payload"""
+        if voti_data is not self._stats_src or self._stats_cache is None:
+            self._stats_cache = stats_from_records(self._records(voti_data))
+            self._stats_src = voti_data
+        return self._stats_cache
+    
+    def _voto_row_data(self, voto):
+        """Prepara i dati di una riga della lista voti"""
+        quadrimestre_str = f' [Q{voto.quadrimestre}]' if voto.quadrimestre else ''
+        
+        if not voto.conta:
+            colore = [0.3, 0.5, 1, 1]
+        elif voto.valore_display is not None:
+            colore = [0, 0.8, 0, 1] if voto.valore_display >= 6 else [1, 0, 0, 1]
         else:
-            try:
-                valore_num = float(str(valore_str).replace(',', '.').replace('+', '').replace('-', '').replace('½', '.5'))
-                colore = (0, 0.8, 0, 1) if valore_num >= 6 else (1, 0, 0, 1)
-            except (ValueError, TypeError):
-                colore = (0.5, 0.5, 0.5, 1)
-        
-        # Determina se il testo è lungo
-        testo_lungo = len(tipo) > 30 or (nota and len(nota) > 50)
-        
-        # Container principale
-        card_container = BoxLayout(
-            orientation='vertical',
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(110)
-        )
-        
-        # Box principale con voto e info
-        voto_box = BoxLayout(
-            orientation='horizontal',
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(110),
-            padding=ResponsiveLayout.get_padding(),
-            spacing=ResponsiveLayout.get_spacing()
-        )
-        
-        # Box voto (sinistra)
-        voto_left = BoxLayout(
-            orientation='vertical',
-            size_hint_x=0.25,
-            padding=dp(5)
-        )
-        voto_left.add_widget(Label(
-            text=f'[b]{valore_str}[/b]',
-            markup=True,
-            font_size=ResponsiveLayout.get_font_size(28),
-            color=colore,
-            size_hint_y=0.6
-        ))
-        voto_left.add_widget(Label(
-            text=data + quadrimestre_str,
-            font_size=ResponsiveLayout.get_font_size(10),
-            size_hint_y=0.4
-        ))
-        
-        # Box dettagli (destra)
-        voto_right = BoxLayout(
-            orientation='vertical',
-            size_hint_x=0.75,
-            padding=dp(5),
-            spacing=dp(2)
-        )
-        
-        # Label materia
-        materia_label = Label(
-            text=f'[b]{materia}[/b]',
-            markup=True,
-            font_size=ResponsiveLayout.get_font_size(14),
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(25),
-            halign='left',
-            valign='middle',
-            text_size=(None, None)
-        )
-        materia_label.bind(
-            size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-        )
-        voto_right.add_widget(materia_label)
-        
-        # Label tipo (troncato se lungo)
-        tipo_display = tipo if len(tipo) <= 50 else tipo[:47] + '...'
-        tipo_label = Label(
-            text=tipo_display,
-            font_size=ResponsiveLayout.get_font_size(12),
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(20),
-            halign='left',
-            valign='middle',
-            text_size=(None, None)
-        )
-        tipo_label.bind(
-            size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-        )
-        voto_right.add_widget(tipo_label)
-        
-        # Note (troncate se lunghe)
-        if nota:
-            nota_display = nota if len(nota) <= 80 else nota[:77] + '...'
-            nota_label = Label(
-                text=nota_display,
-                font_size=ResponsiveLayout.get_font_size(10),
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(30),
-                color=(0.7, 0.7, 0.7, 1),
-                halign='left',
-                valign='top',
-                text_size=(None, None)
-            )
-            nota_label.bind(
-                size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-            )
-            voto_right.add_widget(nota_label)
-        
-        voto_box.add_widget(voto_left)
-        voto_box.add_widget(voto_right)
-        card_container.add_widget(voto_box)
-        
-        # Box espandibile (inizialmente nascosto)
-        expanded_box = BoxLayout(
-            orientation='vertical',
-            size_hint_y=None,
-            height=0,
-            padding=[ResponsiveLayout.get_padding(), 0, ResponsiveLayout.get_padding(), ResponsiveLayout.get_padding()],
-            spacing=dp(5),
-            opacity=0
-        )
-        
-        if testo_lungo:
-            # Tipo completo
-            if len(tipo) > 50:
-                tipo_full = Label(
-                    text=f'[b]Tipo:[/b] {tipo}',
-                    markup=True,
-                    font_size=ResponsiveLayout.get_font_size(12),
-                    size_hint_y=None,
-                    halign='left',
-                    valign='top',
-                    text_size=(None, None)
-                )
-                tipo_full.bind(
-                    size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-                )
-                tipo_full.bind(
-                    texture_size=lambda instance, value: setattr(instance, 'height', value[1])
-                )
-                expanded_box.add_widget(tipo_full)
-            
-            # Note complete
-            if nota and len(nota) > 80:
-                nota_full = Label(
-                    text=f'[b]Note:[/b] {nota}',
-                    markup=True,
-                    font_size=ResponsiveLayout.get_font_size(11),
-                    size_hint_y=None,
-                    color=(0.7, 0.7, 0.7, 1),
-                    halign='left',
-                    valign='top',
-                    text_size=(None, None)
-                )
-                nota_full.bind(
-                    size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-                )
-                nota_full.bind(
-                    texture_size=lambda instance, value: setattr(instance, 'height', value[1])
-                )
-                expanded_box.add_widget(nota_full)
-        
-        card_container.add_widget(expanded_box)
-        
-        # Pulsante espandi/comprimi (solo se necessario)
-        if testo_lungo:
-            expand_btn = Button(
-                text='Mostra tutto',
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(35),
-                font_size=ResponsiveLayout.get_font_size(11),
-                background_color=(0.2, 0.2, 0.2, 1)
-            )
-            
-            # Stato espansione
-            expand_btn.is_expanded = False
-            
-            def toggle_expand(instance):
-                if instance.is_expanded:
-                    # Comprimi
-                    instance.is_expanded = False
-                    instance.text = 'Mostra tutto'
-                    expanded_box.height = 0
-                    expanded_box.opacity = 0
-                    card_container.height = ResponsiveLayout.get_height(110 + 35)
-                else:
-                    # Espandi
-                    instance.is_expanded = True
-                    instance.text = 'Nascondi'
-                    # Calcola altezza necessaria
-                    total_height = sum(child.height for child in expanded_box.children) + dp(10)
-                    expanded_box.height = total_height
-                    expanded_box.opacity = 1
-                    card_container.height = ResponsiveLayout.get_height(110 + 35) + total_height
-            
-            expand_btn.bind(on_press=toggle_expand)
-            card_container.add_widget(expand_btn)
-            card_container.height = ResponsiveLayout.get_height(110 + 35)
-        
-        return card_container
+            colore = [0.5, 0.5, 0.5, 1]
+        
+        return {
+            'valore': voto.valore_str,
+            'data': voto.data_str + quadrimestre_str,
+            'materia': voto.materia,
+            'tipo': voto.tipo,
+            'nota': voto.nota,
+            'colore': colore,
+            # Altezza dinamica in base alla presenza di note
+            'height': ResponsiveLayout.get_height(140) if voto.nota else ResponsiveLayout.get_height(110),
+        }
     
-    def display_voti(self, voti_data):
-        self.voti_layout.clear_widgets()
-        self.voti_data = voti_data
-        
-        if not voti_data:
-            self.voti_layout.add_widget(Label(
-                text='Nessun voto disponibile',
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(40),
-                font_size=ResponsiveLayout.get_font_size(14)
-            ))
-            self.data_loaded = True
+    def queue_voti(self, records, generazione=0):
+        """Accoda voti già normalizzati mentre il download è in corso (thread-safe)"""
+        self._coda_voti.append((generazione, records))
+        self._trigger_coda_voti()
+    
+    def _accetta_lotto(self, generazione, lotto):
+        """Aggiunge un lotto ai voti parziali: None se scartato, True se apre un nuovo tentativo"""
+        if generazione <= self._generazione_annullata or generazione < self._generazione_streaming:
+            return None
+        nuovo = generazione > self._generazione_streaming
+        if nuovo:
+            self._generazione_streaming = generazione
+            self._voti_streaming = []
+        self._voti_streaming.extend(lotto)
+        return nuovo
+    
+    def annulla_streaming(self, generazione):
+        """Scarta i voti parziali di un tentativo abbandonato o non decodificabile"""
+        self._generazione_annullata = max(self._generazione_annullata, generazione)
+        if self._generazione_streaming > generazione or not self._voti_streaming:
             return
-        
-        for voto in voti_data:
-            # Crea card espandibile
-            card = self._create_expandable_voto_card(voto)
-            self.voti_layout.add_widget(card)
-            self.voti_layout.add_widget(card)
-            
-            # Separatore
-            separator = Widget(size_hint_y=None, height=dp(1))
-            with separator.canvas:
-                Color(0.3, 0.3, 0.3, 0.5)
-                separator.rect = Rectangle(pos=separator.pos, size=separator.size)
-            separator.bind(pos=lambda instance, value: setattr(instance.rect, 'pos', instance.pos))
-            separator.bind(size=lambda instance, value: setattr(instance.rect, 'size', instance.size))
-            self.voti_layout.add_widget(separator)
-        
-        self.data_loaded = True
-
+        self._voti_streaming = []
+        if not self.voti_data:
+            self.voti_content.data = []
+            self._impronte_viste.pop('voti', None)
+    
+    def _svuota_coda_voti(self, dt):
+        """Aggiunge i voti in coda alla lista entro il budget del frame"""
+        inizio = time.perf_counter()
+        righe = []
+        while self._coda_voti and time.perf_counter() - inizio < BUDGET_FRAME:
+            generazione, lotto = self._coda_voti.popleft()
+            nuovo = self._accetta_lotto(generazione, lotto)
+            if nuovo is None:
+                continue
+            if nuovo:
+                righe = []
+            righe.extend(self._voto_row_data(voto) for voto in lotto)
+        if righe:
+            if len(self._voti_streaming) == len(righe):
+                self.voti_content.data = righe
+                self._impronte_viste.pop('voti', None)
+                self.app.segna_interattivo('streaming')
+            else:
+                self.voti_content.data.extend(righe)
+        if self._coda_voti:
+            # Il resto al prossimo frame
+            self._trigger_coda_voti()
+    
+    def _fine_streaming(self, voti_data):
+        """Riusa i voti già normalizzati in streaming se corrispondono al payload completo"""
+        self._trigger_coda_voti.cancel()
+        while self._coda_voti:
+            self._accetta_lotto(*self._coda_voti.popleft())
+        streaming, self._voti_streaming = self._voti_streaming, []
+        if streaming and len(streaming) == len(voti_data):
+            self._records_src = voti_data
+            self._records_cache = streaming
+    
+    @misura_vista('voti', 'voti_content')
     def display_voti(self, voti_data):
-        self.voti_layout.clear_widgets()
+        self._esegui_subito('voti', self._costruisci_voti(voti_data))
+    
+    def _costruisci_voti(self, voti_data):
+        self._fine_streaming(voti_data)
         self.voti_data = voti_data
+        self.voti_layout.spacing = ResponsiveLayout.get_spacing()
+        self.voti_layout.padding = ResponsiveLayout.get_padding()
         
         if not voti_data:
-            self.voti_layout.add_widget(Label(
-                text='Nessun voto disponibile',
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(40),
-                font_size=ResponsiveLayout.get_font_size(14)
-            ))
+            self.voti_content.data = [{
+                'viewclass': 'Label',
+                'text': 'Nessun voto disponibile',
+                'height': ResponsiveLayout.get_height(40),
+                'font_size': ResponsiveLayout.get_font_size(14)
+            }]
             self.data_loaded = True
             return
         
-        for voto in voti_data:
-            # Calcola altezza dinamica in base alla presenza di note
-            nota = voto.get('notesForFamily', voto.get('nota', ''))
-            card_height = ResponsiveLayout.get_height(140) if nota else ResponsiveLayout.get_height(110)
-            
-            voto_box = BoxLayout(
-                orientation='horizontal',
-                size_hint_y=None,
-                height=card_height,
-                padding=ResponsiveLayout.get_padding(),
-                spacing=ResponsiveLayout.get_spacing()
-            )
-            
-            materia = voto.get('subjectDesc', voto.get('materia', 'N/A'))
-            valore_str = voto.get('displayValue', voto.get('decimalValue', voto.get('voto', 'N/A')))
-            data = voto.get('evtDate', voto.get('data', 'N/A'))
-            tipo = voto.get('componentDesc', voto.get('tipo', 'N/A'))
-            
-            colore_codice = voto.get('color', '')
-            voto_non_conta = (colore_codice == 'blue')
-            
-            quadrimestre = self._determina_quadrimestre(data)
-            quadrimestre_str = f' [Q{quadrimestre}]' if quadrimestre else ''
-            
-            if voto_non_conta:
-                colore = (0.3, 0.5, 1, 1)
-            else:
-                try:
-                    valore_num = float(str(valore_str).replace(',', '.').replace('+', '').replace('-', '').replace('½', '.5'))
-                    colore = (0, 0.8, 0, 1) if valore_num >= 6 else (1, 0, 0, 1)
-                except (ValueError, TypeError):
-                    colore = (0.5, 0.5, 0.5, 1)
-            
-            # Box voto (sinistra)
-            voto_left = BoxLayout(
-                orientation='vertical',
-                size_hint_x=0.25,
-                padding=dp(5)
-            )
-            voto_left.add_widget(Label(
-                text=f'[b]{valore_str}[/b]',
-                markup=True,
-                font_size=ResponsiveLayout.get_font_size(28),
-                color=colore,
-                size_hint_y=0.6
-            ))
-            voto_left.add_widget(Label(
-                text=data + quadrimestre_str,
-                font_size=ResponsiveLayout.get_font_size(10),
-                size_hint_y=0.4
-            ))
-            
-            # Box dettagli (destra)
-            voto_right = BoxLayout(
-                orientation='vertical',
-                size_hint_x=0.75,
-                padding=dp(5),
-                spacing=dp(2)
-            )
-            
-            # Label materia con text wrapping
-            materia_label = Label(
-                text=f'[b]{materia}[/b]',
-                markup=True,
-                font_size=ResponsiveLayout.get_font_size(14),
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(25),
-                halign='left',
-                valign='middle',
-                text_size=(None, None)  # Inizialmente None
-            )
-            # Bind per impostare text_size alla larghezza effettiva del widget
-            materia_label.bind(
-                size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-            )
-            voto_right.add_widget(materia_label)
-            
-            # Label tipo con text wrapping
-            tipo_label = Label(
-                text=tipo,
-                font_size=ResponsiveLayout.get_font_size(12),
-                size_hint_y=None,
-                height=ResponsiveLayout.get_height(20),
-                halign='left',
-                valign='middle',
-                text_size=(None, None)
-            )
-            tipo_label.bind(
-                size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-            )
-            voto_right.add_widget(tipo_label)
-            
-            # Note (se presenti)
-            if nota:
-                nota_label = Label(
-                    text=nota,
-                    font_size=ResponsiveLayout.get_font_size(10),
-                    size_hint_y=None,
-                    height=ResponsiveLayout.get_height(40),
-                    color=(0.7, 0.7, 0.7, 1),
-                    halign='left',
-                    valign='top',
-                    text_size=(None, None)
-                )
-                nota_label.bind(
-                    size=lambda instance, value: setattr(instance, 'text_size', (instance.width, None))
-                )
-                voto_right.add_widget(nota_label)
-            
-            voto_box.add_widget(voto_left)
-            voto_box.add_widget(voto_right)
-            
-            self.voti_layout.add_widget(voto_box)
-            
-            # Separatore
-            separator = Widget(size_hint_y=None, height=dp(1))
-            with separator.canvas:
-                Color(0.3, 0.3, 0.3, 0.5)
-                separator.rect = Rectangle(pos=separator.pos, size=separator.size)
-            separator.bind(pos=lambda instance, value: setattr(instance.rect, 'pos', instance.pos))
-            separator.bind(size=lambda instance, value: setattr(instance.rect, 'size', instance.size))
-            self.voti_layout.add_widget(separator)
-        
+        yield from self._normalizza_a_lotti(voti_data)
+        records = self._records(voti_data)
+        righe = []
+        for i in range(0, len(records), LOTTO_VOTI):
+            righe.extend(self._voto_row_data(voto) for voto in records[i:i + LOTTO_VOTI])
+            if i == 0 and len(records) > LOTTO_VOTI:
+                # La prima schermata subito, il resto della lista nei frame successivi
+                self.voti_content.data = list(righe)
+            yield
+        self.voti_content.data = righe
         self.data_loaded = True
     
+    @misura_vista('media', 'media_layout')
     def display_media(self, voti_data):
+        self._esegui_subito('media', self._costruisci_media(voti_data))
+    
+    def _costruisci_media(self, voti_data):
+        yield from self._normalizza_a_lotti(voti_data or [])
         self.media_layout.clear_widgets()
         
         if not voti_data:
@@ -742,36 +855,7 @@ class MainScreen(BoxLayout):
             ))
             return
         
-        materie_q1 = {}
-        materie_q2 = {}
-        materie_totale = {}
-        
-        for voto in voti_data:
-            colore_codice = voto.get('color', '')
-            if colore_codice == 'blue':
-                continue
-                
-            materia = voto.get('subjectDesc', voto.get('materia', 'N/A'))
-            data = voto.get('evtDate', voto.get('data', 'N/A'))
-            quadrimestre = self._determina_quadrimestre(data)
-            
-            try:
-                valore = float(voto.get('decimalValue', voto.get('voto', 0)))
-                if valore > 0:
-                    if materia not in materie_totale:
-                        materie_totale[materia] = []
-                    materie_totale[materia].append(valore)
-                    
-                    if quadrimestre == 1:
-                        if materia not in materie_q1:
-                            materie_q1[materia] = []
-                        materie_q1[materia].append(valore)
-                    elif quadrimestre == 2:
-                        if materia not in materie_q2:
-                            materie_q2[materia] = []
-                        materie_q2[materia].append(valore)
-            except (ValueError, TypeError):
-                continue
+        stats = self._stats(voti_data)
         
         # Header
         self.media_layout.add_widget(Label(
@@ -803,7 +887,7 @@ class MainScreen(BoxLayout):
         tutte_medie_q2 = []
         tutte_medie_totale = []
         
-        for materia in sorted(materie_totale.keys()):
+        for materia in sorted(stats.per_materia.keys()):
             if use_compact:
                 # Layout compatto per smartphone
                 media_box = BoxLayout(
@@ -826,17 +910,17 @@ class MainScreen(BoxLayout):
                 
                 values_box = BoxLayout(orientation='horizontal', spacing=dp(10))
                 
-                if materia in materie_q1:
-                    media_q1 = sum(materie_q1[materia]) / len(materie_q1[materia])
+                media_q1 = stats.media_materia(materia, 1)
+                if media_q1 is not None:
                     tutte_medie_q1.append(media_q1)
                     values_box.add_widget(Label(text=f'Q1: {media_q1:.2f}', font_size=ResponsiveLayout.get_font_size(12)))
                 
-                if materia in materie_q2:
-                    media_q2 = sum(materie_q2[materia]) / len(materie_q2[materia])
+                media_q2 = stats.media_materia(materia, 2)
+                if media_q2 is not None:
                     tutte_medie_q2.append(media_q2)
                     values_box.add_widget(Label(text=f'Q2: {media_q2:.2f}', font_size=ResponsiveLayout.get_font_size(12)))
                 
-                media_totale = sum(materie_totale[materia]) / len(materie_totale[materia])
+                media_totale = stats.media_materia(materia)
                 tutte_medie_totale.append(media_totale)
                 values_box.add_widget(Label(
                     text=f'[b]Tot: {media_totale:.2f}[/b]',
@@ -864,21 +948,21 @@ class MainScreen(BoxLayout):
                 materia_label.bind(width=lambda *x: materia_label.setter('text_size')(materia_label, (materia_label.width, None)))
                 media_box.add_widget(materia_label)
                 
-                if materia in materie_q1:
-                    media_q1 = sum(materie_q1[materia]) / len(materie_q1[materia])
+                media_q1 = stats.media_materia(materia, 1)
+                if media_q1 is not None:
                     tutte_medie_q1.append(media_q1)
                     media_box.add_widget(Label(text=f'{media_q1:.2f}', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(14)))
                 else:
                     media_box.add_widget(Label(text='-', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(14), color=(0.5, 0.5, 0.5, 1)))
                 
-                if materia in materie_q2:
-                    media_q2 = sum(materie_q2[materia]) / len(materie_q2[materia])
+                media_q2 = stats.media_materia(materia, 2)
+                if media_q2 is not None:
                     tutte_medie_q2.append(media_q2)
                     media_box.add_widget(Label(text=f'{media_q2:.2f}', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(14)))
                 else:
                     media_box.add_widget(Label(text='-', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(14), color=(0.5, 0.5, 0.5, 1)))
                 
-                media_totale = sum(materie_totale[materia]) / len(materie_totale[materia])
+                media_totale = stats.media_materia(materia)
                 tutte_medie_totale.append(media_totale)
                 media_box.add_widget(Label(
                     text=f'[b]{media_totale:.2f}[/b]',
@@ -888,6 +972,7 @@ class MainScreen(BoxLayout):
                 ))
             
             self.media_layout.add_widget(media_box)
+            yield
         
         # Medie generali
         if tutte_medie_totale:
@@ -916,14 +1001,14 @@ class MainScreen(BoxLayout):
                 values_box = BoxLayout(orientation='horizontal', spacing=dp(10))
                 
                 if tutte_medie_q1:
-                    media_gen_q1 = sum(tutte_medie_q1) / len(tutte_medie_q1)
+                    media_gen_q1 = stats.media_generale(1)
                     values_box.add_widget(Label(text=f'Q1: [b]{media_gen_q1:.2f}[/b]', markup=True, font_size=ResponsiveLayout.get_font_size(15)))
                 
                 if tutte_medie_q2:
-                    media_gen_q2 = sum(tutte_medie_q2) / len(tutte_medie_q2)
+                    media_gen_q2 = stats.media_generale(2)
                     values_box.add_widget(Label(text=f'Q2: [b]{media_gen_q2:.2f}[/b]', markup=True, font_size=ResponsiveLayout.get_font_size(15)))
                 
-                media_gen_totale = sum(tutte_medie_totale) / len(tutte_medie_totale)
+                media_gen_totale = stats.media_generale()
                 values_box.add_widget(Label(
                     text=f'Tot: [b]{media_gen_totale:.2f}[/b]',
                     markup=True,
@@ -949,7 +1034,7 @@ class MainScreen(BoxLayout):
                 ))
                 
                 if tutte_medie_q1:
-                    media_gen_q1 = sum(tutte_medie_q1) / len(tutte_medie_q1)
+                    media_gen_q1 = stats.media_generale(1)
                     generale_box.add_widget(Label(
                         text=f'[b]{media_gen_q1:.2f}[/b]',
                         markup=True,
@@ -960,7 +1045,7 @@ class MainScreen(BoxLayout):
                     generale_box.add_widget(Label(text='-', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(18)))
                 
                 if tutte_medie_q2:
-                    media_gen_q2 = sum(tutte_medie_q2) / len(tutte_medie_q2)
+                    media_gen_q2 = stats.media_generale(2)
                     generale_box.add_widget(Label(
                         text=f'[b]{media_gen_q2:.2f}[/b]',
                         markup=True,
@@ -970,7 +1055,7 @@ class MainScreen(BoxLayout):
                 else:
                     generale_box.add_widget(Label(text='-', size_hint_x=0.2, font_size=ResponsiveLayout.get_font_size(18)))
                 
-                media_gen_totale = sum(tutte_medie_totale) / len(tutte_medie_totale)
+                media_gen_totale = stats.media_generale()
                 generale_box.add_widget(Label(
                     text=f'[b]{media_gen_totale:.2f}[/b]',
                     markup=True,
@@ -981,7 +1066,12 @@ class MainScreen(BoxLayout):
             
             self.media_layout.add_widget(generale_box)
     
+    @misura_vista('statistics', 'stats_layout')
     def display_statistics(self, voti_data):
+        self._esegui_subito('statistics', self._costruisci_statistiche(voti_data))
+    
+    def _costruisci_statistiche(self, voti_data):
+        yield from self._normalizza_a_lotti(voti_data or [])
         self.stats_layout.clear_widgets()
         
         if not voti_data:
@@ -994,36 +1084,8 @@ class MainScreen(BoxLayout):
             return
         
         # Prepara dati per i grafici
-        materie_data = {}
-        distribuzione_voti = {}
-        voti_q1 = []
-        voti_q2 = []
-        
-        for voto in voti_data:
-            colore_codice = voto.get('color', '')
-            if colore_codice == 'blue':
-                continue
-            
-            materia = voto.get('subjectDesc', 'N/A')
-            data = voto.get('evtDate', 'N/A')
-            quadrimestre = self._determina_quadrimestre(data)
-            
-            try:
-                valore = float(voto.get('decimalValue', 0))
-                if valore > 0:
-                    if materia not in materie_data:
-                        materie_data[materia] = []
-                    materie_data[materia].append(valore)
-                    
-                    voto_arrotondato = round(valore)
-                    distribuzione_voti[voto_arrotondato] = distribuzione_voti.get(voto_arrotondato, 0) + 1
-                    
-                    if quadrimestre == 1:
-                        voti_q1.append(valore)
-                    elif quadrimestre == 2:
-                        voti_q2.append(valore)
-            except (ValueError, TypeError):
-                continue
+        stats = self._stats(voti_data)
+        distribuzione_voti = stats.istogramma
         
         # Titolo sezione
         self.stats_layout.add_widget(Label(
@@ -1051,23 +1113,23 @@ class MainScreen(BoxLayout):
         )
         
         # Totale voti
-        total_voti = sum(len(v) for v in materie_data.values())
+        total_voti = stats.totale.count if stats.totale else 0
         stats_grid.add_widget(self._create_stat_box('Voti Totali', str(total_voti), (0.2, 0.6, 1, 1)))
         
         # Materie
-        stats_grid.add_widget(self._create_stat_box('Materie', str(len(materie_data)), (0.4, 0.7, 0.3, 1)))
+        stats_grid.add_widget(self._create_stat_box('Materie', str(len(stats.per_materia)), (0.4, 0.7, 0.3, 1)))
         
         # Media Q1
-        if voti_q1:
-            media_q1 = sum(voti_q1) / len(voti_q1)
+        if 1 in stats.per_quadrimestre:
+            media_q1 = stats.per_quadrimestre[1].mean
             color_q1 = (0, 0.8, 0, 1) if media_q1 >= 6 else (1, 0.3, 0.3, 1)
             stats_grid.add_widget(self._create_stat_box('Q1 Media', f'{media_q1:.2f}', color_q1))
         else:
             stats_grid.add_widget(self._create_stat_box('Q1 Media', '-', (0.5, 0.5, 0.5, 1)))
         
         # Media Q2
-        if voti_q2:
-            media_q2 = sum(voti_q2) / len(voti_q2)
+        if 2 in stats.per_quadrimestre:
+            media_q2 = stats.per_quadrimestre[2].mean
             color_q2 = (0, 0.8, 0, 1) if media_q2 >= 6 else (1, 0.3, 0.3, 1)
             stats_grid.add_widget(self._create_stat_box('Q2 Media', f'{media_q2:.2f}', color_q2))
         else:
@@ -1075,6 +1137,7 @@ class MainScreen(BoxLayout):
         
         stats_card.add_widget(stats_grid)
         self.stats_layout.add_widget(stats_card)
+        yield
         
         # Grafico: Media per materia
         self.stats_layout.add_widget(Label(
@@ -1086,11 +1149,9 @@ class MainScreen(BoxLayout):
         ))
 
         
-        materie_ordinate = sorted(materie_data.items(), key=lambda x: sum(x[1])/len(x[1]), reverse=True)
-        for materia, voti in materie_ordinate:
-            if len(voti) > 0:
-                media = sum(voti) / len(voti)
-                self.stats_layout.add_widget(self._create_bar_chart(materia, media, len(voti)))
+        materie_ordinate = sorted(stats.per_materia.items(), key=lambda x: x[1].mean, reverse=True)
+        self.stats_layout.add_widget(self._create_bar_chart(materie_ordinate))
+        yield
         
         # Grafico: Distribuzione voti
         if distribuzione_voti:
@@ -1101,14 +1162,7 @@ class MainScreen(BoxLayout):
                 height=ResponsiveLayout.get_height(50),
                 font_size=ResponsiveLayout.get_font_size(16)
             ))
-            
-            max_count = max(distribuzione_voti.values())
-            for voto in range(1, 11):
-                count = distribuzione_voti.get(voto, 0)
-                if count > 0:
-                    self.stats_layout.add_widget(
-                        self._create_histogram_bar(voto, count, max_count)
-                    )
+            self.stats_layout.add_widget(self._create_histogram(distribuzione_voti))
     
     def _create_stat_box(self, label, value, color):
         """Crea un box per una statistica"""
@@ -1140,113 +1194,45 @@ class MainScreen(BoxLayout):
         
         return box
     
-    def _create_bar_chart(self, materia, media, count):
-        """Crea una barra per il grafico delle medie"""
-        box = BoxLayout(
-            orientation='horizontal',
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(50),
-            padding=dp(5),
-            spacing=ResponsiveLayout.get_spacing()
-        )
-        
-        # Nome materia
-        materia_label = Label(
-            text=materia[:25],
-            size_hint_x=0.4,
-            halign='left',
-            valign='middle',
-            font_size=ResponsiveLayout.get_font_size(12)
+    def _create_bar_chart(self, materie_ordinate):
+        """Grafico delle medie per materia, in un solo widget"""
+        righe = []
+        for materia, gruppo in materie_ordinate:
+            colore = (0, 0.8, 0, 1) if gruppo.mean >= 6 else (1, 0.2, 0.2, 1)
+            righe.append((materia[:25], gruppo.mean / 10.0, colore, f'[b]{gruppo.mean:.2f}[/b]\n({gruppo.count})'))
+        return GraficoBarre(
+            righe,
+            ResponsiveLayout.get_height(50),
+            colonne=(0.4, 0.4, 0.2),
+            font_etichetta=12,
+            font_valore=13,
+            soglia=6.0 / 10.0
         )
-        materia_label.bind(width=lambda *x: materia_label.setter('text_size')(materia_label, (materia_label.width, None)))
-        box.add_widget(materia_label)
-        
-        # Barra grafico
-        bar_container = BoxLayout(size_hint_x=0.4)
-        bar_widget = Widget()
-        
-        def draw_bar(*args):
-            bar_widget.canvas.clear()
-            with bar_widget.canvas:
-                Color(0.9, 0.9, 0.9, 1)
-                Rectangle(pos=bar_widget.pos, size=bar_widget.size)
-                
-                if media >= 6:
-                    Color(0, 0.8, 0, 1)
-                else:
-                    Color(1, 0.2, 0.2, 1)
-                
-                bar_width = (media / 10.0) * bar_widget.width
-                Rectangle(pos=bar_widget.pos, size=(bar_width, bar_widget.height))
-                
-                Color(1, 0.6, 0, 0.5)
-                line_x = bar_widget.x + (6.0 / 10.0) * bar_widget.width
-                Line(points=[line_x, bar_widget.y, line_x, bar_widget.y + bar_widget.height], width=1.5)
-        
-        bar_widget.bind(pos=draw_bar, size=draw_bar)
-        bar_container.add_widget(bar_widget)
-        box.add_widget(bar_container)
-        
-        # Valore media
-        box.add_widget(Label(
-            text=f'[b]{media:.2f}[/b]\n({count})',
-            markup=True,
-            size_hint_x=0.2,
-            font_size=ResponsiveLayout.get_font_size(13)
-        ))
-        
-        return box
     
-    def _create_histogram_bar(self, voto, count, max_count):
-        """Crea una barra per l'istogramma della distribuzione"""
-        box = BoxLayout(
-            orientation='horizontal',
-            size_hint_y=None,
-            height=ResponsiveLayout.get_height(40),
-            padding=dp(5),
-            spacing=ResponsiveLayout.get_spacing()
+    def _create_histogram(self, distribuzione_voti):
+        """Istogramma della distribuzione dei voti, in un solo widget"""
+        max_count = max(distribuzione_voti.values())
+        righe = []
+        for voto in range(1, 11):
+            count = distribuzione_voti.get(voto, 0)
+            if count > 0:
+                colore = (0, 0.8, 0, 0.8) if voto >= 6 else (1, 0.2, 0.2, 0.8)
+                righe.append((str(voto), count / max_count, colore, str(count)))
+        return GraficoBarre(
+            righe,
+            ResponsiveLayout.get_height(40),
+            colonne=(0.1, 0.7, 0.2),
+            font_etichetta=16,
+            font_valore=14,
+            allinea_etichetta='center',
+            etichetta_bold=True
         )
-        
-        # Voto
-        box.add_widget(Label(
-            text=str(voto),
-            size_hint_x=0.1,
-            font_size=ResponsiveLayout.get_font_size(16),
-            bold=True
-        ))
-        
-        # Barra
-        bar_container = BoxLayout(size_hint_x=0.7)
-        bar_widget = Widget()
-        
-        def draw_hist_bar(*args):
-            bar_widget.canvas.clear()
-            with bar_widget.canvas:
-                Color(0.9, 0.9, 0.9, 1)
-                Rectangle(pos=bar_widget.pos, size=bar_widget.size)
-                
-                if voto >= 6:
-                    Color(0, 0.8, 0, 0.8)
-                else:
-                    Color(1, 0.2, 0.2, 0.8)
-                
-                bar_width = (count / max_count) * bar_widget.width
-                Rectangle(pos=bar_widget.pos, size=(bar_width, bar_widget.height))
-        
-        bar_widget.bind(pos=draw_hist_bar, size=draw_hist_bar)
-        bar_container.add_widget(bar_widget)
-        box.add_widget(bar_container)
-        
-        # Conteggio
-        box.add_widget(Label(
-            text=str(count),
-            size_hint_x=0.2,
-            font_size=ResponsiveLayout.get_font_size(14)
-        ))
-        
-        return box
     
+    @misura_vista('assenze', 'assenze_layout')
     def display_assenze(self, assenze_data):
+        self._esegui_subito('assenze', self._costruisci_assenze(assenze_data))
+    
+    def _costruisci_assenze(self, assenze_data):
         self.assenze_layout.clear_widgets()
         self.assenze_data = assenze_data
         
@@ -1259,28 +1245,19 @@ class MainScreen(BoxLayout):
             ))
             return
         
-        # Conta le assenze
-        assenze_totali = 0
-        ritardi = 0
-        uscite_anticipate = 0
-        
-        for assenza in assenze_data:
-            evento_codice = assenza.get('evtCode', '')
-            if evento_codice == 'ABA0':
-                assenze_totali += 1
-            elif evento_codice == 'ABR0':
-                ritardi += 1
-            elif evento_codice == 'ABU0':
-                uscite_anticipate += 1
-        
-        # Calcola giorni scuola
-        giorni_totali, giorni_trascorsi, giorni_rimanenti = self._calcola_giorni_scuola()
-        
-        # Limite assenze (25% dei giorni totali)
-        limite_assenze = int(giorni_totali * 0.25)
-        assenze_disponibili = limite_assenze - assenze_totali
-        percentuale_assenze = (assenze_totali / giorni_trascorsi * 100) if giorni_trascorsi > 0 else 0
-        percentuale_limite = (assenze_totali / limite_assenze * 100) if limite_assenze > 0 else 0
+        # Conteggi e limite sul calendario scolastico (25% dei giorni totali)
+        oggi = date.today()
+        riepilogo = riepilogo_assenze(assenze_data, self.app.school_calendar(oggi), oggi)
+        assenze_totali = riepilogo['assenze']
+        ritardi = riepilogo['ritardi']
+        uscite_anticipate = riepilogo['uscite_anticipate']
+        giorni_totali = riepilogo['giorni_totali']
+        giorni_trascorsi = riepilogo['giorni_trascorsi']
+        giorni_rimanenti = riepilogo['giorni_rimanenti']
+        limite_assenze = riepilogo['limite_assenze']
+        assenze_disponibili = riepilogo['assenze_disponibili']
+        percentuale_assenze = riepilogo['percentuale_assenze']
+        percentuale_limite = riepilogo['percentuale_limite']
         
         # Titolo
         self.assenze_layout.add_widget(Label(
@@ -1329,6 +1306,7 @@ class MainScreen(BoxLayout):
         
         stats_card.add_widget(stats_grid)
         self.assenze_layout.add_widget(stats_card)
+        yield
         
         # Sezione giorni scolastici
         self.assenze_layout.add_widget(Label(
@@ -1366,6 +1344,7 @@ class MainScreen(BoxLayout):
             giorni_box.add_widget(label)
         
         self.assenze_layout.add_widget(giorni_box)
+        yield
         
         # Barra progresso assenze
         self.assenze_layout.add_widget(Label(
@@ -1403,34 +1382,17 @@ class MainScreen(BoxLayout):
         )
         
         bar_container = BoxLayout(size_hint_y=None, height=ResponsiveLayout.get_height(50))
-        bar_widget = Widget()
-        
-        def draw_progress_bar(*args):
-            bar_widget.canvas.clear()
-            with bar_widget.canvas:
-                Color(0.9, 0.9, 0.9, 1)
-                Rectangle(pos=bar_widget.pos, size=bar_widget.size)
-                
-                if percentuale_limite <= 70:
-                    Color(0, 0.8, 0, 0.8)
-                elif percentuale_limite <= 90:
-                    Color(1, 0.7, 0, 0.8)
-                else:
-                    Color(1, 0.2, 0.2, 0.8)
-                
-                bar_width = min(percentuale_limite / 100.0, 1.0) * bar_widget.width
-                Rectangle(pos=bar_widget.pos, size=(bar_width, bar_widget.height))
-                
-                Color(1, 0.7, 0, 0.5)
-                line_x = bar_widget.x + 0.7 * bar_widget.width
-                Line(points=[line_x, bar_widget.y, line_x, bar_widget.y + bar_widget.height], width=2)
-                
-                Color(1, 0, 0, 0.7)
-                line_x = bar_widget.x + bar_widget.width
-                Line(points=[line_x, bar_widget.y, line_x, bar_widget.y + bar_widget.height], width=2)
-        
-        bar_widget.bind(pos=draw_progress_bar, size=draw_progress_bar)
-        bar_container.add_widget(bar_widget)
+        if percentuale_limite <= 70:
+            colore_barra = (0, 0.8, 0, 0.8)
+        elif percentuale_limite <= 90:
+            colore_barra = (1, 0.7, 0, 0.8)
+        else:
+            colore_barra = (1, 0.2, 0.2, 0.8)
+        bar_container.add_widget(BarraProgresso(
+            percentuale_limite / 100.0,
+            colore_barra,
+            marcatori=[(0.7, (1, 0.7, 0, 0.5), 2), (1.0, (1, 0, 0, 0.7), 2)]
+        ))
         progress_box.add_widget(bar_container)
         
         progress_box.add_widget(Label(
@@ -1441,6 +1403,7 @@ class MainScreen(BoxLayout):
         ))
         
         self.assenze_layout.add_widget(progress_box)
+        yield
         
         # Lista dettagliata assenze
         self.assenze_layout.add_widget(Label(
@@ -1512,15 +1475,114 @@ class MainScreen(BoxLayout):
             assenza_box.add_widget(stato_label)
             
             self.assenze_layout.add_widget(assenza_box)
+            yield
 
 
 class ClassevivaApp(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.utente = None
+        self.session = None
         self.login_screen = None
         self.main_screen = None
+        self.username = None
+        # Impostato al logout: il lavoro ancora in volo non scrive più in cache
+        self.annullato = threading.Event()
         self.credentials_file = os.path.join(os.path.expanduser('~'), '.classeviva_credentials.json')
+        self.cache_file = os.path.join(os.path.expanduser('~'), '.classeviva_cache.sqlite3')
+        self.cache = self.open_cache()
+        # Festività e pause regionali personalizzabili
+        self.calendar_file = os.path.join(os.path.expanduser('~'), '.classeviva_calendar.json')
+        self.calendar_config = CalendarConfig.load(self.calendar_file)
+        # Timeout in secondi per singolo tentativo di ogni richiesta
+        self.fetch_timeouts = {'carta': 10, 'voti': 20, 'assenze': 15}
+        # Runtime, retry e rate limit nascono in avvia_rete, dopo il primo frame
+        self.runtime = None
+        self.retry_policy = None
+        self.rate_limiter = None
+        self._credenziali_avvio = None
+        # Server alternativo per le prove offline (es. mock_server.py)
+        self.server = os.environ.get('CLASSEVIVA_SERVER')
+        # Metriche: CLASSEVIVA_METRICS_PORT le espone via HTTP,
+        # CLASSEVIVA_METRICS_FILE le salva alla chiusura (.json o .prom)
+        self.metrics_file = os.environ.get('CLASSEVIVA_METRICS_FILE')
+        self._avvio = startup.profiler.inizio
+        self._primo_dato = False
+        porta = os.environ.get('CLASSEVIVA_METRICS_PORT')
+        if porta:
+            try:
+                metrics.registry.serve(int(porta))
+            except Exception as e:
+                print(f'Errore avvio server metriche: {e}')
+    
+    def avvia_rete(self):
+        """Importa e crea al primo uso runtime asincrono, retry e rate limit"""
+        if self.runtime is not None:
+            return
+        from runtime import AsyncRuntime
+        from retry import CircuitBreaker, RetryPolicy
+        from ratelimit import RateLimiter
+        
+        self.retry_policy = RetryPolicy(
+            max_attempts=3,
+            base_delay=0.5,
+            max_delay=10,
+            breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        )
+        # Tutte le richieste verso Spaggiari passano da qui (vedi _login)
+        self.rate_limiter = RateLimiter(rate=5, capacity=10, per_account_rate=2, per_account_capacity=5)
+        self.runtime = AsyncRuntime(
+            dispatch=lambda fn: Clock.schedule_once(lambda dt: fn(), 0)
+        )
+        startup.profiler.fase('rete')
+    
+    def school_calendar(self, oggi):
+        return calendario_per(oggi, self.calendar_config, self.cache)
+    
+    def open_cache(self):
+        try:
+            return DataCache(self.cache_file)
+        except Exception as e:
+            print(f'Errore apertura cache: {e}')
+            return None
+    
+    def cache_load(self, risorsa):
+        if self.cache and self.username:
+            try:
+                return self.cache.load(self.username, risorsa)
+            except Exception as e:
+                print(f'Errore lettura cache {risorsa}: {e}')
+        return None
+    
+    def cache_is_fresh(self, risorsa):
+        if self.cache and self.username:
+            try:
+                return self.cache.is_fresh(self.username, risorsa)
+            except Exception as e:
+                print(f'Errore lettura cache {risorsa}: {e}')
+        return False
+    
+    def cache_store(self, risorsa, payload):
+        if self.cache and self.username:
+            try:
+                self.cache.put(self.username, risorsa, payload, annullato=self.annullato)
+            except Exception as e:
+                print(f'Errore salvataggio cache {risorsa}: {e}')
+    
+    def load_snapshot(self):
+        if self.cache and self.username:
+            try:
+                return self.cache.get_meta(self.username, 'snapshot')
+            except Exception as e:
+                print(f'Errore lettura snapshot: {e}')
+        return None
+    
+    def save_snapshot(self):
+        if self.cache and self.username and self.main_screen is not None:
+            try:
+                self.cache.put_meta(self.username, 'snapshot', self.main_screen.snapshot())
+            except Exception as e:
+                print(f'Errore salvataggio snapshot: {e}')
     
     def save_credentials(self, username, password):
         try:
@@ -1540,142 +1602,279 @@ class ClassevivaApp(App):
     
     def build(self):
         saved_creds = self.load_credentials()
+        self.login_screen = LoginScreen(self)
         if saved_creds:
-            self.login_screen = LoginScreen(self)
-            threading.Thread(
-                target=self.login,
-                args=(saved_creds['username'], saved_creds['password'])
-            ).start()
-            return self.login_screen
-        else:
-            self.login_screen = LoginScreen(self)
-            return self.login_screen
+            self.username = saved_creds['username']
+            self._credenziali_avvio = (saved_creds['username'], saved_creds['password'])
+            
+            # Il primo frame mostra l'ultimo stato salvato, la rete aggiorna dopo
+            snapshot = self.load_snapshot()
+            if snapshot is None and self.cache_load('carta') is not None:
+                # Cache di una versione senza snapshot: tab predefinito
+                snapshot = {}
+            if snapshot is not None:
+                self.show_cached_screen(self.login_screen, snapshot)
+        
+        # Rete e login partono solo dopo che il primo frame è sullo schermo
+        Window.bind(on_flip=self._dopo_primo_frame)
+        startup.profiler.fase('build')
+        return self.login_screen
     
-    def login(self, username, password):
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+    def _dopo_primo_frame(self, *args):
+        Window.unbind(on_flip=self._dopo_primo_frame)
+        startup.profiler.fase('primo_frame')
+        Clock.schedule_once(lambda dt: self._avvia_login(), 0)
+    
+    def _avvia_login(self):
+        self.avvia_rete()
+        if self._credenziali_avvio is not None:
+            username, password = self._credenziali_avvio
+            self._credenziali_avvio = None
+            self.login(username, password)
+    
+    def show_cached_screen(self, root=None, snapshot=None):
+        """Mostra la schermata principale usando solo i dati in cache"""
+        if self.main_screen is not None:
+            return
+        root = root or self.root
+        self.main_screen = MainScreen(self)
+        carta = self.cache_load('carta') or {}
+        self.main_screen.update_user_info(carta.get('firstName', self.username))
+        if snapshot:
+            self.main_screen.restore_snapshot(snapshot)
+        root.clear_widgets()
+        root.add_widget(self.main_screen)
+        self.display_cached_data()
     
+    def display_cached_data(self):
+        voti = self.cache_load('voti')
+        assenze = self.cache_load('assenze')
+        engine = SyncEngine(self.cache, self.username)
+        if voti is not None:
             try:
-                self.utente = classeviva.Utente(username, password)
-                loop.run_until_complete(self.utente.accedi())
+                aggregati = engine.aggregati()
+                if aggregati is not None:
+                    self.main_screen.set_grade_stats(voti, aggregati.to_stats())
             except Exception as e:
-                error_msg = str(e)
-                Clock.schedule_once(
-                    lambda dt: self.show_error(f'Login fallito: {error_msg}'),
-                    0
-                )
-                return
+                print(f'Errore lettura aggregati: {e}')
+        # Gli hash salvati dalla sincronizzazione evitano di ricalcolarli qui
+        impronte = {}
+        for risorsa, dati in (('voti', voti), ('assenze', assenze)):
+            if dati is not None:
+                try:
+                    impronte[risorsa] = engine.impronta(risorsa)
+                except Exception as e:
+                    print(f'Errore lettura stato sync {risorsa}: {e}')
+        self.main_screen.show_cached(voti, assenze, impronte)
+        if voti is not None:
+            self.segna_interattivo('cache')
     
-            self.save_credentials(username, password)
+    def segna_interattivo(self, origine):
+        """Registra il tempo dall'avvio ai primi voti mostrati (una sola volta)"""
+        if self._primo_dato:
+            return
+        self._primo_dato = True
+        metrics.observe('time_to_interactive', time.perf_counter() - self._avvio, origine=origine)
+        startup.profiler.fase(f'interattivo_{origine}')
+        startup.profiler.concludi()
     
-            try:
-                carta = loop.run_until_complete(self.utente.carta())
-                name = carta.get('firstName', username)
-            except:
-                name = username
-
-            Clock.schedule_once(lambda dt: self.show_main_screen(name), 0)
+    def login(self, username, password):
+        """Avvia l'accesso sul runtime asincrono"""
+        self.avvia_rete()
+        self.annullato = threading.Event()
+        self.runtime.submit(
+            self._login(username, password, self.annullato),
+            on_success=self.show_main_screen,
+            on_error=self.on_login_error
+        )
     
-        except Exception as e:
-            error_msg = f'Errore di login: {str(e)}'
-            Clock.schedule_once(
-                lambda dt: self.show_error(error_msg),
-                0
-            )
-        finally:
-            if loop:
-                loop.close()
+    async def _login(self, username, password, annullato):
+        # Gira sul thread del runtime: l'import non blocca la UI
+        import classeviva
+        from auth import SessionManager
+        from loader import run_blocking
+        import retry
+        
+        utente = classeviva.Utente(username, password)
+        if self.server:
+            from endpoint import reindirizza
+            reindirizza(utente, self.server)
+        self.rate_limiter.install(utente, username)
+        # I voti arrivano alla UI a lotti mentre si scaricano; prima di
+        # metrics.instrument, che legge il corpo intero
+        streaming.installa(utente, r'/grades$', 'grades', self.on_voti_parziali,
+                           on_annulla=self.on_voti_annullati)
+        metrics.instrument(utente)
+        # 429/5xx con codice e Retry-After, per la politica di ritentativo
+        retry.install(utente)
+        session = SessionManager(utente, self.cache, username, annullato)
+        # Riusa il token salvato se ancora valido, altrimenti fa il login
+        with metrics.span('login'):
+            await self.retry_policy.run(lambda: run_blocking(session.ensure), 'login')
+        
+        self.utente = utente
+        self.session = session
+        self.username = username
+        self.save_credentials(username, password)
+        
+        # La carta arriva insieme a voti e assenze in load_data
+        carta = self.cache_load('carta') or {}
+        return carta.get('firstName', username)
+    
+    def on_login_error(self, error):
+        from retry import CircuitOpenError, is_retryable
+        if self.main_screen is not None:
+            if is_retryable(error) or isinstance(error, CircuitOpenError):
+                # Avvio offline (rete assente o server in errore): restano i dati in cache
+                print(f'Login fallito, uso dati in cache: {error}')
+                return
+            # Credenziali non più valide (es. password cambiata): i dati in
+            # cache non vanno mostrati oltre, si torna alla schermata di accesso
+            self.do_logout()
+        self.show_error(f'Login fallito: {error}')
     
     def show_main_screen(self, name):
-        self.main_screen = MainScreen(self)
+        startup.profiler.fase('login')
+        if self.main_screen is None:
+            self.main_screen = MainScreen(self)
+            self.root.clear_widgets()
+            self.root.add_widget(self.main_screen)
+            self.display_cached_data()
         self.main_screen.update_user_info(name)
-        self.root.clear_widgets()
-        self.root.add_widget(self.main_screen)
+        self.save_snapshot()
         
-        threading.Thread(target=self.load_data).start()
+        self.load_data()
     
     def show_error(self, message):
         self.login_screen.error_label.text = message
         self.login_screen.error_label.color = (1, 0, 0, 1)
     
     def load_data(self):
-        loop = None
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # Caricamento voti
-            voti = None
-            for attempt in range(3):
-                try:
-                    voti = loop.run_until_complete(self.utente.voti())
-                    if voti:
-                        break
-                except Exception as e:
-                    print(f'Tentativo {attempt + 1} caricamento voti fallito: {e}')
-                    if attempt < 2:
-                        Clock.schedule_once(lambda dt: None, 0.5)
-            
-            if voti:
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_voti(voti),
-                    0
-                )
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_media(voti),
-                    0
-                )
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_statistics(voti),
-                    0
-                )
-            else:
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_voti([]),
-                    0
-                )
-            
-            # Caricamento assenze
-            assenze = None
-            for attempt in range(3):
-                try:
-                    assenze = loop.run_until_complete(self.utente.assenze())
-                    if assenze is not None:
-                        break
-                except Exception as e:
-                    print(f'Tentativo {attempt + 1} caricamento assenze fallito: {e}')
-                    if attempt < 2:
-                        Clock.schedule_once(lambda dt: None, 0.5)
-            
-            if assenze is not None:
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_assenze(assenze),
-                    0
-                )
-            else:
-                Clock.schedule_once(
-                    lambda dt: self.main_screen.display_assenze([]),
-                    0
-                )
-                
-        except Exception as e:
-            print(f'Errore caricamento dati: {e}')
-        finally:
-            if loop:
-                loop.close()
+        """Avvia l'aggiornamento dei dati sul runtime asincrono"""
+        self.runtime.submit(
+            self._load_data(),
+            on_error=lambda e: print(f'Errore caricamento dati: {e}')
+        )
+    
+    async def _load_data(self):
+        from loader import fetch_concurrently
+        
+        sync = SyncEngine(self.cache, self.username, self.annullato)
+        utente = self.utente
+        session = self.session
+        
+        # Richieste indipendenti dopo l'accesso: partono tutte insieme
+        # (quelle con cache ancora valida vengono saltate).
+        # session.call riautentica da sola se il token è scaduto.
+        richieste = {}
+        if not self.cache_is_fresh('carta'):
+            richieste['carta'] = lambda: session.call(utente.carta)
+        if not self.cache_is_fresh('voti'):
+            richieste['voti'] = lambda: session.call(lambda: sync.sync_voti(utente))
+        if not self.cache_is_fresh('assenze'):
+            richieste['assenze'] = lambda: session.call(lambda: sync.sync_assenze(utente))
+        
+        with metrics.span('load_data'):
+            await fetch_concurrently(
+                richieste,
+                timeout=self.fetch_timeouts,
+                on_result=self.on_fetch_result,
+                retry=self.retry_policy
+            )
+    
+    def on_voti_parziali(self, lotto, tentativo):
+        """Lotto di voti decodificato durante il download (thread di rete)"""
+        main_screen = self.main_screen
+        # Con i dati in cache già visibili non si mostra una lista parziale
+        if main_screen is None or main_screen.voti_data:
+            return
+        main_screen.queue_voti(normalizza_voti(lotto), tentativo)
+    
+    def on_voti_annullati(self, tentativo):
+        """Download abbandonato (es. ritentativo dopo un timeout) o non decodificabile"""
+        main_screen = self.main_screen
+        if main_screen is not None:
+            Clock.schedule_once(lambda dt: main_screen.annulla_streaming(tentativo), 0)
+    
+    def on_fetch_result(self, nome, risultato, errore):
+        """Consegna alla UI ogni risorsa appena disponibile"""
+        main_screen = self.main_screen
+        if main_screen is None:
+            return
+        
+        if nome == 'carta':
+            if errore is None and risultato:
+                self.cache_store('carta', risultato)
+                name = risultato.get('firstName', self.username)
+                Clock.schedule_once(lambda dt: main_screen.update_user_info(name), 0)
+        
+        elif nome == 'voti':
+            # Le viste si ricostruiscono solo se l'impronta differisce da quella mostrata
+            if errore is None:
+                records, impronta = risultato.records, risultato.impronta
+                if risultato.modificato and risultato.aggregati is not None:
+                    stats = risultato.aggregati.to_stats()
+                    Clock.schedule_once(lambda dt: main_screen.set_grade_stats(records, stats), 0)
+                Clock.schedule_once(lambda dt: main_screen.update_voti(records, impronta), 0)
+                Clock.schedule_once(lambda dt: self.segna_interattivo('rete'), 0)
+            elif errore is not None and self.cache_load('voti') is None:
+                Clock.schedule_once(lambda dt: main_screen.update_voti([]), 0)
+        
+        elif nome == 'assenze':
+            if errore is None:
+                records, impronta = risultato.records, risultato.impronta
+                Clock.schedule_once(lambda dt: main_screen.update_assenze(records, impronta), 0)
+            elif errore is not None and self.cache_load('assenze') is None:
+                Clock.schedule_once(lambda dt: main_screen.update_assenze([]), 0)
 
     def do_logout(self):
+        # Le risposte ancora in viaggio non devono arrivare alla UI, e i
+        # thread che stanno ancora sincronizzando non devono riscrivere in
+        # cache i dati dell'utente dopo cache.clear
+        self.annullato.set()
+        if self.runtime is not None:
+            self.runtime.cancel_all()
+        # ...e i tab ancora in costruzione non servono più
+        if self.main_screen is not None:
+            self.main_screen.scheduler.cancel_all()
+        
         try:
             if os.path.exists(self.credentials_file):
                 os.remove(self.credentials_file)
         except Exception as e:
             print(f'Errore eliminazione credenziali: {e}')
+        
+        if self.cache and self.username:
+            try:
+                self.cache.clear(self.username)
+            except Exception as e:
+                print(f'Errore eliminazione cache: {e}')
 
         self.utente = None
+        self.session = None
+        self.username = None
+        self.main_screen = None
         self.login_screen = LoginScreen(self)
         self.root.clear_widgets()
         self.root.add_widget(self.login_screen)
+    
+    def on_pause(self):
+        # Su Android on_stop può non arrivare: lo stato si salva qui
+        self.save_snapshot()
+        return True
+    
+    def on_stop(self):
+        self.save_snapshot()
+        startup.profiler.concludi()
+        if self.runtime is not None:
+            self.runtime.stop()
+        if self.metrics_file:
+            try:
+                metrics.registry.dump(self.metrics_file)
+            except Exception as e:
+                print(f'Errore salvataggio metriche: {e}')
+        if self.cache:
+            self.cache.close()
 
 
 if __name__ == '__main__':
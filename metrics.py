@@ -0,0 +1,305 @@
+"""Misure di durata e dimensione in un registro in-process
+
+span() misura la durata di una fase (login, download, decodifica JSON,
+costruzione delle viste), observe() registra grandezze come byte scaricati o
+widget creati. Il registro si esporta in JSON o nel formato testuale di
+Prometheus, anche tramite un piccolo server HTTP opzionale.
+"""
+
+import functools
+import inspect
+import itertools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+# Estremi superiori (secondi) dei bucket degli istogrammi di durata
+BUCKET_DURATA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Serie:
+    """Conteggio, somma, minimo, massimo ed eventuale istogramma di una misura"""
+
+    __slots__ = ('count', 'somma', 'min', 'max', 'ultimo', 'bucket')
+
+    def __init__(self, bucket=None):
+        self.count = 0
+        self.somma = 0.0
+        self.min = None
+        self.max = None
+        self.ultimo = None
+        self.bucket = [0] * len(bucket) if bucket else None
+
+    def add(self, valore, limiti=None):
+        self.count += 1
+        self.somma += valore
+        self.min = valore if self.min is None else min(self.min, valore)
+        self.max = valore if self.max is None else max(self.max, valore)
+        self.ultimo = valore
+        if self.bucket is not None:
+            for i, limite in enumerate(limiti):
+                if valore <= limite:
+                    self.bucket[i] += 1
+                    break
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.somma,
+            'mean': self.somma / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'last': self.ultimo,
+        }
+
+
+def _chiave(nome, etichette):
+    return nome, tuple(sorted((k, str(v)) for k, v in etichette.items()))
+
+
+def _nome_prometheus(nome):
+    return 'classeviva_' + re.sub(r'[^a-zA-Z0-9_]', '_', nome)
+
+
+def _etichette_prometheus(etichette, extra=()):
+    coppie = list(etichette) + list(extra)
+    if not coppie:
+        return ''
+    testo = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in coppie
+    )
+    return '{' + testo + '}'
+
+
+class MetricsRegistry:
+    """Registro thread-safe di durate (span) e osservazioni"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durate = {}
+        self._valori = {}
+        # Funzioni lette a ogni esportazione: ritornano (nome, valore, etichette)
+        self._sorgenti_gauge = []
+
+    def record_duration(self, nome, secondi, **etichette):
+        chiave = _chiave(nome, etichette)
+        with self._lock:
+            serie = self._durate.get(chiave)
+            if serie is None:
+                serie = self._durate[chiave] = Serie(BUCKET_DURATA)
+            serie.add(secondi, BUCKET_DURATA)
+
+    def observe(self, nome, valore, **etichette):
+        chiave = _chiave(nome, etichette)
+        with self._lock:
+            serie = self._valori.get(chiave)
+            if serie is None:
+                serie = self._valori[chiave] = Serie()
+            serie.add(valore)
+
+    def add_gauges(self, sorgente):
+        """Registra una sorgente di gauge (es. profondità di una coda), letta a ogni esportazione"""
+        with self._lock:
+            if sorgente not in self._sorgenti_gauge:
+                self._sorgenti_gauge.append(sorgente)
+
+    def _gauge(self):
+        with self._lock:
+            sorgenti = list(self._sorgenti_gauge)
+        return sorted(
+            (_chiave(nome, etichette), valore)
+            for sorgente in sorgenti
+            for nome, valore, etichette in sorgente()
+        )
+
+    @contextmanager
+    def span(self, nome, **etichette):
+        """Misura la durata del blocco; in caso di eccezione aggiunge esito=errore"""
+        inizio = time.perf_counter()
+        esito = 'ok'
+        try:
+            yield
+        except BaseException:
+            esito = 'errore'
+            raise
+        finally:
+            self.record_duration(nome, time.perf_counter() - inizio, esito=esito, **etichette)
+
+    def timed(self, nome, **etichette):
+        """Decoratore equivalente a span() per funzioni e coroutine"""
+        def decora(funzione):
+            if inspect.iscoroutinefunction(funzione):
+                @functools.wraps(funzione)
+                async def wrapper_async(*args, **kwargs):
+                    with self.span(nome, **etichette):
+                        return await funzione(*args, **kwargs)
+                return wrapper_async
+
+            @functools.wraps(funzione)
+            def wrapper(*args, **kwargs):
+                with self.span(nome, **etichette):
+                    return funzione(*args, **kwargs)
+            return wrapper
+        return decora
+
+    def reset(self):
+        with self._lock:
+            self._durate.clear()
+            self._valori.clear()
+
+    def to_dict(self):
+        with self._lock:
+            durate = list(self._durate.items())
+            valori = list(self._valori.items())
+        gauge = self._gauge()
+        return {
+            'durate': [
+                dict(nome=nome, etichette=dict(etichette), **serie.to_dict())
+                for (nome, etichette), serie in durate
+            ],
+            'valori': [
+                dict(nome=nome, etichette=dict(etichette), **serie.to_dict())
+                for (nome, etichette), serie in valori
+            ],
+            'gauge': [
+                dict(nome=nome, etichette=dict(etichette), valore=valore)
+                for (nome, etichette), valore in gauge
+            ],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self):
+        """Formato di esposizione testuale di Prometheus"""
+        with self._lock:
+            durate = sorted(self._durate.items())
+            valori = sorted(self._valori.items())
+        gauge = self._gauge()
+
+        righe = []
+        dichiarati = set()
+        for (nome, etichette), serie in durate:
+            metrica = _nome_prometheus(nome) + '_seconds'
+            if metrica not in dichiarati:
+                dichiarati.add(metrica)
+                righe.append(f'# TYPE {metrica} histogram')
+            cumulato = 0
+            for limite, conteggio in zip(BUCKET_DURATA, serie.bucket):
+                cumulato += conteggio
+                righe.append(f'{metrica}_bucket{_etichette_prometheus(etichette, [("le", limite)])} {cumulato}')
+            righe.append(f'{metrica}_bucket{_etichette_prometheus(etichette, [("le", "+Inf")])} {serie.count}')
+            righe.append(f'{metrica}_sum{_etichette_prometheus(etichette)} {serie.somma}')
+            righe.append(f'{metrica}_count{_etichette_prometheus(etichette)} {serie.count}')
+
+        # Ogni famiglia va esposta in un solo blocco dopo la sua riga TYPE:
+        # prima il summary per tutte le etichette, poi il gauge _max
+        for nome, gruppo in itertools.groupby(valori, key=lambda voce: voce[0][0]):
+            metrica = _nome_prometheus(nome)
+            gruppo = list(gruppo)
+            righe.append(f'# TYPE {metrica} summary')
+            for (_, etichette), serie in gruppo:
+                righe.append(f'{metrica}_sum{_etichette_prometheus(etichette)} {serie.somma}')
+                righe.append(f'{metrica}_count{_etichette_prometheus(etichette)} {serie.count}')
+            righe.append(f'# TYPE {metrica}_max gauge')
+            for (_, etichette), serie in gruppo:
+                righe.append(f'{metrica}_max{_etichette_prometheus(etichette)} {serie.max}')
+
+        for nome, gruppo in itertools.groupby(gauge, key=lambda voce: voce[0][0]):
+            metrica = _nome_prometheus(nome)
+            righe.append(f'# TYPE {metrica} gauge')
+            for (_, etichette), valore in gruppo:
+                righe.append(f'{metrica}{_etichette_prometheus(etichette)} {valore}')
+        return '\n'.join(righe) + '\n'
+
+    def dump(self, path):
+        """Salva il registro: formato Prometheus se il file termina in .prom, altrimenti JSON"""
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if path.endswith('.prom') else self.to_json(indent=2))
+
+    def serve(self, port, host='127.0.0.1'):
+        """Espone /metrics (Prometheus) e /metrics.json in un thread di background"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registro = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                percorso = urlsplit(self.path).path
+                if percorso == '/metrics':
+                    corpo, tipo = registro.to_prometheus(), 'text/plain; version=0.0.4'
+                elif percorso == '/metrics.json':
+                    corpo, tipo = registro.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                corpo = corpo.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name='classeviva-metrics', daemon=True).start()
+        return httpd
+
+
+def _rotta(url):
+    """Percorso dell'API senza identificativi e date (es. students/{id}/grades)"""
+    percorso = urlsplit(url).path
+    percorso = re.sub(r'^/rest/v1/', '', percorso)
+    percorso = re.sub(r'/students/[^/]+', '/students/{id}', '/' + percorso.lstrip('/'))
+    percorso = re.sub(r'/\d{8}(?=/|$)', '', percorso)
+    return percorso.lstrip('/')
+
+
+def instrument(utente, registro=None):
+    """Misura ogni richiesta HTTP di un classeviva.Utente: durata, byte e decodifica JSON"""
+    registro = registro or registry
+    sessione = getattr(utente, '_sessione', None)
+    if sessione is None or getattr(sessione, '_metrics', None) is registro:
+        return False
+    originale = sessione.request
+
+    def request(method, url, *args, **kwargs):
+        rotta = _rotta(url)
+        inizio = time.perf_counter()
+        try:
+            risposta = originale(method, url, *args, **kwargs)
+        except Exception:
+            registro.record_duration('http_request', time.perf_counter() - inizio, rotta=rotta, stato='errore')
+            raise
+        registro.record_duration('http_request', time.perf_counter() - inizio,
+                                 rotta=rotta, stato=getattr(risposta, 'status_code', ''))
+        contenuto = getattr(risposta, 'content', None)
+        if contenuto is not None:
+            registro.observe('payload_bytes', len(contenuto), rotta=rotta)
+
+        decodifica = getattr(risposta, 'json', None)
+        if decodifica is not None:
+            def json_misurato(*a, **k):
+                with registro.span('json_decode', rotta=rotta):
+                    return decodifica(*a, **k)
+            risposta.json = json_misurato
+        return risposta
+
+    sessione.request = request
+    sessione._metrics = registro
+    return True
+
+
+# Registro condiviso dall'app
+registry = MetricsRegistry()
+span = registry.span
+observe = registry.observe
+timed = registry.timed
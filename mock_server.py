@@ -0,0 +1,380 @@
+"""Server locale che imita le API REST di Spaggiari (rest/v1)
+
+Implementa auth/login, students/{id}/card, students/{id}/grades e
+students/{id}/absences/details[/{inizio}[/{fine}]] con payload sintetici
+deterministici, più latenza, errori, 429 e scadenza dei token configurabili.
+Permette di provare concorrenza, ritentativi, cache e carico senza rete.
+
+Uso:
+    python mock_server.py --port 8765 --voti 2000 --latency lognormal:80:0.5 \\
+        --error-rate 0.02 --rate-limit 50 --token-ttl 300
+
+Il client Python si collega con CLASSEVIVA_SERVER=http://127.0.0.1:8765 (o
+batch.py --server), il proxy con SPAGGIARI_BASE_URL=http://127.0.0.1:8765/rest/v1.
+Statistiche in GET /__mock__/stats, configurazione a caldo con POST /__mock__/config.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import secrets
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from benchmarks.payloads import genera_assenze, genera_carta, genera_voti
+from endpoint import reindirizza  # noqa: F401 (riesportato, prima era definito qui)
+
+
+PREFISSO = '/rest/v1'
+
+ROTTA_STUDENTE = re.compile(
+    r'^/rest/v1/students/(?P<id>[^/]+)/(?P<risorsa>card|grades|absences/details)'
+    r'(?:/(?P<inizio>\d{8}))?(?:/(?P<fine>\d{8}))?/?$'
+)
+
+
+def parse_latency(spec):
+    """
+    Distribuzione della latenza in millisecondi:
+    "50" o "fixed:50", "uniform:20:200", "exp:100" (media),
+    "lognormal:80:0.5" (mediana, sigma)
+    """
+    if spec is None or spec == '':
+        return lambda rnd: 0.0
+    parti = str(spec).split(':')
+    tipo = parti[0]
+    try:
+        valori = [float(p) for p in parti[1:]]
+        if len(parti) == 1:
+            fisso = float(tipo)
+            return lambda rnd: fisso
+    except ValueError:
+        raise ValueError(f'Latenza non valida: {spec}')
+
+    if tipo == 'fixed' and len(valori) == 1:
+        return lambda rnd: valori[0]
+    if tipo == 'uniform' and len(valori) == 2:
+        return lambda rnd: rnd.uniform(valori[0], valori[1])
+    if tipo == 'exp' and len(valori) == 1:
+        return lambda rnd: rnd.expovariate(1.0 / valori[0]) if valori[0] > 0 else 0.0
+    if tipo == 'lognormal' and len(valori) == 2:
+        return lambda rnd: rnd.lognormvariate(math.log(valori[0]), valori[1])
+    raise ValueError(f'Latenza non valida: {spec}')
+
+
+class MockConfig:
+    """Parametri del server, modificabili anche a server avviato"""
+
+    CAMPI = ('voti', 'assenze', 'latency', 'error_rate', 'rate_429', 'rate_limit',
+             'retry_after', 'token_ttl', 'password', 'seed')
+
+    def __init__(self, voti=200, assenze=40, latency=None, error_rate=0.0, rate_429=0.0,
+                 rate_limit=None, retry_after=1, token_ttl=5400, password=None, seed=0):
+        # Numero di record per studente
+        self.voti = voti
+        self.assenze = assenze
+        self.latency = latency
+        # Probabilità di 500/502/503 e di 429 casuali
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        # Richieste al secondo oltre le quali si risponde 429
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        # Durata dei token in secondi
+        self.token_ttl = token_ttl
+        # Se impostata, l'unica password accettata
+        self.password = password
+        self.seed = seed
+
+    def update(self, valori):
+        for campo, valore in valori.items():
+            if campo in self.CAMPI:
+                setattr(self, campo, valore)
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.CAMPI}
+
+
+class MockState:
+    """Token emessi, payload già generati, limitatore e contatori"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.rnd = random.Random(config.seed)
+        self.tokens = {}
+        self.payload = {}
+        self.contatori = {}
+        self._bucket = None
+        self._ultimo = time.monotonic()
+        self._latenza = (None, parse_latency(None))
+
+    def latenza(self):
+        with self.lock:
+            if self._latenza[0] != self.config.latency:
+                self._latenza = (self.config.latency, parse_latency(self.config.latency))
+            return max(0.0, self._latenza[1](self.rnd)) / 1000
+
+    def sorteggio(self, probabilita):
+        with self.lock:
+            return probabilita > 0 and self.rnd.random() < probabilita
+
+    def scegli(self, valori):
+        with self.lock:
+            return self.rnd.choice(valori)
+
+    def consenti(self):
+        """Token bucket del server: False se la richiesta va rifiutata con 429"""
+        limite = self.config.rate_limit
+        if not limite:
+            return True
+        with self.lock:
+            ora = time.monotonic()
+            if self._bucket is None:
+                self._bucket = float(limite)
+            self._bucket = min(float(limite), self._bucket + (ora - self._ultimo) * limite)
+            self._ultimo = ora
+            if self._bucket < 1:
+                return False
+            self._bucket -= 1
+            return True
+
+    def conta(self, rotta, stato):
+        chiave = f'{rotta} {stato}'
+        with self.lock:
+            self.contatori[chiave] = self.contatori.get(chiave, 0) + 1
+
+    def emetti_token(self, studente):
+        token = secrets.token_hex(16)
+        scadenza = time.time() + self.config.token_ttl
+        with self.lock:
+            self.tokens[token] = (studente, scadenza)
+        return token, scadenza
+
+    def verifica_token(self, token):
+        with self.lock:
+            voce = self.tokens.get(token)
+        if voce is None or voce[1] <= time.time():
+            return None
+        return voce[0]
+
+    def payload_studente(self, studente, risorsa):
+        """JSON già serializzato, generato una volta per studente e dimensione"""
+        seed = zlib.crc32(studente.encode()) ^ self.config.seed
+        chiave = (studente, risorsa, self.config.voti, self.config.assenze, seed)
+        with self.lock:
+            corpo = self.payload.get(chiave)
+        if corpo is not None:
+            return corpo
+        if risorsa == 'card':
+            dati = {'card': dict(genera_carta(seed), usrId=int(studente), ident=f'S{studente}X')}
+        elif risorsa == 'grades':
+            dati = {'grades': genera_voti(self.config.voti, seed)}
+        else:
+            dati = {'events': genera_assenze(self.config.assenze, seed)}
+        corpo = json.dumps(dati).encode()
+        with self.lock:
+            self.payload[chiave] = corpo
+        return corpo
+
+    def stats(self):
+        with self.lock:
+            return {
+                'contatori': dict(self.contatori),
+                'token_attivi': sum(1 for _, s in self.tokens.values() if s > time.time()),
+            }
+
+
+def _id_numerico(valore):
+    return re.sub(r'[^0-9]', '', valore or '')
+
+
+def _iso(istante):
+    return datetime.fromtimestamp(istante, timezone(timedelta(hours=1))).isoformat(timespec='seconds')
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = 'MockSpaggiari/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def stato(self):
+        return self.server.stato
+
+    def log_message(self, formato, *args):
+        if getattr(self.server, 'verbose', False):
+            super().log_message(formato, *args)
+
+    def _rispondi(self, codice, corpo, rotta, intestazioni=None):
+        if not isinstance(corpo, bytes):
+            corpo = json.dumps(corpo).encode()
+        self.send_response(codice)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        for nome, valore in (intestazioni or {}).items():
+            self.send_header(nome, str(valore))
+        self.end_headers()
+        self.wfile.write(corpo)
+        self.stato.conta(rotta, codice)
+
+    def _leggi_corpo(self):
+        lunghezza = int(self.headers.get('Content-Length') or 0)
+        testo = self.rfile.read(lunghezza) if lunghezza else b''
+        try:
+            return json.loads(testo or b'{}')
+        except ValueError:
+            return {}
+
+    def _guasti(self, rotta):
+        """Latenza e guasti iniettati; True se la risposta è già stata inviata"""
+        config = self.stato.config
+        attesa = self.stato.latenza()
+        if attesa:
+            time.sleep(attesa)
+        if not self.stato.consenti() or self.stato.sorteggio(config.rate_429):
+            self._rispondi(429, {'statusCode': 429, 'error': 'too many requests'}, rotta,
+                           {'Retry-After': config.retry_after})
+            return True
+        if self.stato.sorteggio(config.error_rate):
+            codice = self.stato.scegli((500, 502, 503))
+            self._rispondi(codice, {'statusCode': codice, 'error': 'server error'}, rotta)
+            return True
+        return False
+
+    def do_GET(self):
+        percorso = urlsplit(self.path).path
+        if percorso == '/__mock__/stats':
+            return self._rispondi(200, self.stato.stats(), 'stats')
+        if percorso == '/__mock__/config':
+            return self._rispondi(200, self.stato.config.to_dict(), 'config')
+
+        match = ROTTA_STUDENTE.match(percorso)
+        if match is None:
+            return self._rispondi(404, {'statusCode': 404, 'error': 'not found'}, 'sconosciuta')
+        risorsa = match.group('risorsa')
+        if self._guasti(risorsa):
+            return
+
+        studente = self.stato.verifica_token(self.headers.get('Z-Auth-Token'))
+        if studente is None:
+            return self._rispondi(401, {
+                'statusCode': 401, 'error': 'CvvRestApi/auth token expired',
+                'message': 'auth token expired'
+            }, risorsa)
+        if _id_numerico(match.group('id')) != studente:
+            return self._rispondi(403, {'statusCode': 403, 'error': 'forbidden'}, risorsa)
+
+        if match.group('inizio'):
+            return self._assenze_da(studente, match.group('inizio'), match.group('fine'))
+        return self._rispondi(200, self.stato.payload_studente(studente, risorsa), risorsa)
+
+    def _assenze_da(self, studente, inizio, fine):
+        try:
+            da = datetime.strptime(inizio, '%Y%m%d').date().isoformat()
+            a = datetime.strptime(fine, '%Y%m%d').date().isoformat() if fine else '9999-12-31'
+        except ValueError:
+            return self._rispondi(404, {'statusCode': 404, 'error': '120:CvvRestApi/wrong date format'},
+                                  'absences/details')
+        eventi = json.loads(self.stato.payload_studente(studente, 'absences/details'))['events']
+        eventi = [e for e in eventi if da <= e['evtDate'] <= a]
+        return self._rispondi(200, {'events': eventi}, 'absences/details')
+
+    def do_POST(self):
+        percorso = urlsplit(self.path).path
+        if percorso == '/__mock__/config':
+            self.stato.config.update(self._leggi_corpo())
+            return self._rispondi(200, self.stato.config.to_dict(), 'config')
+        if percorso.rstrip('/') != f'{PREFISSO}/auth/login':
+            return self._rispondi(404, {'statusCode': 404, 'error': 'not found'}, 'sconosciuta')
+        if self._guasti('auth/login'):
+            return
+
+        dati = self._leggi_corpo()
+        uid = dati.get('uid') or ''
+        studente = _id_numerico(uid)
+        password = self.stato.config.password
+        if not studente or not dati.get('pass') or (password is not None and dati['pass'] != password):
+            return self._rispondi(422, {
+                'statusCode': 422, 'error': 'CvvRestApi/wrong credentials', 'info': 'wrong credentials'
+            }, 'auth/login')
+
+        token, scadenza = self.stato.emetti_token(studente)
+        return self._rispondi(200, {
+            'ident': f'S{studente}X',
+            'firstName': 'MARIO',
+            'lastName': 'ROSSI',
+            'showPwdChangeReminder': False,
+            'token': token,
+            'release': _iso(time.time()),
+            'expire': _iso(scadenza),
+        }, 'auth/login')
+
+
+class MockSpaggiari:
+    """Server mock avviabile anche da codice (es. benchmark e prove di carico)"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0, verbose=False):
+        self.stato = MockState(config or MockConfig())
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stato = self.stato
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-spaggiari', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Server mock delle API di Spaggiari')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--voti', type=int, default=200, help='voti per studente')
+    parser.add_argument('--assenze', type=int, default=40, help='eventi di assenza per studente')
+    parser.add_argument('--latency', help='es. 50, uniform:20:200, exp:100, lognormal:80:0.5 (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probabilità di 5xx')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='probabilità di 429 casuali')
+    parser.add_argument('--rate-limit', type=float, help='richieste al secondo prima dei 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='secondi indicati nei 429')
+    parser.add_argument('--token-ttl', type=int, default=5400, help='durata dei token in secondi')
+    parser.add_argument('--password', help='unica password accettata (predefinito: qualsiasi)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        voti=args.voti, assenze=args.assenze, latency=args.latency,
+        error_rate=args.error_rate, rate_429=args.rate_429, rate_limit=args.rate_limit,
+        retry_after=args.retry_after, token_ttl=args.token_ttl,
+        password=args.password, seed=args.seed
+    )
+    parse_latency(config.latency)
+    server = MockSpaggiari(config, args.host, args.port, args.verbose)
+    print(f'Mock Spaggiari in ascolto su {server.url}{PREFISSO}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
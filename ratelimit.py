@@ -0,0 +1,211 @@
+"""Limitazione della frequenza delle richieste verso Spaggiari
+
+Un token bucket per host, con un sotto-limite opzionale per account. La
+velocità si adatta in modo AIMD: aumenta piano a ogni risposta riuscita e si
+dimezza quando il server risponde 429, così le sincronizzazioni di molti
+account restano al ritmo più alto tollerato dal server.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import metrics
+from retry import parse_retry_after
+
+
+class TokenBucket:
+    """Token bucket thread-safe con prenotazione dei token (ordine FIFO)"""
+
+    def __init__(self, rate, capacity, min_rate=None, max_rate=None,
+                 increase=0.1, decrease=0.5, clock=time.monotonic):
+        # rate: token al secondo; capacity: raffica massima
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.min_rate = float(min_rate) if min_rate is not None else self.rate / 16
+        self.max_rate = float(max_rate) if max_rate is not None else self.rate
+        self.increase = increase
+        self.decrease = decrease
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._ultimo = clock()
+        # Nessun token viene concesso prima di questo istante (es. Retry-After)
+        self._pausa_fino = 0.0
+
+        self.in_coda = 0
+        self.attese = 0
+        self.attesa_totale = 0.0
+        self.attesa_max = 0.0
+        self.limitazioni = 0
+
+    def _ricarica(self, ora):
+        self._tokens = min(self.capacity, self._tokens + (ora - self._ultimo) * self.rate)
+        self._ultimo = ora
+
+    def reserve(self):
+        """Prenota un token e ritorna i secondi da attendere prima di usarlo"""
+        with self._lock:
+            ora = self._clock()
+            self._ricarica(ora)
+            self._tokens -= 1
+            attesa = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            attesa = max(attesa, self._pausa_fino - ora)
+            if attesa > 0:
+                self.attese += 1
+                self.attesa_totale += attesa
+                self.attesa_max = max(self.attesa_max, attesa)
+            return attesa
+
+    def acquire(self):
+        """Attende (bloccando il thread) finché la richiesta può partire"""
+        attesa = self.reserve()
+        if attesa > 0:
+            with self._lock:
+                self.in_coda += 1
+            try:
+                time.sleep(attesa)
+            finally:
+                with self._lock:
+                    self.in_coda -= 1
+        return attesa
+
+    def on_success(self):
+        """Aumento additivo della velocità"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self, pausa=None):
+        """Diminuzione moltiplicativa dopo un 429, più l'eventuale Retry-After"""
+        with self._lock:
+            self.limitazioni += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # I token accumulati non valgono più: il server è già saturo
+            self._tokens = min(self._tokens, 0.0)
+            if pausa:
+                self._pausa_fino = max(self._pausa_fino, self._clock() + pausa)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'capacity': self.capacity,
+                'in_coda': self.in_coda,
+                'attese': self.attese,
+                'attesa_totale': round(self.attesa_totale, 3),
+                'attesa_media': round(self.attesa_totale / self.attese, 3) if self.attese else 0.0,
+                'attesa_max': round(self.attesa_max, 3),
+                'limitazioni_429': self.limitazioni,
+            }
+
+
+class RateLimiter:
+    """Token bucket per host con sotto-limite opzionale per account"""
+
+    def __init__(self, rate=5.0, capacity=10, per_account_rate=None, per_account_capacity=None,
+                 min_rate=None, max_rate=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.per_account_rate = per_account_rate
+        self.per_account_capacity = per_account_capacity or capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._host = {}
+        self._account = {}
+
+    def _bucket(self, host):
+        with self._lock:
+            bucket = self._host.get(host)
+            if bucket is None:
+                bucket = self._host[host] = TokenBucket(
+                    self.rate, self.capacity, self.min_rate, self.max_rate, clock=self._clock
+                )
+            return bucket
+
+    def _bucket_account(self, host, account):
+        if self.per_account_rate is None or account is None:
+            return None
+        chiave = (host, account)
+        with self._lock:
+            bucket = self._account.get(chiave)
+            if bucket is None:
+                bucket = self._account[chiave] = TokenBucket(
+                    self.per_account_rate, self.per_account_capacity, clock=self._clock
+                )
+            return bucket
+
+    def acquire(self, host, account=None):
+        """Attende il proprio turno per host (e account); ritorna i secondi attesi"""
+        attesa = 0.0
+        bucket_account = self._bucket_account(host, account)
+        if bucket_account is not None:
+            attesa += bucket_account.acquire()
+        return attesa + self._bucket(host).acquire()
+
+    def record(self, host, status, pausa=None):
+        """Adatta la velocità dell'host all'esito di una risposta"""
+        bucket = self._bucket(host)
+        if status == 429:
+            bucket.on_throttled(pausa)
+        elif status is not None and status < 400:
+            bucket.on_success()
+
+    def install(self, utente, account=None, registro=None):
+        """Fa passare dal limitatore tutte le richieste HTTP di un classeviva.Utente
+
+        Le attese finiscono nell'istogramma ratelimit_attesa del registro delle
+        metriche, velocità e coda come gauge (vedi gauges).
+        """
+        registro = registro or metrics.registry
+        sessione = getattr(utente, '_sessione', None)
+        if sessione is None or getattr(sessione, '_rate_limiter', None) is self:
+            return False
+        registro.add_gauges(self.gauges)
+        originale = sessione.request
+
+        def request(method, url, *args, **kwargs):
+            host = urlsplit(url).hostname or ''
+            registro.record_duration('ratelimit_attesa', self.acquire(host, account), host=host)
+            risposta = originale(method, url, *args, **kwargs)
+            stato = getattr(risposta, 'status_code', None)
+            pausa = None
+            if stato == 429:
+                pausa = parse_retry_after((getattr(risposta, 'headers', None) or {}).get('Retry-After'))
+            self.record(host, stato, pausa)
+            return risposta
+
+        sessione.request = request
+        sessione._rate_limiter = self
+        return True
+
+    def gauges(self):
+        """Velocità e richieste in coda per host, come (nome, valore, etichette)
+
+        Le code per account sono sommate per host: un'etichetta per studente
+        renderebbe ingestibile il numero di serie in modalità batch.
+        """
+        with self._lock:
+            host = list(self._host.items())
+            account = list(self._account.items())
+        campioni = []
+        for nome, bucket in host:
+            campioni.append(('ratelimit_rate', bucket.rate, {'host': nome}))
+            campioni.append(('ratelimit_in_coda', bucket.in_coda, {'host': nome, 'livello': 'host'}))
+        in_coda_account = {}
+        for (nome, _), bucket in account:
+            in_coda_account[nome] = in_coda_account.get(nome, 0) + bucket.in_coda
+        for nome, in_coda in in_coda_account.items():
+            campioni.append(('ratelimit_in_coda', in_coda, {'host': nome, 'livello': 'account'}))
+        return campioni
+
+    def metrics(self):
+        """Velocità, profondità della coda e tempi di attesa per host e account"""
+        with self._lock:
+            host = dict(self._host)
+            account = dict(self._account)
+        return {
+            'host': {nome: bucket.metrics() for nome, bucket in host.items()},
+            'account': {f'{h}|{a}': bucket.metrics() for (h, a), bucket in account.items()},
+        }
@@ -0,0 +1,223 @@
+"""Politica di ritentativo con backoff esponenziale, jitter e circuit breaker"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+# Codici HTTP per cui ha senso ritentare
+STATI_RITENTABILI = {408, 425, 429, 500, 502, 503, 504}
+# Codici che indicano un server in difficoltà (contano per il circuit breaker)
+STATI_GUASTO = {429, 500, 502, 503, 504}
+# Timeout ed errori di rete (requests.RequestException deriva da OSError)
+ERRORI_RETE = (asyncio.TimeoutError, TimeoutError, ConnectionError, OSError)
+
+
+class CircuitOpenError(Exception):
+    """Il servizio remoto è considerato non disponibile: nessuna richiesta inviata"""
+    pass
+
+
+class ErroreRisposta(Exception):
+    """Risposta HTTP con un codice ritentabile, con l'eventuale Retry-After del server"""
+
+    def __init__(self, status_code, headers=None):
+        # Stesso messaggio di classeviva.eccezioni.ErroreHTTP
+        super().__init__(f'Codice: {status_code}')
+        self.status_code = status_code
+        self.retry_after = (headers or {}).get('Retry-After')
+
+
+def install(utente):
+    """Solleva ErroreRisposta sulle risposte ritentabili di un classeviva.Utente
+
+    Il client solleva ErroreHTTP con il solo codice nel messaggio: così codice
+    e header Retry-After arrivano fino a RetryPolicy. Va installata dopo
+    metrics.instrument, che deve comunque vedere la risposta.
+    """
+    sessione = getattr(utente, '_sessione', None)
+    if sessione is None or getattr(sessione, '_errori_risposta', False):
+        return False
+    originale = sessione.request
+
+    def request(method, url, *args, **kwargs):
+        risposta = originale(method, url, *args, **kwargs)
+        stato = getattr(risposta, 'status_code', None)
+        if stato in STATI_RITENTABILI:
+            raise ErroreRisposta(stato, getattr(risposta, 'headers', None))
+        return risposta
+
+    sessione.request = request
+    sessione._errori_risposta = True
+    return True
+
+
+def status_code(errore):
+    """Estrae il codice HTTP da un'eccezione, se presente"""
+    for attr in ('status', 'status_code'):
+        valore = getattr(errore, attr, None)
+        if isinstance(valore, int):
+            return valore
+    response = getattr(errore, 'response', None)
+    if response is not None and isinstance(getattr(response, 'status_code', None), int):
+        return response.status_code
+    # classeviva.eccezioni.ErroreHTTP riporta il codice solo nel messaggio
+    match = re.search(r'Codice: (\d{3})', str(errore))
+    return int(match.group(1)) if match else None
+
+
+def retry_after(errore):
+    """Secondi di attesa richiesti dal server (header Retry-After), se presenti"""
+    valore = getattr(errore, 'retry_after', None)
+    if valore is None:
+        response = getattr(errore, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        valore = headers.get('Retry-After')
+    return parse_retry_after(valore)
+
+
+def parse_retry_after(valore):
+    """Interpreta il valore dell'header Retry-After (secondi o data HTTP)"""
+    if valore is None:
+        return None
+    try:
+        return max(0.0, float(valore))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valore).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(errore):
+    """Solo errori di rete, timeout e codici transitori; il resto (es. bug) subito"""
+    if isinstance(errore, CircuitOpenError):
+        return False
+    stato = status_code(errore)
+    if stato is not None:
+        return stato in STATI_RITENTABILI
+    return isinstance(errore, ERRORI_RETE)
+
+
+def is_failure(errore):
+    """Errori che indicano un server giù o sovraccarico"""
+    if isinstance(errore, ERRORI_RETE):
+        return True
+    stato = status_code(errore)
+    return stato is not None and stato in STATI_GUASTO
+
+
+class CircuitBreaker:
+    """Smette di contattare il server dopo troppi errori consecutivi"""
+
+    CHIUSO = 'closed'
+    APERTO = 'open'
+    SEMIAPERTO = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._errori = 0
+        self._aperto_da = None
+        self._prova_in_corso = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._aperto_da is None:
+            return self.CHIUSO
+        if self._clock() - self._aperto_da >= self.reset_timeout:
+            return self.SEMIAPERTO
+        return self.APERTO
+
+    def allow(self):
+        """True se una richiesta può partire (in semiaperto ne passa una sola di prova)"""
+        with self._lock:
+            stato = self._state()
+            if stato == self.CHIUSO:
+                return True
+            if stato == self.SEMIAPERTO and not self._prova_in_corso:
+                self._prova_in_corso = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Secondi mancanti prima del prossimo tentativo di prova"""
+        with self._lock:
+            if self._aperto_da is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._aperto_da))
+
+    def record_success(self):
+        with self._lock:
+            self._errori = 0
+            self._aperto_da = None
+            self._prova_in_corso = False
+
+    def record_failure(self):
+        with self._lock:
+            self._errori += 1
+            if self._prova_in_corso or self._errori >= self.failure_threshold:
+                self._aperto_da = self._clock()
+            self._prova_in_corso = False
+
+
+class RetryPolicy:
+    """Ritenta le chiamate con backoff esponenziale e jitter"""
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=30.0, multiplier=2.0,
+                 jitter=True, max_retry_after=60.0, breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker
+
+    def delay(self, attempt, errore=None):
+        """Attesa prima del tentativo successivo all'attempt-esimo (da 0)"""
+        attesa = min(self.max_delay, self.base_delay * (self.multiplier ** attempt))
+        if self.jitter:
+            # "Full jitter": distribuisce i ritentativi di più client nel tempo
+            attesa = random.uniform(0, attesa)
+        if errore is not None and status_code(errore) in (429, 503):
+            richiesta = retry_after(errore)
+            if richiesta is not None:
+                attesa = max(attesa, min(richiesta, self.max_retry_after))
+        return attesa
+
+    async def run(self, factory, nome='richiesta'):
+        """Esegue factory() ritentando gli errori transitori"""
+        for attempt in range(self.max_attempts):
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpenError(
+                    f'{nome}: servizio non disponibile, nuovo tentativo tra {self.breaker.retry_in():.0f}s'
+                )
+            try:
+                risultato = await factory()
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f'{nome}: nessuna risposta')
+                if self.breaker is not None:
+                    if is_failure(e):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                print(f'Tentativo {attempt + 1} caricamento {nome} fallito: {e}')
+                if attempt == self.max_attempts - 1 or not is_retryable(e):
+                    raise e
+                await asyncio.sleep(self.delay(attempt, e))
+            else:
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                return risultato
@@ -0,0 +1,86 @@
+"""Runtime asyncio di lunga durata su cui gira tutto il lavoro di rete"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class AsyncRuntime:
+    """Event loop in un thread di background, condiviso da tutta l'app"""
+
+    def __init__(self, dispatch=None, max_workers=4, name='classeviva-async'):
+        # dispatch(fn) esegue fn sul thread della UI (es. tramite Clock)
+        self._dispatch = dispatch or (lambda fn: fn())
+        self._futures = set()
+        self._lock = threading.Lock()
+
+        self.loop = asyncio.new_event_loop()
+        # Thread riutilizzati per le chiamate bloccanti del client
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def running(self):
+        return self.loop.is_running()
+
+    def submit(self, coro, on_success=None, on_error=None):
+        """
+        Pianifica la coroutine sul runtime e ritorna il suo Future.
+
+        on_success(risultato) e on_error(eccezione) vengono chiamate sul
+        thread della UI; nessuna delle due viene chiamata se il lavoro è annullato.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._futures.add(future)
+
+        def done(f):
+            with self._lock:
+                self._futures.discard(f)
+            if f.cancelled():
+                return
+            try:
+                risultato = f.result()
+            except CancelledError:
+                return
+            except Exception as e:
+                if on_error is not None:
+                    self._dispatch(lambda: on_error(e))
+                else:
+                    print(f'Errore operazione in background: {e}')
+                return
+            if on_success is not None:
+                self._dispatch(lambda: on_success(risultato))
+
+        future.add_done_callback(done)
+        return future
+
+    def call_in_ui(self, fn):
+        """Esegue fn sul thread della UI"""
+        self._dispatch(fn)
+
+    def cancel_all(self):
+        """Annulla tutto il lavoro in corso (es. al logout)"""
+        with self._lock:
+            futures = list(self._futures)
+            self._futures.clear()
+        for future in futures:
+            future.cancel()
+
+    def stop(self):
+        self.cancel_all()
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
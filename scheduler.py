@@ -0,0 +1,112 @@
+"""Lavoro sulla UI diviso in passi ed eseguito entro un budget per frame
+
+Ogni lavoro è un generatore: ogni yield è un punto in cui il lavoro può
+essere sospeso e ripreso al frame successivo. A ogni frame si eseguono passi
+dei lavori in ordine di priorità (0 = più urgente) finché il budget non è
+esaurito; un nuovo lavoro con la stessa chiave annulla quello in corso.
+"""
+
+import itertools
+import time
+
+
+# Budget predefinito per frame (s): a 60 fps ne resta metà per layout e disegno
+BUDGET_FRAME = 0.008
+
+
+class Lavoro:
+    """Generatore da eseguire a passi, con i tempi accumulati"""
+
+    __slots__ = ('chiave', 'passi', 'priorita', 'ordine', 'on_done', 'tempo', 'frame', 'creato')
+
+    def __init__(self, chiave, passi, priorita, ordine, on_done, creato):
+        self.chiave = chiave
+        self.passi = passi
+        self.priorita = priorita
+        self.ordine = ordine
+        self.on_done = on_done
+        # Tempo di esecuzione effettivo (somma dei passi) e frame usati
+        self.tempo = 0.0
+        self.frame = 0
+        self.creato = creato
+
+
+class FrameScheduler:
+    """Coda di lavori a priorità eseguiti a passi, un budget per frame"""
+
+    def __init__(self, schedule, budget=BUDGET_FRAME, clock=time.perf_counter):
+        # schedule(fn) chiede di eseguire fn al prossimo frame (es. tramite Clock)
+        self._schedule = schedule
+        self.budget = budget
+        self._clock = clock
+        self._lavori = {}
+        self._ordine = itertools.count()
+        self._programmato = False
+
+    def submit(self, chiave, passi, priorita=1, on_done=None):
+        """Accoda un generatore; annulla il lavoro precedente con la stessa chiave"""
+        self.cancel(chiave)
+        self._lavori[chiave] = Lavoro(chiave, passi, priorita, next(self._ordine), on_done, self._clock())
+        self._programma()
+
+    def cancel(self, chiave):
+        lavoro = self._lavori.pop(chiave, None)
+        if lavoro is not None:
+            lavoro.passi.close()
+        return lavoro is not None
+
+    def cancel_all(self):
+        for chiave in list(self._lavori):
+            self.cancel(chiave)
+
+    def set_priority(self, chiave, priorita):
+        lavoro = self._lavori.get(chiave)
+        if lavoro is not None:
+            lavoro.priorita = priorita
+
+    def pending(self, chiave=None):
+        return bool(self._lavori) if chiave is None else chiave in self._lavori
+
+    def run_until_complete(self, chiave):
+        """Completa subito un lavoro, senza budget"""
+        lavoro = self._lavori.get(chiave)
+        while lavoro is not None and self._lavori.get(chiave) is lavoro:
+            self._passo(lavoro)
+
+    def _programma(self):
+        if not self._programmato and self._lavori:
+            self._programmato = True
+            self._schedule(self._esegui)
+
+    def _passo(self, lavoro):
+        inizio = self._clock()
+        try:
+            next(lavoro.passi)
+            finito = False
+        except StopIteration:
+            finito = True
+        except Exception as e:
+            print(f'Errore lavoro UI {lavoro.chiave}: {e}')
+            self._lavori.pop(lavoro.chiave, None)
+            return
+        finally:
+            lavoro.tempo += self._clock() - inizio
+        if finito:
+            self._lavori.pop(lavoro.chiave, None)
+            if lavoro.on_done is not None:
+                lavoro.on_done(lavoro)
+
+    def _esegui(self):
+        self._programmato = False
+        inizio = self._clock()
+        eseguiti = set()
+        # Almeno un passo per frame, poi finché resta budget
+        while self._lavori:
+            lavoro = min(self._lavori.values(), key=lambda l: (l.priorita, l.ordine))
+            if lavoro.chiave not in eseguiti:
+                eseguiti.add(lavoro.chiave)
+                lavoro.frame += 1
+            self._passo(lavoro)
+            if self._clock() - inizio >= self.budget:
+                break
+        self._programma()
@@ -0,0 +1,180 @@
+"""Calendario scolastico con indice cumulativo dei giorni di scuola
+
+Il calendario di un anno scolastico viene costruito una volta sola: giorni
+trascorsi, rimanenti e limite assenze diventano accessi O(1) all'indice.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+
+FESTIVITA_NAZIONALI = (
+    (11, 1), (12, 8), (12, 25), (12, 26),
+    (1, 1), (1, 6), (4, 25), (5, 1), (6, 2),
+)
+
+# Vacanze di Natale: dal 23 dicembre al 6 gennaio
+PAUSE_PREDEFINITE = (
+    ((12, 23), (1, 6)),
+)
+
+
+def pasqua(anno):
+    """Data della Pasqua (calendario gregoriano, algoritmo di Meeus/Jones/Butcher)"""
+    a = anno % 19
+    b, c = divmod(anno, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mese, giorno = divmod(h + l - 7 * m + 114, 31)
+    return date(anno, mese, giorno + 1)
+
+
+class CalendarConfig:
+    """Festività e pause configurabili (es. per regione)"""
+
+    def __init__(self, festivita=FESTIVITA_NAZIONALI, pause=PAUSE_PREDEFINITE,
+                 pasqua_prima=3, pasqua_dopo=2, inizio=(9, 1), fine=(6, 30), regione='default'):
+        # Festività fisse come (mese, giorno)
+        self.festivita = tuple(tuple(f) for f in festivita)
+        # Pause come ((mese, giorno) inizio, (mese, giorno) fine), estremi inclusi
+        self.pause = tuple((tuple(a), tuple(b)) for a, b in pause)
+        # Giorni di vacanza prima e dopo la domenica di Pasqua
+        self.pasqua_prima = pasqua_prima
+        self.pasqua_dopo = pasqua_dopo
+        self.inizio = tuple(inizio)
+        self.fine = tuple(fine)
+        self.regione = regione
+
+    def key(self):
+        """Chiave stabile della configurazione, usata per la memoizzazione"""
+        return json.dumps([
+            self.regione, self.festivita, self.pause,
+            self.pasqua_prima, self.pasqua_dopo, self.inizio, self.fine
+        ])
+
+    @classmethod
+    def load(cls, path):
+        """Legge la configurazione da un file JSON; se assente usa i valori predefiniti"""
+        try:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    return cls(**json.load(f))
+        except Exception as e:
+            print(f'Errore caricamento calendario: {e}')
+        return cls()
+
+
+def anno_scolastico(oggi):
+    """Anno di inizio dell'anno scolastico in corso"""
+    return oggi.year if oggi.month >= 9 else oggi.year - 1
+
+
+class SchoolCalendar:
+    """Indice cumulativo dei giorni di scuola di un anno scolastico"""
+
+    def __init__(self, anno_inizio, config, cumulati=None):
+        self.anno_inizio = anno_inizio
+        self.config = config
+        self.inizio = date(anno_inizio, *config.inizio)
+        self.fine = date(anno_inizio + 1, *config.fine)
+        # cumulati[i] = giorni di scuola da inizio fino a inizio + i (incluso)
+        self.cumulati = cumulati if cumulati is not None else self._costruisci()
+
+    def _vacanze(self):
+        vacanze = set()
+        for anno in (self.anno_inizio, self.anno_inizio + 1):
+            for mese, giorno in self.config.festivita:
+                try:
+                    vacanze.add(date(anno, mese, giorno))
+                except ValueError:
+                    pass
+
+        for (m1, g1), (m2, g2) in self.config.pause:
+            # Una pausa che "torna indietro" nell'anno (es. 23/12 - 6/1) attraversa capodanno
+            da = date(self.anno_inizio if m1 >= 9 else self.anno_inizio + 1, m1, g1)
+            a = date(da.year if (m2, g2) >= (m1, g1) else da.year + 1, m2, g2)
+            giorno = da
+            while giorno <= a:
+                vacanze.add(giorno)
+                giorno += timedelta(days=1)
+
+        domenica = pasqua(self.anno_inizio + 1)
+        for delta in range(-self.config.pasqua_prima, self.config.pasqua_dopo + 1):
+            vacanze.add(domenica + timedelta(days=delta))
+        return vacanze
+
+    def _costruisci(self):
+        vacanze = self._vacanze()
+        cumulati = []
+        totale = 0
+        giorno = self.inizio
+        while giorno <= self.fine:
+            if giorno.weekday() < 5 and giorno not in vacanze:
+                totale += 1
+            cumulati.append(totale)
+            giorno += timedelta(days=1)
+        return cumulati
+
+    @property
+    def giorni_totali(self):
+        return self.cumulati[-1] if self.cumulati else 0
+
+    def giorni_trascorsi(self, oggi):
+        """Giorni di scuola dall'inizio dell'anno fino a oggi incluso"""
+        indice = (oggi - self.inizio).days
+        if indice < 0:
+            return 0
+        if indice >= len(self.cumulati):
+            return self.giorni_totali
+        return self.cumulati[indice]
+
+    def giorni_rimanenti(self, oggi):
+        return self.giorni_totali - self.giorni_trascorsi(oggi)
+
+    def limite_assenze(self, percentuale=0.25):
+        return int(self.giorni_totali * percentuale)
+
+    def to_dict(self):
+        return {'anno_inizio': self.anno_inizio, 'cumulati': self.cumulati}
+
+
+_memoria = {}
+
+
+def calendario_per(oggi, config=None, cache=None):
+    """
+    Calendario dell'anno scolastico di oggi, memoizzato in memoria e,
+    se disponibile, nella cache su disco (DataCache).
+    """
+    config = config or CalendarConfig()
+    anno = anno_scolastico(oggi)
+    chiave = f'calendario:{anno}:{config.key()}'
+
+    calendario = _memoria.get(chiave)
+    if calendario is not None:
+        return calendario
+
+    if cache is not None:
+        try:
+            dati = cache.get_meta('', chiave)
+            if dati:
+                calendario = SchoolCalendar(anno, config, dati['cumulati'])
+        except Exception as e:
+            print(f'Errore lettura calendario: {e}')
+
+    if calendario is None:
+        calendario = SchoolCalendar(anno, config)
+        if cache is not None:
+            try:
+                cache.put_meta('', chiave, calendario.to_dict())
+            except Exception as e:
+                print(f'Errore salvataggio calendario: {e}')
+
+    _memoria[chiave] = calendario
+    return calendario
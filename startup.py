@@ -0,0 +1,64 @@
+"""Misura delle fasi di avvio dell'app
+
+Ogni fase (import, build, primo frame, rete, login, dati visibili) viene
+registrata in metrics come 'startup' con i secondi trascorsi dall'import di
+questo modulo, che main.py esegue per primo.
+
+CLASSEVIVA_PROFILE_STARTUP=1 stampa su stderr la tabella delle fasi quando i
+dati diventano visibili; con un percorso che termina in .prof salva anche il
+profilo cProfile dell'avvio (apribile con pstats o snakeviz).
+"""
+
+import os
+import sys
+import time
+
+
+class StartupProfiler:
+    """Istanti delle fasi di avvio ed eventuale profilo cProfile"""
+
+    def __init__(self, opzione=None):
+        self.inizio = time.perf_counter()
+        self.opzione = opzione
+        self.fasi = []
+        self.concluso = False
+        self._profilo = None
+        if opzione and opzione.endswith('.prof'):
+            import cProfile
+            self._profilo = cProfile.Profile()
+            self._profilo.enable()
+
+    def fase(self, nome):
+        """Segna la fine di una fase; ritorna i secondi dall'avvio"""
+        trascorso = time.perf_counter() - self.inizio
+        if not self.concluso:
+            self.fasi.append((nome, trascorso))
+            # Import differito: metrics non deve pesare sulla prima misura
+            import metrics
+            metrics.observe('startup', trascorso, fase=nome)
+        return trascorso
+
+    def report(self):
+        righe = [f"{'fase':<20}{'ms':>10}{'delta ms':>10}"]
+        precedente = 0.0
+        for nome, trascorso in self.fasi:
+            righe.append(f'{nome:<20}{trascorso * 1000:>10.1f}{(trascorso - precedente) * 1000:>10.1f}')
+            precedente = trascorso
+        return '\n'.join(righe)
+
+    def concludi(self):
+        """Chiude la misura (una sola volta): stampa la tabella e salva il profilo"""
+        if self.concluso:
+            return
+        self.concluso = True
+        if self._profilo is not None:
+            self._profilo.disable()
+            try:
+                self._profilo.dump_stats(self.opzione)
+            except Exception as e:
+                print(f'Errore salvataggio profilo di avvio: {e}')
+        if self.opzione:
+            print(self.report(), file=sys.stderr)
+
+
+profiler = StartupProfiler(os.environ.get('CLASSEVIVA_PROFILE_STARTUP'))
@@ -0,0 +1,301 @@
+"""Motore statistico per medie, quadrimestri e distribuzione dei voti
+
+Usa NumPy se installato (raggruppamenti vettoriali, adatto anche a export
+di classe con centinaia di migliaia di voti), altrimenti ricade su Python puro
+con gli stessi risultati.
+"""
+
+from datetime import date
+
+# NumPy viene importato al primo calcolo, non all'avvio dell'app
+np = None
+_numpy_cercato = False
+
+
+def carica_numpy():
+    """Importa NumPy al primo uso; None se non è installato"""
+    global np, _numpy_cercato
+    if not _numpy_cercato:
+        _numpy_cercato = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+# Quadrimestri codificati come interi: 0 = fuori periodo
+QUADRIMESTRI = (0, 1, 2)
+
+_EPOCA_ORDINALE = date(1970, 1, 1).toordinal()
+
+
+def _data_da_valore(d):
+    """Data da date, stringa YYYY-MM-DD o ordinale; None se non valida"""
+    if isinstance(d, str):
+        try:
+            return date.fromisoformat(d)
+        except ValueError:
+            return None
+    if isinstance(d, int):
+        return date.fromordinal(d) if d > 0 else None
+    return d
+
+
+def _quadrimestre_da_mese(mese):
+    if mese >= 9 or mese == 1:
+        return 1
+    if 2 <= mese <= 6:
+        return 2
+    return 0
+
+
+class GradeArrays:
+    """Voti in forma colonnare: valore, codice materia, quadrimestre, data ordinale"""
+
+    def __init__(self, valori, materie_idx, quadrimestri, date_ordinali, materie):
+        self.valori = valori
+        self.materie_idx = materie_idx
+        self.quadrimestri = quadrimestri
+        self.date_ordinali = date_ordinali
+        # Nome della materia per ogni codice
+        self.materie = materie
+
+    def __len__(self):
+        return len(self.valori)
+
+    @classmethod
+    def from_records(cls, records):
+        """Costruisce gli array dai grades.Voto che fanno media"""
+        valori, materie_nomi, quadrimestri, date_ordinali = [], [], [], []
+        for voto in records:
+            if not voto.in_media:
+                continue
+            valori.append(voto.valore)
+            materie_nomi.append(voto.materia)
+            quadrimestri.append(voto.quadrimestre or 0)
+            date_ordinali.append(voto.data.toordinal() if voto.data else 0)
+        return cls._build(valori, materie_nomi, quadrimestri, date_ordinali)
+
+    @classmethod
+    def from_columns(cls, valori, materie, date_voti):
+        """
+        Costruisce gli array da colonne già estratte (es. export di classe).
+
+        date_voti può contenere date, stringhe YYYY-MM-DD o ordinali.
+        Valori non positivi vengono scartati come nel calcolo delle medie.
+        """
+        if carica_numpy() is not None:
+            return cls._from_columns_numpy(valori, materie, date_voti)
+
+        righe = []
+        for valore, materia, d in zip(valori, materie, date_voti):
+            valore = float(valore)
+            if valore <= 0:
+                continue
+            d = _data_da_valore(d)
+            righe.append((valore, materia, _quadrimestre_da_mese(d.month) if d else 0, d.toordinal() if d else 0))
+        if not righe:
+            return cls._build([], [], [], [])
+        return cls._build(*(list(colonna) for colonna in zip(*righe)))
+
+    @classmethod
+    def _from_columns_numpy(cls, valori, materie, date_voti):
+        valori = np.asarray(valori, dtype=np.float64)
+        materie = np.asarray(materie)
+        date_voti = np.asarray(date_voti)
+
+        if np.issubdtype(date_voti.dtype, np.integer):
+            giorni = np.where(
+                date_voti > 0,
+                date_voti - _EPOCA_ORDINALE,
+                np.iinfo(np.int64).min
+            ).astype('datetime64[D]')
+        elif np.issubdtype(date_voti.dtype, np.datetime64):
+            giorni = date_voti.astype('datetime64[D]')
+        else:
+            giorni = _giorni_numpy(date_voti)
+
+        tieni = valori > 0
+        valori, materie, giorni = valori[tieni], materie[tieni], giorni[tieni]
+
+        valide = ~np.isnat(giorni)
+        mesi = giorni.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        quadrimestri = np.where((mesi >= 9) | (mesi == 1), 1, np.where((mesi >= 2) & (mesi <= 6), 2, 0))
+        quadrimestri = np.where(valide, quadrimestri, 0).astype(np.int8)
+        ordinali = np.where(valide, giorni.astype(np.int64) + _EPOCA_ORDINALE, 0).astype(np.int32)
+
+        nomi, materie_idx = np.unique(materie, return_inverse=True)
+        return cls(valori, materie_idx.astype(np.int32).ravel(), quadrimestri, ordinali,
+                   [str(nome) for nome in nomi])
+
+    @classmethod
+    def _build(cls, valori, materie_nomi, quadrimestri, date_ordinali):
+        codici = {}
+        materie_idx = [codici.setdefault(nome, len(codici)) for nome in materie_nomi]
+        materie = list(codici)
+        if carica_numpy() is not None:
+            return cls(
+                np.asarray(valori, dtype=np.float64),
+                np.asarray(materie_idx, dtype=np.int32),
+                np.asarray(quadrimestri, dtype=np.int8),
+                np.asarray(date_ordinali, dtype=np.int32),
+                materie
+            )
+        return cls(valori, materie_idx, quadrimestri, date_ordinali, materie)
+
+
+def _giorni_numpy(date_voti):
+    """Converte le date con lo stesso parser del percorso Python; NaT se non valide
+
+    Le date distinte sono poche anche su milioni di voti: si convertono solo
+    quelle e si riespandono con l'indice inverso.
+    """
+    try:
+        uniche, inverso = np.unique(date_voti, return_inverse=True)
+    except TypeError:
+        # Valori misti non ordinabili (es. None tra le stringhe)
+        uniche, inverso = date_voti, np.arange(len(date_voti))
+    giorni = np.array(
+        [np.datetime64(d, 'D') if d else np.datetime64('NaT') for d in map(_data_da_valore, uniche.tolist())],
+        dtype='datetime64[D]'
+    )
+    return giorni[inverso.ravel()]
+
+
+class Gruppo:
+    """Conteggio, media, minimo e massimo di un gruppo di voti"""
+
+    __slots__ = ('count', 'mean', 'min', 'max')
+
+    def __init__(self, count, mean, minimo, massimo):
+        self.count = count
+        self.mean = mean
+        self.min = minimo
+        self.max = massimo
+
+    def __repr__(self):
+        return f'Gruppo(count={self.count}, mean={self.mean:.3f}, min={self.min}, max={self.max})'
+
+
+class GradeStats:
+    """Risultati aggregati: per materia, per materia e quadrimestre, per quadrimestre"""
+
+    def __init__(self, per_materia, per_materia_quadrimestre, per_quadrimestre, istogramma, totale):
+        # {materia: Gruppo}
+        self.per_materia = per_materia
+        # {(materia, quadrimestre): Gruppo}
+        self.per_materia_quadrimestre = per_materia_quadrimestre
+        # {quadrimestre: Gruppo} su tutti i voti del quadrimestre
+        self.per_quadrimestre = per_quadrimestre
+        # {voto arrotondato: conteggio}
+        self.istogramma = istogramma
+        self.totale = totale
+
+    def media_materia(self, materia, quadrimestre=None):
+        if quadrimestre is None:
+            gruppo = self.per_materia.get(materia)
+        else:
+            gruppo = self.per_materia_quadrimestre.get((materia, quadrimestre))
+        return gruppo.mean if gruppo else None
+
+    def media_generale(self, quadrimestre=None):
+        """Media delle medie per materia (come nella scheda Media)"""
+        medie = [self.media_materia(materia, quadrimestre) for materia in sorted(self.per_materia)]
+        medie = [m for m in medie if m is not None]
+        return sum(medie) / len(medie) if medie else None
+
+
+def _compute_numpy(arrays):
+    n_materie = len(arrays.materie)
+    valori, idx, quad = arrays.valori, arrays.materie_idx, arrays.quadrimestri
+
+    def gruppi(chiavi, n):
+        counts = np.bincount(chiavi, minlength=n)
+        somme = np.bincount(chiavi, weights=valori, minlength=n)
+        minimi = np.full(n, np.inf)
+        massimi = np.full(n, -np.inf)
+        if len(chiavi):
+            # Ordina per gruppo e riduce ogni segmento contiguo
+            ordine = np.argsort(chiavi, kind='stable')
+            ordinate = chiavi[ordine]
+            inizi = np.flatnonzero(np.r_[True, ordinate[1:] != ordinate[:-1]])
+            presenti = ordinate[inizi]
+            minimi[presenti] = np.minimum.reduceat(valori[ordine], inizi)
+            massimi[presenti] = np.maximum.reduceat(valori[ordine], inizi)
+        return counts, somme, minimi, massimi
+
+    def to_dict(counts, somme, minimi, massimi, chiave):
+        risultato = {}
+        for i in np.flatnonzero(counts):
+            c = int(counts[i])
+            risultato[chiave(int(i))] = Gruppo(c, float(somme[i]) / c, float(minimi[i]), float(massimi[i]))
+        return risultato
+
+    per_materia = to_dict(*gruppi(idx, n_materie), lambda i: arrays.materie[i])
+
+    n_q = len(QUADRIMESTRI)
+    chiavi_mq = idx.astype(np.int64) * n_q + quad
+    per_mq = to_dict(*gruppi(chiavi_mq, n_materie * n_q),
+                     lambda i: (arrays.materie[i // n_q], i % n_q))
+    per_mq = {k: v for k, v in per_mq.items() if k[1] != 0}
+
+    per_q = to_dict(*gruppi(quad.astype(np.int64), n_q), lambda i: i)
+    per_q.pop(0, None)
+
+    # np.rint arrotonda come round() di Python (metà al pari)
+    arrotondati = np.rint(valori).astype(np.int64)
+    if len(arrotondati):
+        conteggi = np.bincount(arrotondati - arrotondati.min())
+        base = int(arrotondati.min())
+        istogramma = {base + int(i): int(conteggi[i]) for i in np.flatnonzero(conteggi)}
+    else:
+        istogramma = {}
+
+    totale = None
+    if len(valori):
+        totale = Gruppo(len(valori), float(valori.mean()), float(valori.min()), float(valori.max()))
+    return GradeStats(per_materia, per_mq, per_q, istogramma, totale)
+
+
+def _compute_python(arrays):
+    def aggiungi(gruppi, chiave, valore):
+        g = gruppi.get(chiave)
+        if g is None:
+            gruppi[chiave] = [1, valore, valore, valore]
+        else:
+            g[0] += 1
+            g[1] += valore
+            g[2] = min(g[2], valore)
+            g[3] = max(g[3], valore)
+
+    per_materia, per_mq, per_q, istogramma = {}, {}, {}, {}
+    for valore, i, q in zip(arrays.valori, arrays.materie_idx, arrays.quadrimestri):
+        materia = arrays.materie[i]
+        aggiungi(per_materia, materia, valore)
+        if q:
+            aggiungi(per_mq, (materia, q), valore)
+            aggiungi(per_q, q, valore)
+        arrotondato = round(valore)
+        istogramma[arrotondato] = istogramma.get(arrotondato, 0) + 1
+
+    def finalizza(gruppi):
+        return {k: Gruppo(c, s / c, mn, mx) for k, (c, s, mn, mx) in gruppi.items()}
+
+    totale = None
+    if arrays.valori:
+        totale = Gruppo(len(arrays.valori), sum(arrays.valori) / len(arrays.valori),
+                        min(arrays.valori), max(arrays.valori))
+    return GradeStats(finalizza(per_materia), finalizza(per_mq), finalizza(per_q), istogramma, totale)
+
+
+def compute_stats(arrays):
+    """Calcola tutte le statistiche raggruppate su un GradeArrays"""
+    if carica_numpy() is not None and not isinstance(arrays.valori, list):
+        return _compute_numpy(arrays)
+    return _compute_python(arrays)
+
+
+def stats_from_records(records):
+    return compute_stats(GradeArrays.from_records(records))
@@ -0,0 +1,278 @@
+"""Decodifica incrementale delle risposte JSON durante il download
+
+JsonArrayStream riceve il corpo a pezzi e restituisce gli elementi di un array
+(es. "grades") appena sono completi, mentre il resto del documento viene
+ricostruito normalmente. installa() applica la decodifica alle risposte di una
+rotta di classeviva.Utente: i lotti di elementi arrivano a un callback mentre
+il download è ancora in corso e il client riceve da json() il documento già
+decodificato, senza una seconda decodifica.
+
+Ogni download è un tentativo numerato: quando ne parte uno nuovo (es. un
+ritentativo dopo un timeout) i lotti di quelli precedenti vengono scartati, e
+on_annulla avvisa di eliminare i lotti già consegnati da un tentativo
+abbandonato o non decodificabile.
+"""
+
+import codecs
+import itertools
+import json
+import logging
+import re
+import threading
+from urllib.parse import urlsplit
+
+
+log = logging.getLogger(__name__)
+
+
+_SPAZI = re.compile(r'[ \t\n\r]*')
+# Oltre questa soglia il testo già consumato viene scartato dal buffer
+_COMPATTA = 1 << 16
+
+
+class JsonArrayStream:
+    """Parser a stati per un oggetto JSON in cui un campo è un array da consegnare a pezzi"""
+
+    def __init__(self, chiave):
+        self.chiave = chiave
+        self.documento = {}
+        self.elementi = []
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._stato = 'inizio'
+        self._campo = None
+
+    def _valore(self, finale):
+        """Decodifica un valore completo a partire da _pos; None se servono altri dati"""
+        try:
+            valore, fine = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if finale:
+                raise
+            return None
+        # Un valore a fine buffer (o un numero troncato, es. "1.") potrebbe
+        # continuare nel pezzo successivo
+        if not finale and (fine >= len(self._buffer) or self._buffer[fine] in '.eE+-0123456789'):
+            return None
+        self._pos = fine
+        return (valore,)
+
+    def _avanza(self, finale=False):
+        nuovi = []
+        buffer = self._buffer
+        while True:
+            self._pos = _SPAZI.match(buffer, self._pos).end()
+            if self._pos >= len(buffer):
+                break
+            carattere = buffer[self._pos]
+            stato = self._stato
+
+            if stato == 'inizio':
+                if carattere != '{':
+                    raise ValueError(f'Atteso un oggetto JSON, trovato {carattere!r}')
+                self._pos += 1
+                self._stato = 'campo_o_fine'
+            elif stato in ('campo_o_fine', 'campo'):
+                if carattere == '}' and stato == 'campo_o_fine':
+                    self._pos += 1
+                    self._stato = 'fine'
+                    continue
+                if carattere != '"':
+                    raise ValueError(f'Atteso il nome di un campo, trovato {carattere!r}')
+                letto = self._valore(finale)
+                if letto is None:
+                    break
+                self._campo = letto[0]
+                self._stato = 'due_punti'
+            elif stato == 'due_punti':
+                if carattere != ':':
+                    raise ValueError(f'Atteso ":", trovato {carattere!r}')
+                self._pos += 1
+                self._stato = 'valore'
+            elif stato == 'valore':
+                if self._campo == self.chiave and carattere == '[':
+                    self._pos += 1
+                    self.documento[self._campo] = self.elementi
+                    self._stato = 'elemento_o_fine'
+                    continue
+                letto = self._valore(finale)
+                if letto is None:
+                    break
+                self.documento[self._campo] = letto[0]
+                self._stato = 'separatore'
+            elif stato == 'separatore':
+                if carattere == ',':
+                    self._stato = 'campo'
+                elif carattere == '}':
+                    self._stato = 'fine'
+                else:
+                    raise ValueError(f'Atteso "," o "}}", trovato {carattere!r}')
+                self._pos += 1
+            elif stato in ('elemento_o_fine', 'elemento'):
+                if carattere == ']' and stato == 'elemento_o_fine':
+                    self._pos += 1
+                    self._stato = 'separatore'
+                    continue
+                letto = self._valore(finale)
+                if letto is None:
+                    break
+                self.elementi.append(letto[0])
+                nuovi.append(letto[0])
+                self._stato = 'separatore_array'
+            elif stato == 'separatore_array':
+                if carattere == ',':
+                    self._stato = 'elemento'
+                elif carattere == ']':
+                    self._stato = 'separatore'
+                else:
+                    raise ValueError(f'Atteso "," o "]", trovato {carattere!r}')
+                self._pos += 1
+            else:
+                raise ValueError(f'Dati dopo la fine del documento JSON: {carattere!r}')
+
+        if self._pos > _COMPATTA:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return nuovi
+
+    def feed(self, dati):
+        """Aggiunge un pezzo del corpo (bytes o str); ritorna gli elementi completati"""
+        if isinstance(dati, bytes):
+            dati = self._utf8.decode(dati)
+        self._buffer += dati
+        return self._avanza()
+
+    def close(self):
+        """Chiude il flusso e ritorna il documento completo; ValueError se troncato"""
+        self._buffer += self._utf8.decode(b'', final=True)
+        self._avanza(finale=True)
+        if self._stato != 'fine':
+            raise ValueError('Documento JSON incompleto')
+        return self.documento
+
+
+def decodifica_risposta(risposta, chiave, on_lotto, dimensione_lotto=200, chunk_size=1 << 14):
+    """Legge in streaming una risposta requests e passa a on_lotto gli elementi a gruppi"""
+    parser = JsonArrayStream(chiave)
+    pezzi = []
+    lotto = []
+    errore = None
+    for pezzo in risposta.iter_content(chunk_size=chunk_size):
+        pezzi.append(pezzo)
+        if errore is not None:
+            continue
+        try:
+            lotto.extend(parser.feed(pezzo))
+        except ValueError as e:
+            errore = e
+            continue
+        if len(lotto) >= dimensione_lotto:
+            _consegna(on_lotto, lotto)
+            lotto = []
+
+    # Il corpo resta disponibile a chi legge .content (es. metrics.instrument)
+    risposta._content = b''.join(pezzi)
+    if errore is None:
+        try:
+            documento = parser.close()
+        except ValueError as e:
+            errore = e
+    if errore is not None:
+        # json() della risposta solleverà l'errore di decodifica come al solito
+        log.warning('Errore decodifica in streaming, uso il corpo completo: %s', errore)
+        return None
+
+    if lotto:
+        _consegna(on_lotto, lotto)
+    risposta.json = lambda *args, **kwargs: documento
+    return documento
+
+
+def _consegna(on_lotto, lotto):
+    try:
+        on_lotto(lotto)
+    except Exception:
+        log.exception('Errore consegna lotto in streaming')
+
+
+class Tentativi:
+    """Numera i download di una rotta; solo l'ultimo può consegnare lotti"""
+
+    def __init__(self, on_lotto, on_annulla=None):
+        self.on_lotto = on_lotto
+        self.on_annulla = on_annulla
+        self._lock = threading.Lock()
+        self._contatore = itertools.count(1)
+        self.ultimo = 0
+        # Lotti consegnati dall'ultimo tentativo, finché non termina
+        self._consegnati = {}
+
+    def inizia(self):
+        """Nuovo tentativo; quello precedente, se ancora in corso, è abbandonato"""
+        with self._lock:
+            tentativo = self.ultimo = next(self._contatore)
+            abbandonati = [t for t, lotti in self._consegnati.items() if lotti]
+            self._consegnati = {tentativo: 0}
+        for vecchio in abbandonati:
+            self._annulla(vecchio)
+        return tentativo
+
+    def consegna(self, tentativo, lotto):
+        with self._lock:
+            if tentativo != self.ultimo:
+                return
+            self._consegnati[tentativo] += 1
+        self.on_lotto(lotto, tentativo)
+
+    def termina(self, tentativo, completo):
+        """Fine del download: se non è andato a buon fine i suoi lotti vanno scartati"""
+        with self._lock:
+            lotti = self._consegnati.pop(tentativo, 0)
+        if not completo and lotti:
+            self._annulla(tentativo)
+
+    def _annulla(self, tentativo):
+        if self.on_annulla is None:
+            return
+        try:
+            self.on_annulla(tentativo)
+        except Exception:
+            log.exception('Errore annullamento lotti in streaming')
+
+
+def installa(utente, rotta, chiave, on_lotto, dimensione_lotto=200, on_annulla=None):
+    """Decodifica in streaming le risposte 200 delle richieste il cui percorso corrisponde a rotta
+
+    rotta è un'espressione regolare sul percorso (es. r'/grades$'). Va installata
+    prima di metrics.instrument, che legge il corpo completo della risposta.
+    on_lotto(lotto, tentativo) riceve gli elementi; on_annulla(tentativo) chiede
+    di scartare quelli già ricevuti da un tentativo. Ritorna i Tentativi, o None.
+    """
+    sessione = getattr(utente, '_sessione', None)
+    if sessione is None:
+        return None
+    originale = sessione.request
+    modello = re.compile(rotta)
+    tentativi = Tentativi(on_lotto, on_annulla)
+
+    def request(method, url, *args, **kwargs):
+        if not modello.search(urlsplit(url).path):
+            return originale(method, url, *args, **kwargs)
+        kwargs['stream'] = True
+        tentativo = tentativi.inizia()
+        completo = False
+        try:
+            risposta = originale(method, url, *args, **kwargs)
+            if getattr(risposta, 'status_code', None) == 200 and hasattr(risposta, 'iter_content'):
+                documento = decodifica_risposta(
+                    risposta, chiave, lambda lotto: tentativi.consegna(tentativo, lotto), dimensione_lotto
+                )
+                completo = documento is not None
+            return risposta
+        finally:
+            tentativi.termina(tentativo, completo)
+
+    sessione.request = request
+    return tentativi
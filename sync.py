@@ -0,0 +1,204 @@
+"""Sincronizzazione incrementale di voti e assenze con la cache locale"""
+
+import hashlib
+import json
+import time
+
+from aggregates import AggregateStore
+from grades import normalizza_voti
+
+
+# Ogni quanto forzare comunque uno scaricamento completo delle assenze,
+# per intercettare modifiche a eventi vecchi (es. giustificazioni)
+INTERVALLO_SYNC_COMPLETA = 6 * 3600
+
+
+def hash_record(record):
+    """Hash stabile di un singolo evento"""
+    testo = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(testo.encode('utf-8')).hexdigest()
+
+
+def hash_payload(records):
+    """Hash stabile dell'intera lista di eventi (l'impronta usata anche dalla UI)
+
+    Una sola serializzazione della lista: con l'encoder C costa meno di un
+    dumps per evento, che serve solo a _diff quando l'hash cambia.
+    """
+    testo = json.dumps(records, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(testo.encode('ascii')).hexdigest()
+
+
+def _chiave(record):
+    """Identificativo di un evento: evtId, altrimenti il suo contenuto"""
+    evt_id = record.get('evtId')
+    return evt_id if evt_id is not None else hash_record(record)
+
+
+def _cursore(records):
+    """Data e id più recenti presenti nella lista"""
+    date = [r.get('evtDate') for r in records if r.get('evtDate')]
+    ids = [r.get('evtId') for r in records if isinstance(r.get('evtId'), int)]
+    return {
+        'evtDate': max(date) if date else None,
+        'evtId': max(ids) if ids else None,
+    }
+
+
+class SyncResult:
+    """Esito di una sincronizzazione: lista completa e differenze"""
+
+    __slots__ = ('risorsa', 'records', 'aggiunti', 'rimossi', 'completa', 'impronta', 'aggregati')
+
+    def __init__(self, risorsa, records, aggiunti, rimossi, completa, impronta=None, aggregati=None):
+        self.risorsa = risorsa
+        self.records = records
+        self.aggiunti = aggiunti
+        self.rimossi = rimossi
+        self.completa = completa
+        # hash_payload di records: la UI lo confronta con quello già mostrato
+        self.impronta = impronta
+        # AggregateStore aggiornato (solo per i voti)
+        self.aggregati = aggregati
+
+    @property
+    def modificato(self):
+        return bool(self.aggiunti or self.rimossi)
+
+
+class SyncEngine:
+    """Scarica solo le novità di voti e assenze e le unisce alla cache"""
+
+    def __init__(self, cache, utente_id, annullato=None):
+        self.cache = cache
+        self.utente_id = utente_id
+        # threading.Event della sessione: impostato al logout, blocca le scritture in cache
+        self.annullato = annullato
+        # Usata solo se la cache su disco non è disponibile
+        self._memoria = {}
+
+    def _load(self, risorsa):
+        if self.cache is not None:
+            return self.cache.load(self.utente_id, risorsa)
+        return self._memoria.get(risorsa)
+
+    def _store(self, risorsa, records):
+        if self.cache is not None:
+            self.cache.put(self.utente_id, risorsa, records, annullato=self.annullato)
+        else:
+            self._memoria[risorsa] = records
+
+    def _touch(self, risorsa):
+        if self.cache is not None:
+            self.cache.touch(self.utente_id, risorsa, annullato=self.annullato)
+
+    def _get_meta(self, chiave):
+        if self.cache is not None:
+            return self.cache.get_meta(self.utente_id, chiave)
+        return self._memoria.get(chiave)
+
+    def _put_meta(self, chiave, valore):
+        if self.cache is not None:
+            self.cache.put_meta(self.utente_id, chiave, valore, annullato=self.annullato)
+        else:
+            self._memoria[chiave] = valore
+
+    def _get_stato(self, risorsa):
+        return self._get_meta(f'sync:{risorsa}') or {}
+
+    def _put_stato(self, risorsa, stato):
+        self._put_meta(f'sync:{risorsa}', stato)
+
+    def impronta(self, risorsa):
+        """hash_payload dei record in cache, salvato con lo stato della sincronizzazione"""
+        return self._get_stato(risorsa).get('hash')
+
+    def _load_aggregati(self):
+        dati = self._get_meta('aggregati:voti')
+        return AggregateStore.from_dict(dati) if dati else None
+
+    def aggregati(self):
+        """Aggregati dei voti salvati, ricostruiti dai voti in cache se mancanti"""
+        store = self._load_aggregati()
+        if store is None:
+            voti = self._load('voti')
+            if voti is None:
+                return None
+            store = AggregateStore.from_records(normalizza_voti(voti))
+            self._put_meta('aggregati:voti', store.to_dict())
+        return store
+
+    def _diff(self, vecchi, nuovi):
+        """Confronta due liste evento per evento tramite hash del contenuto"""
+        vecchi_hash = {_chiave(r): (hash_record(r), r) for r in vecchi}
+        nuovi_hash = {_chiave(r): (hash_record(r), r) for r in nuovi}
+
+        aggiunti = [r for k, (h, r) in nuovi_hash.items()
+                    if k not in vecchi_hash or vecchi_hash[k][0] != h]
+        rimossi = [r for k, (h, r) in vecchi_hash.items()
+                   if k not in nuovi_hash or nuovi_hash[k][0] != h]
+        return aggiunti, rimossi
+
+    def _salva(self, risorsa, vecchi, records, hash_nuovo, completa, stato):
+        if hash_nuovo == stato.get('hash') and vecchi is not None:
+            aggiunti, rimossi = [], []
+            records = vecchi
+            # Dati invariati ma appena verificati: la cache torna fresca per il suo TTL
+            self._touch(risorsa)
+        else:
+            aggiunti, rimossi = self._diff(vecchi or [], records)
+            self._store(risorsa, records)
+
+        stato = dict(stato, hash=hash_nuovo, **_cursore(records))
+        if completa:
+            stato['ultima_completa'] = time.time()
+        self._put_stato(risorsa, stato)
+        return SyncResult(risorsa, records, aggiunti, rimossi, completa, hash_nuovo)
+
+    async def sync_voti(self, utente):
+        """Le API dei voti non accettano intervalli: scarica tutto e confronta gli hash"""
+        vecchi = self._load('voti')
+        stato = self._get_stato('voti')
+
+        aggregati = self._load_aggregati() if vecchi is not None else None
+
+        records = await utente.voti()
+        if records is None:
+            records = []
+        risultato = self._salva('voti', vecchi, records, hash_payload(records), True, stato)
+
+        # Gli aggregati seguono le differenze: due voti nuovi, due aggiornamenti
+        if aggregati is None:
+            aggregati = AggregateStore.from_records(normalizza_voti(risultato.records))
+            self._put_meta('aggregati:voti', aggregati.to_dict())
+        elif risultato.modificato:
+            aggregati.apply(risultato.aggiunti, risultato.rimossi)
+            self._put_meta('aggregati:voti', aggregati.to_dict())
+        risultato.aggregati = aggregati
+        return risultato
+
+    async def sync_assenze(self, utente):
+        """Scarica solo le assenze dalla data più recente già vista"""
+        vecchi = self._load('assenze')
+        stato = self._get_stato('assenze')
+
+        inizio = stato.get('evtDate')
+        scaduta = time.time() - stato.get('ultima_completa', 0) > INTERVALLO_SYNC_COMPLETA
+        assenze_da = getattr(utente, 'assenze_da', None)
+
+        if vecchi is not None and inizio and not scaduta and assenze_da is not None:
+            try:
+                finestra = await assenze_da(inizio)
+            except Exception as e:
+                # es. data fuori dall'anno scolastico: si riparte da zero
+                print(f'Sync incrementale assenze fallita, scarico tutto: {e}')
+            else:
+                finestra = finestra or []
+                # Gli eventi della finestra sostituiscono quelli dalla stessa data in poi
+                records = [r for r in vecchi if (r.get('evtDate') or '') < inizio] + finestra
+                return self._salva('assenze', vecchi, records, hash_payload(records), False, stato)
+
+        records = await utente.assenze()
+        if records is None:
+            records = []
+        return self._salva('assenze', vecchi, records, hash_payload(records), True, stato)
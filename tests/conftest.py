@@ -0,0 +1,6 @@
+import os
+import sys
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+sys.path.insert(0, os.path.join(RADICE, 'benchmarks'))
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from auth import SessionManager, _invalida, ripristina_sessione, salva_sessione
+from cache import DataCache
+
+
+class _UtenteFinto:
+    """Come classeviva.Utente: connesso sottrae inizio se l'attributo esiste"""
+
+    def __init__(self):
+        self._dati = {}
+        self.accessi = 0
+
+    @property
+    def connesso(self):
+        if not hasattr(self, 'inizio'):
+            return False
+        return datetime.now(timezone.utc) - self.inizio < timedelta(minutes=90)
+
+    async def accedi(self):
+        self.accessi += 1
+        self.inizio = datetime.now(timezone.utc)
+        self.fine = self.inizio + timedelta(minutes=90)
+        self._dati = {'token': f'token-{self.accessi}'}
+
+
+def test_invalida_non_lascia_date_a_none():
+    utente = _UtenteFinto()
+    asyncio.run(utente.accedi())
+    _invalida(utente)
+    assert not hasattr(utente, 'inizio') and not hasattr(utente, 'fine')
+    assert utente.connesso is False
+
+
+def test_ripristino_senza_date_non_rompe_connesso():
+    utente = _UtenteFinto()
+    asyncio.run(utente.accedi())
+    stato = salva_sessione(utente)
+    stato['inizio'] = None
+
+    altro = _UtenteFinto()
+    assert ripristina_sessione(altro, stato)
+    assert not hasattr(altro, 'inizio')
+    assert altro.connesso is False
+
+
+class _UtenteNuovo(_UtenteFinto):
+    """Come classeviva.Utente dalla 1.2: __init__ mette le date a None"""
+
+    def __init__(self):
+        super().__init__()
+        self.inizio = None
+        self.fine = None
+
+    @property
+    def connesso(self):
+        if self.inizio is None:
+            return False
+        return datetime.now(timezone.utc) - self.inizio < timedelta(minutes=90)
+
+
+def test_invalida_con_date_definite_in_init():
+    utente = _UtenteNuovo()
+    asyncio.run(utente.accedi())
+    stato = salva_sessione(utente)
+    stato['inizio'] = None
+    _invalida(utente)
+    assert utente.inizio is None and utente.fine is None
+    assert utente.connesso is False
+
+    altro = _UtenteNuovo()
+    assert ripristina_sessione(altro, stato)
+    assert altro.inizio is None and altro.connesso is False
+
+
+def test_session_manager_riautentica_dopo_invalida(tmp_path):
+    cache = DataCache(str(tmp_path / 'cache.db'))
+    utente = _UtenteFinto()
+    session = SessionManager(utente, cache, 'S1234567X')
+    asyncio.run(session.ensure())
+    asyncio.run(session.reauth(session._generazione))
+    assert utente.accessi == 2 and utente.connesso
+    cache.close()
+
+
+def test_session_manager_con_classeviva_e_mock_server(tmp_path):
+    classeviva = pytest.importorskip('classeviva')
+    from endpoint import reindirizza
+    from mock_server import MockSpaggiari
+
+    server = MockSpaggiari()
+    server.start()
+    cache = DataCache(str(tmp_path / 'cache.db'))
+    try:
+        utente = classeviva.Utente('S1234567X', 'password')
+        reindirizza(utente, server.url)
+        asyncio.run(SessionManager(utente, cache, 'S1234567X').ensure())
+        assert utente.connesso
+
+        # Un nuovo client riusa la sessione salvata senza rifare il login
+        secondo = classeviva.Utente('S1234567X', 'password')
+        reindirizza(secondo, server.url)
+        session = SessionManager(secondo, cache, 'S1234567X')
+        asyncio.run(session.ensure())
+        assert server.stato.contatori.get('auth/login 200') == 1
+        assert asyncio.run(secondo.carta())
+
+        # Dopo l'invalidazione il login va rifatto senza errori
+        asyncio.run(session.reauth(session._generazione))
+        assert secondo.connesso
+        assert server.stato.contatori.get('auth/login 200') == 2
+    finally:
+        cache.close()
+        server.stop()
@@ -0,0 +1,78 @@
+import re
+import threading
+import time
+
+from metrics import MetricsRegistry
+from ratelimit import RateLimiter
+
+
+def _famiglia(campione, tipi):
+    nome = re.match(r'[a-zA-Z_:][a-zA-Z0-9_:]*', campione).group(0)
+    if nome in tipi:
+        return nome
+    for suffisso in ('_bucket', '_sum', '_count'):
+        base = nome[:-len(suffisso)]
+        if nome.endswith(suffisso) and tipi.get(base) in ('histogram', 'summary'):
+            return base
+    return nome
+
+
+def test_prometheus_famiglie_in_blocchi_contigui():
+    registro = MetricsRegistry()
+    for vista in ('voti', 'media', 'assenze'):
+        registro.observe('widget', 10, vista=vista)
+        registro.observe('record', 5, vista=vista)
+        registro.record_duration('display', 0.02, vista=vista)
+
+    tipi = {}
+    corrente = None
+    for riga in registro.to_prometheus().splitlines():
+        if riga.startswith('# TYPE '):
+            _, _, nome, tipo = riga.split()
+            assert nome not in tipi, f'{nome} dichiarata due volte'
+            tipi[nome] = tipo
+            corrente = nome
+        else:
+            assert _famiglia(riga, tipi) == corrente, riga
+
+    assert tipi['classeviva_widget'] == 'summary'
+    assert tipi['classeviva_widget_max'] == 'gauge'
+
+
+class _Sessione:
+    def request(self, method, url, *args, **kwargs):
+        return type('Risposta', (), {'status_code': 200, 'headers': {}})()
+
+
+class _Utente:
+    def __init__(self):
+        self._sessione = _Sessione()
+
+
+def test_rate_limiter_pubblica_coda_e_attese():
+    registro = MetricsRegistry()
+    limiter = RateLimiter(rate=20, capacity=1, max_rate=20)
+    utente = _Utente()
+    assert limiter.install(utente, 'S1234567X', registro)
+
+    url = 'https://web.spaggiari.eu/rest/v1/students/1/grades'
+    threads = [threading.Thread(target=utente._sessione.request, args=('GET', url)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.02)
+
+    gauge = {
+        (voce['nome'], voce['etichette'].get('livello')): voce['valore']
+        for voce in registro.to_dict()['gauge']
+    }
+    assert gauge[('ratelimit_in_coda', 'host')] > 0
+    assert ('ratelimit_rate', None) in gauge
+    for thread in threads:
+        thread.join()
+
+    testo = registro.to_prometheus()
+    assert '# TYPE classeviva_ratelimit_in_coda gauge' in testo
+    assert 'classeviva_ratelimit_in_coda{host="web.spaggiari.eu",livello="host"} 0' in testo
+    assert 'classeviva_ratelimit_attesa_seconds_count{host="web.spaggiari.eu"} 4' in testo
+    attese = [v for v in registro.to_dict()['durate'] if v['nome'] == 'ratelimit_attesa']
+    assert attese[0]['max'] > 0
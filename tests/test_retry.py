@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+import retry
+from retry import CircuitBreaker, ErroreRisposta, RetryPolicy, is_failure, is_retryable
+
+
+class _Risposta:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _Sessione:
+    def __init__(self, risposta):
+        self.risposta = risposta
+
+    def request(self, method, url, *args, **kwargs):
+        return self.risposta
+
+
+class _Utente:
+    def __init__(self, risposta):
+        self._sessione = _Sessione(risposta)
+
+
+def _esegui(policy, errore):
+    chiamate = []
+
+    async def factory():
+        chiamate.append(1)
+        raise errore
+
+    with pytest.raises(type(errore)):
+        asyncio.run(policy.run(factory))
+    return len(chiamate)
+
+
+def test_errori_di_programmazione_non_ritentati():
+    breaker = CircuitBreaker(failure_threshold=1)
+    policy = RetryPolicy(max_attempts=3, base_delay=0, breaker=breaker)
+    for errore in (TypeError('x'), KeyError('x'), ValueError('x')):
+        assert not is_retryable(errore) and not is_failure(errore)
+        assert _esegui(policy, errore) == 1
+    assert breaker.state == CircuitBreaker.CHIUSO
+
+
+def test_errori_di_rete_e_codici_transitori_ritentati():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    assert _esegui(policy, ConnectionError('reset')) == 3
+    assert _esegui(policy, ErroreRisposta(503)) == 3
+    assert not is_retryable(Exception('Codice: 404'))
+    assert is_retryable(Exception('Codice: 502'))
+
+
+def test_install_porta_il_retry_after_alla_policy():
+    utente = _Utente(_Risposta(429, {'Retry-After': '7'}))
+    assert retry.install(utente)
+    assert not retry.install(utente)
+    with pytest.raises(ErroreRisposta) as info:
+        utente._sessione.request('GET', 'https://example.org/grades')
+    assert info.value.status_code == 429
+    policy = RetryPolicy(base_delay=0.1, jitter=False)
+    assert policy.delay(0, info.value) == 7.0
+
+
+def test_install_lascia_passare_le_altre_risposte():
+    for stato in (200, 401, 404):
+        utente = _Utente(_Risposta(stato))
+        retry.install(utente)
+        assert utente._sessione.request('GET', 'https://example.org/card').status_code == stato
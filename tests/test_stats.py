@@ -0,0 +1,31 @@
+from datetime import date
+
+import stats
+from stats import GradeArrays
+
+
+def _colonne(arrays):
+    return (
+        [float(v) for v in arrays.valori],
+        [arrays.materie[i] for i in arrays.materie_idx],
+        [int(q) for q in arrays.quadrimestri],
+        [int(o) for o in arrays.date_ordinali],
+    )
+
+
+def test_from_columns_data_malformata_stesso_risultato(monkeypatch):
+    valori = [7.5, 6, 8, 9, 0, 5.5]
+    materie = ['MATEMATICA', 'ITALIANO', 'MATEMATICA', 'STORIA', 'ITALIANO', 'STORIA']
+    date_voti = ['2024-10-03', '2024-13-45', 'non-una-data', '2025-03-14', '2025-03-15', '']
+
+    vettoriale = _colonne(GradeArrays.from_columns(valori, materie, date_voti))
+
+    monkeypatch.setattr(stats, 'np', None)
+    monkeypatch.setattr(stats, '_numpy_cercato', True)
+    python = _colonne(GradeArrays.from_columns(valori, materie, date_voti))
+
+    assert sorted(zip(*vettoriale)) == sorted(zip(*python))
+    # Le date non valide finiscono fuori periodo, senza ordinale
+    assert sorted(python[2]) == [0, 0, 0, 1, 2]
+    assert python[3].count(0) == 3
+    assert date(2024, 10, 3).toordinal() in python[3]
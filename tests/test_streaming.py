@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import streaming
+from payloads import genera_voti
+
+
+class _Risposta:
+    """Quanto basta di requests.Response: json() decodifica _content"""
+
+    def __init__(self, corpo, pezzo=97, durante=None):
+        self.status_code = 200
+        self._corpo = corpo
+        self._pezzo = pezzo
+        self._content = None
+        # Chiamata a metà download (es. parte un altro tentativo)
+        self._durante = durante
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self._corpo), self._pezzo):
+            if self._durante is not None and i >= len(self._corpo) // 2:
+                durante, self._durante = self._durante, None
+                durante()
+            yield self._corpo[i:i + self._pezzo]
+
+    def json(self):
+        return json.loads(self._content)
+
+
+class _Sessione:
+    def __init__(self, risposte):
+        self.risposte = list(risposte)
+
+    def request(self, method, url, *args, **kwargs):
+        assert kwargs.get('stream') is True
+        return self.risposte.pop(0)
+
+
+class _Utente:
+    def __init__(self, risposte):
+        self._sessione = _Sessione(risposte)
+
+
+def _corpo(n=120):
+    return json.dumps({'grades': genera_voti(n), 'altro': [1.5, 'x']}).encode('utf-8')
+
+
+def test_streaming_e_json_danno_lo_stesso_documento():
+    corpo = _corpo()
+    lotti = []
+    risposta = _Risposta(corpo)
+    documento = streaming.decodifica_risposta(risposta, 'grades', lotti.append, dimensione_lotto=25)
+    assert documento == json.loads(corpo) == risposta.json()
+    assert [v for lotto in lotti for v in lotto] == json.loads(corpo)['grades']
+
+
+def test_corpo_troncato_come_json_normale():
+    corpo = _corpo()[:-40]
+    with pytest.raises(ValueError):
+        json.loads(corpo)
+
+    consegnati, annullati = [], []
+    utente = _Utente([_Risposta(corpo)])
+    streaming.installa(utente, r'/grades$', 'grades',
+                       lambda lotto, t: consegnati.append(t), dimensione_lotto=25,
+                       on_annulla=annullati.append)
+    risposta = utente._sessione.request('GET', 'https://example.org/students/1/grades')
+
+    # json() solleva come farebbe senza streaming e i lotti parziali vanno scartati
+    assert risposta._content == corpo
+    with pytest.raises(ValueError):
+        risposta.json()
+    assert consegnati and annullati == [1]
+
+
+def test_lotti_di_un_tentativo_abbandonato_scartati():
+    corpo = _corpo()
+    consegnati, annullati = [], []
+    utente = _Utente([])
+    tentativi = streaming.installa(utente, r'/grades$', 'grades',
+                                   lambda lotto, t: consegnati.append((t, len(lotto))),
+                                   dimensione_lotto=10, on_annulla=annullati.append)
+    url = 'https://example.org/students/1/grades'
+    # A metà del primo download parte (e finisce) il ritentativo
+    secondo = []
+    primo = _Risposta(corpo, durante=lambda: secondo.append(utente._sessione.request('GET', url)))
+    utente._sessione.risposte = [primo, _Risposta(corpo)]
+    utente._sessione.request('GET', url)
+
+    assert tentativi.ultimo == 2 and annullati == [1]
+    prima = [t for t, _ in consegnati].index(2)
+    # Dopo l'inizio del secondo tentativo nessun lotto del primo arriva più
+    assert all(t == 2 for t, _ in consegnati[prima:])
+    assert sum(n for t, n in consegnati if t == 2) == len(json.loads(corpo)['grades'])
+    assert secondo[0].json() == json.loads(corpo)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from cache import DataCache
+from payloads import genera_assenze, genera_voti
+from sync import SyncEngine
+
+
+class _UtenteFinto:
+    def __init__(self, voti, assenze):
+        self._voti = voti
+        self._assenze = assenze
+
+    async def voti(self):
+        return [dict(v) for v in self._voti]
+
+    async def assenze(self):
+        return [dict(a) for a in self._assenze]
+
+
+def test_sync_invariato_rinnova_ttl_cache(tmp_path):
+    cache = DataCache(str(tmp_path / 'cache.db'), ttl={'voti': 60, 'assenze': 60})
+    engine = SyncEngine(cache, 'utente')
+    utente = _UtenteFinto(genera_voti(50), genera_assenze(20))
+
+    primo = asyncio.run(engine.sync_voti(utente))
+    asyncio.run(engine.sync_assenze(utente))
+    assert primo.modificato
+
+    # Payload scaduto: una sync senza novità deve renderlo di nuovo fresco
+    with cache._lock:
+        cache._conn.execute('UPDATE risorse SET aggiornato = 0')
+        cache._conn.commit()
+    assert not cache.is_fresh('utente', 'voti')
+
+    secondo = asyncio.run(engine.sync_voti(utente))
+    terzo = asyncio.run(engine.sync_assenze(utente))
+    assert not secondo.modificato and not terzo.modificato
+    assert cache.is_fresh('utente', 'voti')
+    assert cache.is_fresh('utente', 'assenze')
+    cache.close()
+
+
+class _UtenteBloccato(_UtenteFinto):
+    """Resta dentro voti() finché il test non lo sblocca"""
+
+    def __init__(self, voti, assenze):
+        super().__init__(voti, assenze)
+        self.in_corso = threading.Event()
+        self.sblocca = threading.Event()
+
+    async def voti(self):
+        self.in_corso.set()
+        self.sblocca.wait(5)
+        return await super().voti()
+
+
+def test_logout_durante_sync_non_risalva_dati(tmp_path):
+    cache = DataCache(str(tmp_path / 'cache.db'), ttl={'voti': 60})
+    annullato = threading.Event()
+    engine = SyncEngine(cache, 'utente', annullato)
+    utente = _UtenteBloccato(genera_voti(30), [])
+
+    risultato = {}
+    thread = threading.Thread(
+        target=lambda: risultato.update(sync=asyncio.run(engine.sync_voti(utente))))
+    thread.start()
+    assert utente.in_corso.wait(5)
+
+    # Logout con la sync ancora in volo: come do_logout, prima l'evento poi clear
+    annullato.set()
+    cache.clear('utente')
+    utente.sblocca.set()
+    thread.join(5)
+
+    assert not thread.is_alive() and 'sync' in risultato
+    assert cache.load('utente', 'voti') is None
+    assert cache.get_meta('utente', 'sync:voti') is None
+    assert cache.get_meta('utente', 'aggregati:voti') is None
+    assert not cache.put_meta('utente', 'sessione', {'token': 'x'}, annullato=annullato)
+    assert cache.get_meta('utente', 'sessione') is None
+    cache.close()
@@ -1,8 +1,78 @@
+import { createHash, timingSafeEqual } from 'node:crypto';
+
+import { responseCache } from '../lib/cache.js';
+import { sendJson } from '../lib/compress.js';
+import { upstreamPool } from '../lib/pool.js';
+import { limiter } from '../lib/rateLimiter.js';
+
+// Sovrascrivibile per le prove offline (es. mock_server.py)
+const BASE_URL = process.env.SPAGGIARI_BASE_URL || 'https://web.spaggiari.eu/rest/v1';
+
+// Le metriche sono disattivate se PROXY_METRICS_TOKEN non è impostato
+const METRICS_TOKEN = process.env.PROXY_METRICS_TOKEN || '';
+
+// Confronto a tempo costante del token inviato come "Authorization: Bearer ..."
+function metricsAuthorized(req) {
+  const [scheme, value] = String(req.headers.authorization || '').split(' ');
+  if (!METRICS_TOKEN || scheme !== 'Bearer' || !value) return false;
+  const digest = (text) => createHash('sha256').update(text).digest();
+  return timingSafeEqual(digest(value), digest(METRICS_TOKEN));
+}
+
+// Risorse dello studente: percorso upstream, campo della risposta e valore se assente
+const RESOURCES = {
+  carta: { path: 'card', field: 'card', empty: {} },
+  voti: { path: 'grades', field: 'grades', empty: [] },
+  assenze: { path: 'absences/details', field: 'events', empty: [] },
+};
+
+// Scarica una risorsa: { status, data } oppure { status, error } senza eccezioni
+async function fetchResource(name, userId, token) {
+  const { path, field, empty } = RESOURCES[name];
+  try {
+    const response = await limiter.fetch(`${BASE_URL}/students/${userId}/${path}`, {
+      method: 'GET',
+      headers: {
+        'Z-Dev-Apikey': 'Tg1NWEwNGIgIC0K',
+        'Z-Auth-Token': token,
+        'User-Agent': 'CVVS/std/4.2.3 Android/12',
+      }
+    }, userId);
+    if (!response.ok) {
+      await response.body?.cancel();
+      return { status: response.status, error: `Upstream error ${response.status}` };
+    }
+    const data = await response.json();
+    return { status: 200, data: data[field] || empty };
+  } catch (error) {
+    return { status: 502, error: error.message };
+  }
+}
+
+// Come fetchResource, ma le raffiche dello stesso utente leggono la cache
+// per qualche secondo (PROXY_CACHE_TTL) invece di richiamare Spaggiari
+async function cachedResource(name, userId, token) {
+  const key = responseCache.key(userId, token, name);
+  const { hit, value } = await responseCache.getOrLoad(key, async () => {
+    const part = await fetchResource(name, userId, token);
+    return { cacheable: !part.error, value: part };
+  });
+  return { part: value, hit };
+}
+
+async function sendCached(req, res, status, payload, hit) {
+  res.setHeader('X-Cache', hit ? 'HIT' : 'MISS');
+  if (await sendJson(req, res, status, payload, { etag: true }) === 304) {
+    responseCache.notModified += 1;
+  }
+}
+
 export default async function handler(req, res) {
   // Enable CORS
   res.setHeader('Access-Control-Allow-Origin', '*');
   res.setHeader('Access-Control-Allow-Methods', 'GET, POST, OPTIONS');
-  res.setHeader('Access-Control-Allow-Headers', 'Content-Type');
+  res.setHeader('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, Authorization');
+  res.setHeader('Access-Control-Expose-Headers', 'ETag, X-Cache');
   
   if (req.method === 'OPTIONS') {
     return res.status(200).end();
@@ -11,8 +81,18 @@ export default async function handler(req, res) {
   const { action, username, password, token, userId } = req.body || {};
 
   try {
+    if (action === 'metrics') {
+      if (!METRICS_TOKEN) return res.status(404).json({ error: 'Metrics disabled' });
+      if (!metricsAuthorized(req)) return res.status(401).json({ error: 'Unauthorized' });
+      return res.status(200).json({
+        rateLimiter: limiter.metrics(),
+        cache: responseCache.metrics(),
+        pool: upstreamPool.metrics(),
+      });
+    }
+
     if (action === 'login') {
-      const response = await fetch('https://web.spaggiari.eu/rest/v1/auth/login', {
+      const response = await limiter.fetch(`${BASE_URL}/auth/login`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -20,7 +100,7 @@ export default async function handler(req, res) {
           'User-Agent': 'CVVS/std/4.2.3 Android/12',
         },
         body: JSON.stringify({ ident: null, pass: password, uid: username })
-      });
+      }, username);
       const data = await response.json();
       
       if (response.ok) {
@@ -36,43 +116,25 @@ export default async function handler(req, res) {
       }
     }
 
-    if (action === 'carta') {
-      const response = await fetch(`https://web.spaggiari.eu/rest/v1/students/${userId}/card`, {
-        method: 'GET',
-        headers: {
-          'Z-Dev-Apikey': 'Tg1NWEwNGIgIC0K',
-          'Z-Auth-Token': token,
-          'User-Agent': 'CVVS/std/4.2.3 Android/12',
-        }
-      });
-      const data = await response.json();
-      return res.status(200).json(data.card || {});
-    }
-
-    if (action === 'voti') {
-      const response = await fetch(`https://web.spaggiari.eu/rest/v1/students/${userId}/grades`, {
-        method: 'GET',
-        headers: {
-          'Z-Dev-Apikey': 'Tg1NWEwNGIgIC0K',
-          'Z-Auth-Token': token,
-          'User-Agent': 'CVVS/std/4.2.3 Android/12',
-        }
-      });
-      const data = await response.json();
-      return res.status(200).json(data.grades || []);
+    if (Object.hasOwn(RESOURCES, action ?? '')) {
+      const { part, hit } = await cachedResource(action, userId, token);
+      if (part.error) return res.status(part.status).json({ error: part.error });
+      return sendCached(req, res, 200, part.data, hit);
     }
 
-    if (action === 'assenze') {
-      const response = await fetch(`https://web.spaggiari.eu/rest/v1/students/${userId}/absences/details`, {
-        method: 'GET',
-        headers: {
-          'Z-Dev-Apikey': 'Tg1NWEwNGIgIC0K',
-          'Z-Auth-Token': token,
-          'User-Agent': 'CVVS/std/4.2.3 Android/12',
-        }
-      });
-      const data = await response.json();
-      return res.status(200).json(data.events || []);
+    // Tutte le risorse in una sola richiesta, scaricate in parallelo;
+    // "parts" ne sceglie un sottoinsieme. Ogni parte ha il proprio status.
+    if (action === 'all') {
+      const names = Array.isArray(req.body.parts) ? req.body.parts : Object.keys(RESOURCES);
+      const unknown = names.filter((name) => !Object.hasOwn(RESOURCES, name));
+      if (unknown.length) {
+        return res.status(400).json({ error: `Invalid parts: ${unknown.join(', ')}` });
+      }
+      const results = await Promise.all(names.map((name) => cachedResource(name, userId, token)));
+      const payload = Object.fromEntries(names.map((name, i) => [name, results[i].part]));
+      // Se nessuna parte è riuscita lo status è quello del primo errore (es. 401)
+      const status = results.some(({ part }) => !part.error) ? 200 : results[0]?.part.status ?? 400;
+      return sendCached(req, res, status, payload, results.length > 0 && results.every(({ hit }) => hit));
     }
 
     return res.status(400).json({ error: 'Invalid action' });
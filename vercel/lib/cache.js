@@ -0,0 +1,155 @@
+// Cache delle risposte per utente con TTL breve ed ETag per le richieste condizionali.
+// Lo store predefinito è in memoria (condiviso tra le invocazioni "calde" della
+// stessa istanza); PROXY_CACHE_STORE=file lo salva su disco, utile nelle prove locali.
+import { createHash } from 'node:crypto';
+import { mkdir, readFile, rm, writeFile } from 'node:fs/promises';
+import os from 'node:os';
+import path from 'node:path';
+
+export class MemoryStore {
+  constructor({ maxEntries = 1000 } = {}) {
+    this.maxEntries = maxEntries;
+    this.entries = new Map();
+  }
+
+  async get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return null;
+    if (entry.expires <= Date.now()) {
+      this.entries.delete(key);
+      return null;
+    }
+    return entry.value;
+  }
+
+  async set(key, value, ttlMs) {
+    this.entries.delete(key);
+    this.entries.set(key, { value, expires: Date.now() + ttlMs });
+    // La Map mantiene l'ordine di inserimento: le prime sono le più vecchie
+    for (const oldest of this.entries.keys()) {
+      if (this.entries.size <= this.maxEntries) break;
+      this.entries.delete(oldest);
+    }
+  }
+
+  async clear() {
+    this.entries.clear();
+  }
+}
+
+export class FileStore {
+  constructor({ dir = path.join(os.tmpdir(), 'classeviva-proxy-cache') } = {}) {
+    this.dir = dir;
+  }
+
+  file(key) {
+    return path.join(this.dir, `${createHash('sha256').update(key).digest('hex')}.json`);
+  }
+
+  async get(key) {
+    try {
+      const entry = JSON.parse(await readFile(this.file(key), 'utf8'));
+      if (entry.expires > Date.now()) return entry.value;
+      await rm(this.file(key), { force: true });
+    } catch {
+      // File assente o illeggibile: come un miss
+    }
+    return null;
+  }
+
+  async set(key, value, ttlMs) {
+    await mkdir(this.dir, { recursive: true });
+    await writeFile(this.file(key), JSON.stringify({ value, expires: Date.now() + ttlMs }));
+  }
+
+  async clear() {
+    await rm(this.dir, { recursive: true, force: true });
+  }
+}
+
+export class ResponseCache {
+  constructor({ store = new MemoryStore(), ttlSeconds = 30 } = {}) {
+    this.store = store;
+    this.ttlMs = ttlSeconds * 1000;
+    // Richieste upstream in corso: le raffiche sulla stessa chiave ne fanno una sola
+    this.inflight = new Map();
+
+    this.hits = 0;
+    this.misses = 0;
+    this.coalesced = 0;
+    this.notModified = 0;
+  }
+
+  // La chiave include il token: chi non ha una sessione valida non legge la cache
+  key(userId, token, resource) {
+    const session = createHash('sha256').update(`${userId}:${token}`).digest('base64url');
+    return `${session}:${resource}`;
+  }
+
+  // Ritorna { hit, value }; load() deve dare { cacheable, value }
+  async getOrLoad(key, load) {
+    if (this.ttlMs > 0) {
+      const cached = await this.store.get(key);
+      if (cached != null) {
+        this.hits += 1;
+        return { hit: true, value: cached };
+      }
+    }
+    const pending = this.inflight.get(key);
+    if (pending) {
+      this.coalesced += 1;
+      return { hit: true, value: (await pending).value };
+    }
+
+    this.misses += 1;
+    const promise = (async () => {
+      const result = await load();
+      if (result.cacheable && this.ttlMs > 0) await this.store.set(key, result.value, this.ttlMs);
+      return result;
+    })();
+    this.inflight.set(key, promise);
+    try {
+      return { hit: false, value: (await promise).value };
+    } finally {
+      this.inflight.delete(key);
+    }
+  }
+
+  metrics() {
+    const lookups = this.hits + this.misses;
+    return {
+      store: this.store.constructor.name,
+      ttlSeconds: this.ttlMs / 1000,
+      hits: this.hits,
+      misses: this.misses,
+      coalesced: this.coalesced,
+      hitRatio: lookups ? Number((this.hits / lookups).toFixed(3)) : 0,
+      notModified: this.notModified,
+    };
+  }
+}
+
+// ETag forte sul corpo serializzato; la codifica entra nel tag perché i byte cambiano
+export function etagOf(body, encoding) {
+  const hash = createHash('sha256').update(body).digest('base64url').slice(0, 27);
+  return encoding ? `"${hash}-${encoding}"` : `"${hash}"`;
+}
+
+export function matchesEtag(ifNoneMatch, etag) {
+  if (!ifNoneMatch) return false;
+  if (ifNoneMatch.trim() === '*') return true;
+  return ifNoneMatch.split(',').some((tag) => tag.trim().replace(/^W\//, '') === etag);
+}
+
+function createStore() {
+  if (process.env.PROXY_CACHE_STORE === 'file') {
+    return new FileStore(process.env.PROXY_CACHE_DIR ? { dir: process.env.PROXY_CACHE_DIR } : {});
+  }
+  return new MemoryStore({ maxEntries: Number(process.env.PROXY_CACHE_MAX_ENTRIES || 1000) });
+}
+
+// Cache condivisa da tutte le richieste del proxy
+export const responseCache = new ResponseCache({
+  store: createStore(),
+  ttlSeconds: Number(process.env.PROXY_CACHE_TTL ?? 30),
+});
@@ -0,0 +1,68 @@
+// Risposte JSON compresse con brotli o gzip secondo l'Accept-Encoding del client.
+import { promisify } from 'node:util';
+import zlib from 'node:zlib';
+
+import { etagOf, matchesEtag } from './cache.js';
+
+const brotli = promisify(zlib.brotliCompress);
+const gzip = promisify(zlib.gzip);
+
+// Sotto questa dimensione la compressione costa più di quanto fa risparmiare
+const MIN_BYTES = Number(process.env.PROXY_COMPRESS_MIN_BYTES || 1024);
+
+// Codifiche accettate dal client, in ordine di preferenza (q=0 le esclude)
+export function acceptedEncodings(header) {
+  const accepted = new Map();
+  for (const part of String(header || '').split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';');
+    if (!name) continue;
+    let q = 1;
+    for (const param of params) {
+      const [key, value] = param.trim().split('=');
+      if (key === 'q') q = Number(value);
+    }
+    accepted.set(name, Number.isNaN(q) ? 0 : q);
+  }
+  const ok = (name) => (accepted.get(name) ?? accepted.get('*') ?? 0) > 0;
+  return ['br', 'gzip'].filter(ok);
+}
+
+// Con etag: true aggiunge l'ETag e risponde 304 se coincide con If-None-Match.
+// Ritorna lo status inviato.
+export async function sendJson(req, res, status, payload, { etag = false } = {}) {
+  let body = Buffer.from(JSON.stringify(payload));
+  res.setHeader('Content-Type', 'application/json; charset=utf-8');
+  res.setHeader('Vary', 'Accept-Encoding');
+
+  const [encoding] = body.length >= MIN_BYTES ? acceptedEncodings(req.headers['accept-encoding']) : [];
+  if (etag && status === 200) {
+    const tag = etagOf(body, encoding);
+    res.setHeader('ETag', tag);
+    res.setHeader('Cache-Control', 'private, no-cache');
+    if (matchesEtag(req.headers['if-none-match'], tag)) {
+      res.removeHeader('Content-Type');
+      res.statusCode = 304;
+      res.end();
+      return 304;
+    }
+  }
+
+  if (encoding === 'br') {
+    body = await brotli(body, {
+      params: {
+        [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT,
+        // Qualità media: la massima è troppo lenta per una risposta online
+        [zlib.constants.BROTLI_PARAM_QUALITY]: 5,
+        [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length,
+      },
+    });
+  } else if (encoding === 'gzip') {
+    body = await gzip(body);
+  }
+  if (encoding) res.setHeader('Content-Encoding', encoding);
+
+  res.setHeader('Content-Length', body.length);
+  res.statusCode = status;
+  res.end(body);
+  return status;
+}
@@ -0,0 +1,134 @@
+// Connessioni keep-alive verso Spaggiari condivise dalle invocazioni "calde".
+// Espone un fetch() minimale su node:http(s) con Agent a livello di modulo, così
+// le richieste successive riusano socket e sessione TLS invece di rifare l'handshake.
+import { randomUUID } from 'node:crypto';
+import http from 'node:http';
+import https from 'node:https';
+import { promisify } from 'node:util';
+import zlib from 'node:zlib';
+
+const DECODERS = {
+  gzip: promisify(zlib.gunzip),
+  deflate: promisify(zlib.inflate),
+  br: promisify(zlib.brotliDecompress),
+};
+
+// Risposta con la parte dell'interfaccia di fetch usata dal proxy
+class PooledResponse {
+  constructor(status, headers, body) {
+    this.status = status;
+    this.ok = status >= 200 && status < 300;
+    this.headers = { get: (name) => headers[name.toLowerCase()] ?? null };
+    this._body = body;
+    this.body = { cancel: async () => {} };
+  }
+
+  async text() {
+    return this._body.toString('utf8');
+  }
+
+  async json() {
+    return JSON.parse(this._body.toString('utf8'));
+  }
+}
+
+export class UpstreamPool {
+  constructor({ maxSockets = 50, maxFreeSockets = 10, idleTimeoutMs = 30000, timeoutMs = 15000 } = {}) {
+    const options = { keepAlive: true, maxSockets, maxFreeSockets, timeout: idleTimeoutMs, scheduling: 'lifo' };
+    this.agents = { 'http:': new http.Agent(options), 'https:': new https.Agent(options) };
+    this.options = { maxSockets, maxFreeSockets, idleTimeoutMs, timeoutMs };
+    this.instance = randomUUID();
+    this.started = Date.now();
+
+    this.requests = 0;
+    this.reused = 0;
+    this.errors = 0;
+    this.connections = 0;
+    this.connectTotalMs = 0;
+    this.connectMaxMs = 0;
+  }
+
+  fetch = (url, { method = 'GET', headers = {}, body } = {}) => new Promise((resolve, reject) => {
+    const target = new URL(url);
+    const client = target.protocol === 'https:' ? https : http;
+    const req = client.request(target, {
+      method,
+      headers: { 'Accept-Encoding': 'gzip, deflate, br', ...headers },
+      agent: this.agents[target.protocol],
+    });
+    this.requests += 1;
+
+    req.setTimeout(this.options.timeoutMs, () => req.destroy(new Error(`Upstream timeout after ${this.options.timeoutMs} ms`)));
+    req.on('socket', (socket) => {
+      if (req.reusedSocket) {
+        this.reused += 1;
+        return;
+      }
+      // Connessione nuova: misura TCP (+ TLS) fino a quando è pronta
+      const started = Date.now();
+      socket.once(target.protocol === 'https:' ? 'secureConnect' : 'connect', () => {
+        const ms = Date.now() - started;
+        this.connections += 1;
+        this.connectTotalMs += ms;
+        this.connectMaxMs = Math.max(this.connectMaxMs, ms);
+      });
+    });
+    req.on('error', (error) => {
+      this.errors += 1;
+      reject(error);
+    });
+    req.on('response', (res) => {
+      // La risposta va letta per intero: solo così il socket torna nel pool
+      const chunks = [];
+      res.on('data', (chunk) => chunks.push(chunk));
+      res.on('error', reject);
+      res.on('end', async () => {
+        try {
+          let data = Buffer.concat(chunks);
+          const decode = DECODERS[res.headers['content-encoding']];
+          if (decode) data = await decode(data);
+          resolve(new PooledResponse(res.statusCode, res.headers, data));
+        } catch (error) {
+          reject(error);
+        }
+      });
+    });
+    req.end(body);
+  });
+
+  metrics() {
+    const sockets = {};
+    for (const agent of Object.values(this.agents)) {
+      for (const [name, list] of Object.entries(agent.sockets)) {
+        sockets[name] = { ...sockets[name], active: list.length };
+      }
+      for (const [name, list] of Object.entries(agent.freeSockets)) {
+        sockets[name] = { ...sockets[name], idle: list.length };
+      }
+      for (const [name, list] of Object.entries(agent.requests)) {
+        sockets[name] = { ...sockets[name], pending: list.length };
+      }
+    }
+    return {
+      instance: this.instance,
+      uptimeSeconds: Math.round((Date.now() - this.started) / 1000),
+      ...this.options,
+      requests: this.requests,
+      reusedConnections: this.reused,
+      newConnections: this.connections,
+      reuseRatio: this.requests ? Number((this.reused / this.requests).toFixed(3)) : 0,
+      connectAvgMs: this.connections ? Math.round(this.connectTotalMs / this.connections) : 0,
+      connectMaxMs: this.connectMaxMs,
+      errors: this.errors,
+      sockets,
+    };
+  }
+}
+
+// Pool condiviso da tutte le richieste del proxy verso Spaggiari
+export const upstreamPool = new UpstreamPool({
+  maxSockets: Number(process.env.PROXY_POOL_MAX_SOCKETS || 50),
+  maxFreeSockets: Number(process.env.PROXY_POOL_MAX_FREE || 10),
+  idleTimeoutMs: Number(process.env.PROXY_POOL_IDLE_MS || 30000),
+  timeoutMs: Number(process.env.PROXY_UPSTREAM_TIMEOUT_MS || 15000),
+});
@@ -0,0 +1,199 @@
+// Token bucket per host con sotto-limite per account e adattamento AIMD sui 429.
+// Lo stato vive a livello di modulo: resta condiviso tra le invocazioni "calde"
+// della stessa istanza della funzione.
+import { createHash } from 'node:crypto';
+
+import { upstreamPool } from './pool.js';
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+function parseRetryAfter(value) {
+  if (!value) return null;
+  const seconds = Number(value);
+  if (!Number.isNaN(seconds)) return Math.max(0, seconds);
+  const date = Date.parse(value);
+  return Number.isNaN(date) ? null : Math.max(0, (date - Date.now()) / 1000);
+}
+
+export class TokenBucket {
+  constructor({ rate, capacity, minRate, maxRate, increase = 0.1, decrease = 0.5 }) {
+    this.rate = rate;
+    this.capacity = capacity;
+    this.minRate = minRate ?? rate / 16;
+    this.maxRate = maxRate ?? rate;
+    this.increase = increase;
+    this.decrease = decrease;
+    this.tokens = capacity;
+    this.last = Date.now();
+    this.lastUsed = this.last;
+    this.pausedUntil = 0;
+
+    this.queued = 0;
+    this.waits = 0;
+    this.waitTotalMs = 0;
+    this.waitMaxMs = 0;
+    this.throttled = 0;
+  }
+
+  refill(now) {
+    this.tokens = Math.min(this.capacity, this.tokens + ((now - this.last) / 1000) * this.rate);
+    this.last = now;
+  }
+
+  // Prenota un token e ritorna i millisecondi da attendere (ordine FIFO)
+  reserve() {
+    const now = Date.now();
+    this.refill(now);
+    this.tokens -= 1;
+    this.lastUsed = now;
+    let waitMs = this.tokens >= 0 ? 0 : (-this.tokens / this.rate) * 1000;
+    waitMs = Math.max(waitMs, this.pausedUntil - now);
+    if (waitMs > 0) {
+      this.waits += 1;
+      this.waitTotalMs += waitMs;
+      this.waitMaxMs = Math.max(this.waitMaxMs, waitMs);
+    }
+    return waitMs;
+  }
+
+  async acquire() {
+    const waitMs = this.reserve();
+    if (waitMs > 0) {
+      this.queued += 1;
+      try {
+        await sleep(waitMs);
+      } finally {
+        this.queued -= 1;
+      }
+    }
+    return waitMs;
+  }
+
+  onSuccess() {
+    this.rate = Math.min(this.maxRate, this.rate + this.increase);
+  }
+
+  onThrottled(pauseSeconds) {
+    this.throttled += 1;
+    this.rate = Math.max(this.minRate, this.rate * this.decrease);
+    this.tokens = Math.min(this.tokens, 0);
+    if (pauseSeconds) {
+      this.pausedUntil = Math.max(this.pausedUntil, Date.now() + pauseSeconds * 1000);
+    }
+  }
+
+  metrics() {
+    return {
+      rate: Number(this.rate.toFixed(3)),
+      capacity: this.capacity,
+      queued: this.queued,
+      waits: this.waits,
+      waitTotalMs: Math.round(this.waitTotalMs),
+      waitAvgMs: this.waits ? Math.round(this.waitTotalMs / this.waits) : 0,
+      waitMaxMs: Math.round(this.waitMaxMs),
+      throttled429: this.throttled,
+    };
+  }
+}
+
+export class RateLimiter {
+  constructor({ rate = 5, capacity = 10, perAccountRate = null, perAccountCapacity = null, minRate, maxRate,
+                accountIdleMs = 60000, maxAccounts = 10000, fetch: fetchImpl = globalThis.fetch } = {}) {
+    this.options = { rate, capacity, minRate, maxRate };
+    this.fetchImpl = fetchImpl;
+    this.perAccountRate = perAccountRate;
+    this.perAccountCapacity = perAccountCapacity ?? capacity;
+    // I bucket degli account inattivi sono pieni: eliminarli non cambia i limiti
+    this.accountIdleMs = accountIdleMs;
+    this.maxAccounts = maxAccounts;
+    this.lastSweep = Date.now();
+    this.hosts = new Map();
+    this.accounts = new Map();
+  }
+
+  bucket(host) {
+    let bucket = this.hosts.get(host);
+    if (!bucket) {
+      bucket = new TokenBucket(this.options);
+      this.hosts.set(host, bucket);
+    }
+    return bucket;
+  }
+
+  accountBucket(host, account) {
+    if (this.perAccountRate == null || account == null) return null;
+    // Gli identificativi degli studenti non restano in memoria in chiaro
+    const key = createHash('sha256').update(`${host}|${account}`).digest('base64url');
+    let bucket = this.accounts.get(key);
+    if (!bucket) {
+      this.sweepAccounts();
+      bucket = new TokenBucket({ rate: this.perAccountRate, capacity: this.perAccountCapacity });
+      this.accounts.set(key, bucket);
+    }
+    return bucket;
+  }
+
+  // Elimina i bucket inattivi da accountIdleMs e, oltre maxAccounts, i più vecchi senza coda
+  sweepAccounts(now = Date.now()) {
+    if (now - this.lastSweep >= this.accountIdleMs) {
+      this.lastSweep = now;
+      for (const [key, bucket] of this.accounts) {
+        if (bucket.queued === 0 && now - bucket.lastUsed >= this.accountIdleMs) this.accounts.delete(key);
+      }
+    }
+    for (const [key, bucket] of this.accounts) {
+      if (this.accounts.size < this.maxAccounts) break;
+      if (bucket.queued === 0) this.accounts.delete(key);
+    }
+  }
+
+  async acquire(host, account) {
+    let waitMs = 0;
+    const perAccount = this.accountBucket(host, account);
+    if (perAccount) waitMs += await perAccount.acquire();
+    return waitMs + (await this.bucket(host).acquire());
+  }
+
+  record(host, response) {
+    const bucket = this.bucket(host);
+    if (response.status === 429) {
+      bucket.onThrottled(parseRetryAfter(response.headers.get('retry-after')));
+    } else if (response.status < 400) {
+      bucket.onSuccess();
+    }
+  }
+
+  // fetch() che passa dal limitatore
+  async fetch(url, options, account) {
+    const host = new URL(url).host;
+    await this.acquire(host, account);
+    const response = await this.fetchImpl(url, options);
+    this.record(host, response);
+    return response;
+  }
+
+  // Gli account sono solo aggregati: le metriche non devono elencare gli studenti
+  metrics() {
+    const hosts = {};
+    for (const [host, bucket] of this.hosts) hosts[host] = bucket.metrics();
+    const accounts = { tracked: this.accounts.size, queued: 0, waits: 0, waitMaxMs: 0, throttled429: 0 };
+    for (const bucket of this.accounts.values()) {
+      accounts.queued += bucket.queued;
+      accounts.waits += bucket.waits;
+      accounts.waitMaxMs = Math.max(accounts.waitMaxMs, Math.round(bucket.waitMaxMs));
+      accounts.throttled429 += bucket.throttled;
+    }
+    return { hosts, accounts };
+  }
+}
+
+// Limitatore condiviso da tutte le richieste del proxy verso Spaggiari
+export const limiter = new RateLimiter({
+  rate: Number(process.env.SPAGGIARI_RATE || 10),
+  capacity: Number(process.env.SPAGGIARI_BURST || 20),
+  perAccountRate: Number(process.env.SPAGGIARI_ACCOUNT_RATE || 2),
+  perAccountCapacity: Number(process.env.SPAGGIARI_ACCOUNT_BURST || 5),
+  accountIdleMs: Number(process.env.SPAGGIARI_ACCOUNT_IDLE_MS || 60000),
+  maxAccounts: Number(process.env.SPAGGIARI_MAX_ACCOUNTS || 10000),
+  fetch: upstreamPool.fetch,
+});